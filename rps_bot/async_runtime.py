@@ -0,0 +1,514 @@
+"""
+The game loop on asyncio, as an alternative to main.run's loop on the main thread with a
+timer thread for the shoot commands.
+
+Each part of the loop is its own task: capture, recognition, handling recognition results,
+the controller's deadlines, serial writes and reads, and metrics. Blocking calls into
+OpenCV, MediaPipe and the serial ports run in executors, so the event loop only waits on
+them. The recognizer, and everything it drives (tracking, motion analysis, the controller's
+updates), keeps to a single executor thread, as it does to the main thread in main.run,
+so frames and results are handled in the same order as there.
+
+Shutdown is structured: when the capture ends, the viewer is closed, on_frame asks to stop
+or the process is signalled, the pipeline drains, the other tasks are cancelled, and
+commands still queued for the hand are sent before run_async returns.
+"""
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from dataclasses import replace
+from functools import partial
+import signal
+import time
+from typing import Callable
+
+from .capture import CameraCapture, ReplayCapture
+from .game_flow.controller import GameController
+from .game_flow.scheduler import AsyncScheduler
+from .hand_serial import BOB_DEGREES, BOB_HOLD_SECS, RPSSerial
+from .metrics import (
+    LatencyStats,
+    ThroughputMeter,
+    report_first_frames,
+    report_send_timings,
+    report_warm_up,
+)
+from .profiling import StageTimings
+from .recognizer.idle_gate import IdleGate
+from .recognizer.inference_profile import InferenceProfile
+from .recognizer.motion_analysis import MotionAnalyzerConfig
+from .session_store import SessionStore
+from .shared_state import StateSnapshot
+from .viewer import ViewerProcess
+
+# Displays the asyncio runtime supports. Inline rendering would block the event loop.
+ASYNC_DISPLAYS = ("none", "process")
+# Frames captured ahead of recognition, beyond which capture waits
+CAPTURE_QUEUE_SIZE = 2
+# How often the event loop's lag is probed
+LAG_PROBE_SECS = 0.01
+# Stages of the frame pipeline whose latency is measured
+STAGES = ("capture", "recognize", "results")
+
+
+class QueuedPort:
+    """
+    Stands in for a serial port, handing writes to a writer task once attached to an
+    event loop, so that callers on any thread never block on the port. Before attaching
+    and after detaching, writes go straight to the port. Everything else is the port's.
+    """
+
+    def __init__(self, port):
+        self.port = port
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._writes: asyncio.Queue | None = None
+
+    def attach(self, loop: asyncio.AbstractEventLoop, writes: asyncio.Queue):
+        self._writes = writes
+        self._loop = loop
+
+    def detach(self):
+        self._loop = None
+
+    def write(self, data: bytes) -> int:
+        loop = self._loop
+        if loop is None:
+            return self.port.write(data)
+        # Queued in call order, from whichever thread is writing
+        loop.call_soon_threadsafe(
+            self._writes.put_nowait, (self.port, data, time.perf_counter())
+        )
+        return len(data)
+
+    def __getattr__(self, name):
+        return getattr(self.port, name)
+
+
+class AsyncRPSSerial(RPSSerial):
+    """
+    RPSSerial for the asyncio runtime. While run() runs, commands are written by a writer
+    task, in the order they were sent, bobs are tasks rather than threads, and the elbow
+    board's replies are printed by a reader task. Otherwise it behaves as RPSSerial.
+    """
+
+    def __init__(self, port, eport, **kwargs):
+        super().__init__(port, eport, start_reader=False, **kwargs)
+        self.finger_control = QueuedPort(self.finger_control)
+        self.elbow_control = QueuedPort(self.elbow_control)
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._bob_task: asyncio.Task | None = None
+        # Time from a command being sent to it being written to its port
+        self.write_latency = LatencyStats()
+
+    async def run(self):
+        """Write the commands sent and print the elbow board's replies, until cancelled."""
+        loop = asyncio.get_running_loop()
+        writes = asyncio.Queue()
+        write_executor = ThreadPoolExecutor(1, thread_name_prefix="serial-write")
+        read_executor = ThreadPoolExecutor(1, thread_name_prefix="serial-read")
+        for port in (self.finger_control, self.elbow_control):
+            port.attach(loop, writes)
+        self._loop = loop
+        try:
+            async with asyncio.TaskGroup() as tasks:
+                tasks.create_task(self._write_forever(writes, write_executor))
+                tasks.create_task(self._read_forever(read_executor))
+        finally:
+            self._loop = None
+            for port in (self.finger_control, self.elbow_control):
+                port.detach()
+            if self._bob_task is not None:
+                self._bob_task.cancel()
+            # Let a write in progress finish, then send what's left in order
+            write_executor.shutdown()
+            while not writes.empty():
+                port, data, _ = writes.get_nowait()
+                port.write(data)
+            # The reader's thread ends once the port is closed
+            read_executor.shutdown(wait=False)
+
+    async def _write_forever(self, writes: asyncio.Queue, executor: ThreadPoolExecutor):
+        loop = asyncio.get_running_loop()
+        while True:
+            port, data, queued = await writes.get()
+            await loop.run_in_executor(executor, port.write, data)
+            self.write_latency.add(time.perf_counter() - queued)
+
+    async def _read_forever(self, executor: ThreadPoolExecutor):
+        loop = asyncio.get_running_loop()
+        port = self.elbow_control.port
+        while port.is_open:
+            line = await loop.run_in_executor(executor, port.readline)
+            if line:
+                print(line)
+
+    def bob(self):
+        loop = self._loop
+        if loop is None:
+            return super().bob()
+        # Called from the recognizer's thread, so the task is started on the loop's
+        loop.call_soon_threadsafe(self._start_bob)
+
+    def _start_bob(self):
+        # A new bob replaces one in progress, as with the bob thread
+        if self._bob_task is not None:
+            self._bob_task.cancel()
+        self._bob_task = asyncio.get_running_loop().create_task(self._bob())
+
+    async def _bob(self):
+        self.begin_elbow_movement(BOB_DEGREES)
+        await asyncio.sleep(BOB_HOLD_SECS)
+        self.begin_elbow_movement(0)
+
+
+class AsyncGameLoop:
+    """
+    The tasks of the asyncio game loop, for a recognizer and controller that are set up.
+    Everything touching the recognizer or controller runs on recognize_executor,
+    except the scheduler's jobs, which run on its own thread as they do on the timer thread.
+    """
+
+    def __init__(
+        self,
+        video_cap: CameraCapture | ReplayCapture,
+        recognizer,
+        controller: GameController,
+        scheduler: AsyncScheduler,
+        serial: RPSSerial | None,
+        recognize_executor: ThreadPoolExecutor,
+        viewer: ViewerProcess | None = None,
+        session_store: SessionStore | None = None,
+        on_frame: Callable[[GameController], bool] | None = None,
+        label: str = "asyncio",
+        fps_report_secs: float = 10,
+        stage_timings: StageTimings | None = None,
+    ):
+        self.video_cap = video_cap
+        self.recognizer = recognizer
+        self.controller = controller
+        self.scheduler = scheduler
+        self.serial = serial
+        self.viewer = viewer
+        self.session_store = session_store
+        self.on_frame = on_frame
+        self.label = label
+        self.fps_report_secs = fps_report_secs
+        self.throughput = ThroughputMeter(label, fps_report_secs)
+        self.stage_timings = (
+            stage_timings if stage_timings is not None else StageTimings()
+        )
+
+        self._recognize_executor = recognize_executor
+        self._capture_executor = ThreadPoolExecutor(1, thread_name_prefix="capture")
+        # Captured (frame, ts, secs taken to read), None marking the end of the capture
+        self._frames: asyncio.Queue[tuple | None] = asyncio.Queue(CAPTURE_QUEUE_SIZE)
+        # Set from MediaPipe's thread when results are ready to handle
+        self._results_ready = asyncio.Event()
+        self._capture_task: asyncio.Task | None = None
+        self._stopping = False
+        # Whether the latency of the first frames was reported
+        self._first_frames_reported = False
+
+        # How late the event loop ran a callback due, and each pipeline stage's latency
+        self.loop_lag = LatencyStats()
+        self.stage_latency = {stage: LatencyStats() for stage in STAGES}
+
+    def request_stop(self):
+        """Stop capturing, and end once the frames captured are handled."""
+        self._stopping = True
+        if self._capture_task is not None:
+            self._capture_task.cancel()
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        self.recognizer.stage_timings = self.stage_timings
+        self.recognizer.on_result_ready = partial(
+            loop.call_soon_threadsafe, self._results_ready.set
+        )
+        restore_signals = self._handle_signals(loop)
+        try:
+            async with asyncio.TaskGroup() as services:
+                service_tasks = [
+                    services.create_task(self.scheduler.run(), name="deadlines"),
+                    services.create_task(self._handle_results(), name="results"),
+                    services.create_task(self._probe_lag(), name="loop-lag"),
+                    services.create_task(self._report_forever(), name="metrics"),
+                ]
+                if isinstance(self.serial, AsyncRPSSerial):
+                    service_tasks.append(
+                        services.create_task(self.serial.run(), name="serial")
+                    )
+                try:
+                    async with asyncio.TaskGroup() as pipeline:
+                        self._capture_task = pipeline.create_task(
+                            self._capture(), name="capture"
+                        )
+                        pipeline.create_task(self._recognize(), name="recognize")
+                finally:
+                    for task in service_tasks:
+                        task.cancel()
+        finally:
+            self.recognizer.on_result_ready = None
+            restore_signals()
+            self._capture_executor.shutdown()
+            self.report()
+
+    def _handle_signals(self, loop: asyncio.AbstractEventLoop) -> Callable[[], None]:
+        """
+        Stop on SIGINT and SIGTERM, where the loop supports signal handlers (not on Windows,
+        where the process's own handlers stay). Returns a function restoring the previous ones.
+        """
+        previous = {}
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            handler = signal.getsignal(sig)
+            try:
+                loop.add_signal_handler(sig, self.request_stop)
+            except (NotImplementedError, RuntimeError):
+                continue
+            previous[sig] = handler
+
+        def restore():
+            for sig, handler in previous.items():
+                loop.remove_signal_handler(sig)
+                signal.signal(sig, handler)
+
+        return restore
+
+    async def _capture(self):
+        loop = asyncio.get_running_loop()
+        try:
+            # Asked to stop before it started, there's no capture to cancel
+            while not self._stopping:
+                start = time.perf_counter()
+                ret, frame, ts = await loop.run_in_executor(
+                    self._capture_executor, self.video_cap.read
+                )
+                capture_secs = time.perf_counter() - start
+                self.stage_latency["capture"].add(capture_secs)
+
+                # Failed to get frame, bail
+                if not ret:
+                    if self.video_cap.finished:
+                        break
+                    print(f"Did not receive frame on attempt to read.")
+                    continue
+                await self._frames.put((frame, ts, capture_secs))
+            await self._frames.put(None)
+        except asyncio.CancelledError:
+            # Stopping: mark the end, dropping a frame to make room if need be
+            if self._frames.full():
+                self._frames.get_nowait()
+            self._frames.put_nowait(None)
+            raise
+
+    async def _recognize(self):
+        from .recognizer.hand_recognizer import FIRST_FRAMES_TRACKED
+
+        loop = asyncio.get_running_loop()
+        try:
+            # Stopping cancels the capture, which marks the end of the frames it captured,
+            # so those are all handled before this ends
+            while True:
+                captured = await self._frames.get()
+                if captured is None:
+                    break
+                frame, ts, capture_secs = captured
+                self.stage_timings.add("capture", capture_secs)
+
+                start = time.perf_counter()
+                await loop.run_in_executor(
+                    self._recognize_executor, self.recognizer.submit_frame, frame, ts
+                )
+                self.stage_latency["recognize"].add(time.perf_counter() - start)
+                # Results are handled after every frame, as in main.run,
+                # and in between whenever MediaPipe has more ready
+                snapshot = await self._process_results(self.viewer is not None)
+
+                latencies = self.recognizer.first_frame_latencies
+                if (
+                    not self._first_frames_reported
+                    and len(latencies) >= FIRST_FRAMES_TRACKED
+                ):
+                    report_first_frames(latencies)
+                    self._first_frames_reported = True
+
+                self.throughput.tick()
+
+                if self.on_frame is not None and await loop.run_in_executor(
+                    self._recognize_executor, self.on_frame, self.controller
+                ):
+                    self.stage_timings.end_frame(ts)
+                    break
+
+                if self.viewer is not None:
+                    start = time.perf_counter()
+                    self.viewer.publish(frame, snapshot)
+                    self.stage_timings.add("display", time.perf_counter() - start)
+                self.stage_timings.end_frame(ts)
+                # Quit if Q pressed in the viewer
+                if self.viewer is not None and self.viewer.quit_requested():
+                    break
+        finally:
+            self.request_stop()
+
+    async def _handle_results(self):
+        while True:
+            await self._results_ready.wait()
+            self._results_ready.clear()
+            await self._process_results(False)
+
+    async def _process_results(self, snapshot: bool) -> StateSnapshot | None:
+        start = time.perf_counter()
+        result = await asyncio.get_running_loop().run_in_executor(
+            self._recognize_executor, self._process_results_sync, snapshot
+        )
+        self.stage_latency["results"].add(time.perf_counter() - start)
+        return result
+
+    def _process_results_sync(self, snapshot: bool) -> StateSnapshot | None:
+        # Tracking and motion analysis run on the results, then the controller reacts
+        self.recognizer.process_results()
+        start = time.perf_counter()
+        self.controller.update()
+        self.stage_timings.add("controller", time.perf_counter() - start)
+        if self.session_store is not None:
+            start = time.perf_counter()
+            self.session_store.observe(self.recognizer, self.controller)
+            self.stage_timings.add("session", time.perf_counter() - start)
+        if snapshot:
+            start = time.perf_counter()
+            state = StateSnapshot.capture(self.recognizer, self.controller.state)
+            self.stage_timings.add("display", time.perf_counter() - start)
+            return state
+        return None
+
+    async def _probe_lag(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(LAG_PROBE_SECS)
+            self.loop_lag.add(max(0.0, loop.time() - start - LAG_PROBE_SECS))
+
+    async def _report_forever(self):
+        while True:
+            await asyncio.sleep(self.fps_report_secs)
+            self.report()
+
+    def report(self):
+        """Print the loop lag, and the latency of each stage, deadline and serial write."""
+        stats = {"loop lag": self.loop_lag}
+        stats.update(self.stage_latency)
+        stats["deadlines"] = self.scheduler.lateness
+        if isinstance(self.serial, AsyncRPSSerial):
+            stats["serial writes"] = self.serial.write_latency
+        print(
+            f"[{self.label}] "
+            + ", ".join(
+                f"{name} p50/p95 {stat.percentile(50) * 1000:.1f}/"
+                f"{stat.percentile(95) * 1000:.1f} ms"
+                for name, stat in stats.items()
+                if stat.count
+            )
+        )
+
+
+async def run_async(
+    video_cap: CameraCapture | ReplayCapture,
+    serial: RPSSerial,
+    display: str,
+    plot: str,
+    fps_report_secs: float,
+    idle_gate: IdleGate | None = None,
+    recognizer_workers: int = 0,
+    queue_events: bool = False,
+    num_hands: int = 1,
+    motion_config: MotionAnalyzerConfig | None = None,
+    on_frame: Callable[[GameController], bool] | None = None,
+    warm_up_frames: int = 0,
+    ready: Callable[[], object] | None = None,
+    inference_profile: InferenceProfile | None = None,
+    session_store: SessionStore | None = None,
+    plan_finger_release: bool = False,
+    stage_timings: StageTimings | None = None,
+):
+    """
+    Run the game loop on asyncio until quit, with the same options as main.run,
+    except that display is "none" or "process".
+    serial should be an AsyncRPSSerial, for commands never to block the event loop.
+    """
+    if display not in ASYNC_DISPLAYS:
+        raise ValueError(
+            f"The asyncio runtime can't display '{display}', expected one of "
+            f"{ASYNC_DISPLAYS}"
+        )
+
+    # Loaded here rather than at the top, as MediaPipe is slow to import
+    from .recognizer import HandRecognizer
+
+    loop = asyncio.get_running_loop()
+    profile = replace(
+        inference_profile or InferenceProfile(),
+        num_workers=recognizer_workers,
+        num_hands=num_hands,
+    )
+    recognize_executor = ThreadPoolExecutor(1, thread_name_prefix="recognize")
+    try:
+        recognizer = await loop.run_in_executor(
+            recognize_executor,
+            partial(
+                HandRecognizer.from_profile,
+                profile,
+                idle_gate=idle_gate,
+                queue_events=queue_events,
+                motion_config=motion_config,
+            ),
+        )
+        await loop.run_in_executor(recognize_executor, recognizer.__enter__)
+        try:
+            with (
+                ViewerProcess(plot) if display == "process" else nullcontext()
+            ) as viewer:
+                if warm_up_frames > 0:
+                    report_warm_up(
+                        await loop.run_in_executor(
+                            recognize_executor,
+                            recognizer.warm_up,
+                            [video_cap.frame_size],
+                            warm_up_frames,
+                        )
+                    )
+                if ready is not None:
+                    await loop.run_in_executor(None, ready)
+
+                # Shoot commands are sent by a task, on time regardless of the frame rate
+                scheduler = AsyncScheduler(loop)
+                controller = GameController(
+                    recognizer,
+                    serial,
+                    scheduler=scheduler,
+                    plan_finger_release=plan_finger_release,
+                )
+                try:
+                    await AsyncGameLoop(
+                        video_cap,
+                        recognizer,
+                        controller,
+                        scheduler,
+                        serial,
+                        recognize_executor,
+                        viewer=viewer,
+                        session_store=session_store,
+                        on_frame=on_frame,
+                        label=f"asyncio {display}",
+                        fps_report_secs=fps_report_secs,
+                        stage_timings=stage_timings,
+                    ).run()
+                finally:
+                    report_send_timings(controller)
+        finally:
+            await loop.run_in_executor(
+                recognize_executor, recognizer.__exit__, None, None, None
+            )
+    finally:
+        recognize_executor.shutdown()
@@ -0,0 +1,143 @@
+from collections import deque
+import time
+
+import cv2 as cv
+import numpy as np
+
+# Number of recent frames over which the driver-to-monotonic clock offset is estimated
+DRIVER_OFFSET_WINDOW = 120
+
+
+class CameraCapture:
+    """
+    Camera frame source that stamps each frame with its capture time on the monotonic clock
+    (time.monotonic()), which is the clock used throughout the pipeline.
+
+    Frames are stamped when grabbed, before decoding. If the driver reports its own frame
+    timestamps, they are mapped onto the monotonic clock and used instead, since they are
+    closer to the actual exposure time.
+    """
+
+    def __init__(
+        self,
+        cam_index: int,
+        api_preference: int = cv.CAP_DSHOW,
+        width: int | None = None,
+        height: int | None = None,
+    ):
+        self._cap = cv.VideoCapture(cam_index, api_preference)
+        if not self._cap.isOpened():
+            raise RuntimeError("Failed to open video camera")
+
+        if width:
+            self._cap.set(cv.CAP_PROP_FRAME_WIDTH, width)
+        if height:
+            self._cap.set(cv.CAP_PROP_FRAME_HEIGHT, height)
+
+        # Recent differences between host grab time and driver timestamp (secs)
+        self._driver_offsets: deque[float] = deque(maxlen=DRIVER_OFFSET_WINDOW)
+        self._last_driver_ts: float | None = None
+        self._last_ts: float | None = None
+        # A camera never runs out of frames
+        self.finished = False
+
+    def read(self) -> tuple[bool, np.ndarray | None, float | None]:
+        """
+        Read the next frame.
+        Returns (ok, frame, ts), where ts is the capture time on the monotonic clock.
+        """
+        if not self._cap.grab():
+            return False, None, None
+        host_ts = time.monotonic()
+        driver_ts = self._cap.get(cv.CAP_PROP_POS_MSEC) / 1000
+
+        ok, frame = self._cap.retrieve()
+        if not ok:
+            return False, None, None
+
+        ts = self._map_driver_ts(driver_ts, host_ts)
+        # Never go backwards, even if the mapping shifts
+        if self._last_ts is not None and ts <= self._last_ts:
+            ts = min(host_ts, self._last_ts + 1e-6)
+        self._last_ts = ts
+
+        return True, frame, ts
+
+    def _map_driver_ts(self, driver_ts: float, host_ts: float) -> float:
+        """
+        Map a driver timestamp onto the monotonic clock, falling back to host_ts
+        if the driver doesn't provide usable timestamps.
+        """
+        if driver_ts <= 0 or (
+            self._last_driver_ts is not None and driver_ts <= self._last_driver_ts
+        ):
+            self._driver_offsets.clear()
+            self._last_driver_ts = None
+            return host_ts
+        self._last_driver_ts = driver_ts
+
+        # The host always stamps after the driver, so the smallest recent difference
+        # is the best estimate of the offset between the clocks (least delivery latency)
+        self._driver_offsets.append(host_ts - driver_ts)
+        return driver_ts + min(self._driver_offsets)
+
+    def release(self):
+        self._cap.release()
+
+    @property
+    def frame_size(self) -> tuple[int, int]:
+        """(width, height) of the frames read."""
+        return (
+            int(self._cap.get(cv.CAP_PROP_FRAME_WIDTH)),
+            int(self._cap.get(cv.CAP_PROP_FRAME_HEIGHT)),
+        )
+
+
+class ReplayCapture:
+    """
+    Frame source that replays a recorded video file in place of a camera.
+
+    Frames are paced in real time by their recorded timestamps, and stamped with the time they
+    are due on the monotonic clock, so the rest of the pipeline behaves as with a live camera.
+    """
+
+    def __init__(self, path: str):
+        self._cap = cv.VideoCapture(path)
+        if not self._cap.isOpened():
+            raise RuntimeError(f"Failed to open video file {path}")
+
+        # Monotonic time corresponding to the start of the video
+        self._start: float | None = None
+        # Whether the end of the video was reached
+        self.finished = False
+
+    def read(self) -> tuple[bool, np.ndarray | None, float | None]:
+        """
+        Read the next frame, waiting until it is due.
+        Returns (ok, frame, ts), where ts is the time it was due on the monotonic clock.
+        """
+        ok, frame = self._cap.read()
+        if not ok:
+            self.finished = True
+            return False, None, None
+        video_ts = self._cap.get(cv.CAP_PROP_POS_MSEC) / 1000
+
+        now = time.monotonic()
+        if self._start is None:
+            self._start = now - video_ts
+        due = self._start + video_ts
+        if due > now:
+            time.sleep(due - now)
+
+        return True, frame, due
+
+    def release(self):
+        self._cap.release()
+
+    @property
+    def frame_size(self) -> tuple[int, int]:
+        """(width, height) of the frames read."""
+        return (
+            int(self._cap.get(cv.CAP_PROP_FRAME_WIDTH)),
+            int(self._cap.get(cv.CAP_PROP_FRAME_HEIGHT)),
+        )
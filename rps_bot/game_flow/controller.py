@@ -1,13 +1,33 @@
+from collections import deque
 from enum import Enum, auto
 import random
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+from functools import partial
+import threading
 import time
-
-from rps_bot.recognizer import HandRecognizer
+from typing import TYPE_CHECKING, Callable
+
+from rps_bot.recognizer.events import (
+    GAME_OFFER_MIN_PHASE,
+    GameCancelled,
+    GameOffered,
+    GesturePlayed,
+    Swinging,
+    SHOOT_PHASE,
+)
 from rps_bot.recognizer.gestures import GameResult, HandGesture
+from rps_bot.hand_planner import ReleasePlan
 from rps_bot.hand_serial import RPSSerial
+from .gesture_vote import DEFAULT_DECISION_MARGIN, GestureVote
+from .scheduler import Scheduler
+
+if TYPE_CHECKING:
+    # Only for annotations, as importing it loads MediaPipe
+    from rps_bot.recognizer import HandRecognizer
 
-WAIT_AFTER_SHOOT = 2
+# Frames captured within this long after shooting are ignored, while the player's hand settles
+GESTURE_VOTE_START_SECS = 0.2
+# Give up reading the player's gesture after this long, if the vote isn't decided
 MAX_WAIT_FOR_GESTURE_RECOGNITION = 2
 GAME_RESULTS_PAUSE_SECS = 3
 # How much in advance control signals should be sent before the actual require time
@@ -15,60 +35,221 @@ GAME_RESULTS_PAUSE_SECS = 3
 CONTROL_PREEMPT_SECS = 2
 
 
+def predicted_shoot_ts(swing: Swinging) -> float:
+    """When a swing is predicted to shoot, extrapolated from its phase if not predicted."""
+    if swing.move_eta is not None:
+        return swing.move_eta
+    return swing.ts + (SHOOT_PHASE - swing.est_current_phase) * swing.est_period_secs
+
+
 class GameController:
-    def __init__(self, recognizer: HandRecognizer, serial: RPSSerial = None):
+    def __init__(
+        self,
+        recognizer: "HandRecognizer",
+        serial: RPSSerial = None,
+        clock: Callable[[], float] = time.monotonic,
+        scheduler: Scheduler | None = None,
+        gesture_decision_margin: float = DEFAULT_DECISION_MARGIN,
+        plan_finger_release: bool = False,
+    ):
         self.recognizer = recognizer
         self.state = GameStage.WAITING
         self.serial = serial
+        # Current time, on the same clock as the frame capture timestamps
+        self.clock = clock
+        # Runs the shoot commands at their predicted deadlines.
+        # By default they're only run from update(), a DeadlineTimer runs them on time.
+        self.scheduler = scheduler or Scheduler(clock)
+        # Confidence margin needed to read the player's gesture before the max wait
+        self.gesture_decision_margin = gesture_decision_margin
+        # Whether each finger is released on its own, for all to arrive at the shoot,
+        # rather than the whole pose being sent the control delay before it.
+        # Only possible with a serial connection given the fingers' measured timing,
+        # as it estimates the finger positions and times the releases from it.
+        if plan_finger_release and (serial is None or not serial.can_plan):
+            raise ValueError(
+                "Planning finger releases needs a serial connection with the fingers' "
+                "measured timing"
+            )
+        self.plan_finger_release = plan_finger_release
+
+        # Event callbacks may come from a listener thread, so state changes are serialized
+        self._lock = threading.RLock()
+
+        # Ideal and actual times the shoot commands were sent, to measure scheduling error
+        self.send_timings: deque[SendTiming] = deque(maxlen=1000)
+
+        recognizer.add_event_listener(GameOffered, self.on_game_offered)
+        recognizer.add_event_listener(Swinging, self.on_swinging)
+        recognizer.add_event_listener(GameCancelled, self.on_game_cancelled)
+        recognizer.add_event_listener(GesturePlayed, self.on_gesture_played)
 
     def update(self):
-        match self.state:
-            case GameStage.WAITING:
-                self.update_waiting()
-            case PlayingState(_):
-                self.update_playing()
-            case PendingState(_):
-                self.update_pending()
-            case GameEndState(_):
-                self.update_game_end()
+        """
+        Make the transitions that depend on time passing rather than on recognizer events.
+        Should be called regularly, e.g. once per frame.
+        """
+        self.scheduler.poll()
+
+        with self._lock:
+            # Only let the recognizer skip frames while nobody is playing
+            self.recognizer.idle_allowed = self.state == GameStage.WAITING
+
+            match self.state:
+                case PlayingState(_):
+                    self.update_playing()
+                case PendingState(_):
+                    self.update_pending()
+                case GameEndState(_):
+                    self.update_game_end()
+
+    def on_game_offered(self, event: GameOffered):
+        with self._lock:
+            if self.state == GameStage.WAITING:
+                self.state = PlayingState(started_shoot_move=None)
+
+    def on_swinging(self, event: Swinging):
+        with self._lock:
+            # GameOffered is only emitted once per motion, so if it came while the last
+            # game was still pending or ending, the motion still going starts the next one.
+            # The motion goes on after a shoot too, so only a swing that's yet to shoot
+            # does, not the last game's motion winding down.
+            if (
+                self.state == GameStage.WAITING
+                and GAME_OFFER_MIN_PHASE < event.est_current_phase < SHOOT_PHASE
+                and predicted_shoot_ts(event) > self.clock()
+            ):
+                self.state = PlayingState(started_shoot_move=None)
+            if isinstance(self.state, PlayingState):
+                self.state.swing = event
+                self.schedule_shoot()
+
+    def on_game_cancelled(self, event: GameCancelled):
+        with self._lock:
+            if isinstance(self.state, PlayingState):
+                self.cancel_shoot()
+                # Reset robot hand gesture
+                if self.serial:
+                    self.serial.paper()
 
-    def update_waiting(self):
-        if (
-            self.recognizer.motion_predictor.est_phase
-            and self.recognizer.motion_predictor.est_phase > 0.5
-        ):
-            self.state = PlayingState(started_shoot_move=None)
+                self.state = GameStage.WAITING
+
+    def on_gesture_played(self, event: GesturePlayed):
+        with self._lock:
+            if (
+                isinstance(self.state, PendingState)
+                and event.ts >= self.state.ts_shoot + GESTURE_VOTE_START_SECS
+            ):
+                self.state.vote.add(event.gesture, event.score)
+                self.update_pending()
 
     def update_playing(self):
         assert isinstance(self.state, PlayingState)
 
-        est_phase = self.recognizer.motion_predictor.est_phase
+        # No prediction for the motion yet
+        if self.state.swing is None:
+            return
 
-        if est_phase is None or est_phase < 0.5:
-            # Reset robot hand gesture
-            if self.serial:
-                self.serial.paper()
+        self.bob_if_needed()
 
-            self.state = GameStage.WAITING
+    def schedule_shoot(self):
+        """
+        (Re)schedule the shoot commands from the latest motion prediction.
+        The shoot movement is started the control delay before the predicted shoot time,
+        or right away if that's already passed.
+        """
+        assert isinstance(self.state, PlayingState)
+
+        shoot_ts = predicted_shoot_ts(self.state.swing)
+
+        if self.plan_finger_release:
+            self.schedule_releases(shoot_ts)
+        elif self.state.started_shoot_move is None:
+            self.scheduler.schedule(
+                "start_shoot",
+                shoot_ts - CONTROL_PREEMPT_SECS,
+                self._on_start_shoot_deadline,
+            )
+        self.scheduler.schedule("shoot", shoot_ts, self._on_shoot_deadline)
+
+    def schedule_releases(self, shoot_ts: float):
+        """
+        (Re)schedule the release of each finger not yet released, for all of them to
+        arrive at shoot_ts. The move is picked, and the release planned, on the first call,
+        and later calls only re-time the plan.
+        """
+        assert isinstance(self.state, PlayingState)
+
+        if self.state.release_plan is None:
+            self.state.bot_move = self.pick_move()
+            self.state.release_plan = self.serial.plan_pose(
+                self.state.bot_move.value, shoot_ts
+            )
         else:
-            self.bob_if_needed()
+            self.state.release_plan = self.state.release_plan.retimed(shoot_ts)
+
+        for motor, release_ts in self.state.release_plan.releases.items():
+            if motor not in self.state.released:
+                self.scheduler.schedule(
+                    ("release", motor),
+                    release_ts,
+                    partial(self._on_release_deadline, motor),
+                )
+
+    def cancel_shoot(self):
+        self.scheduler.cancel("start_shoot")
+        self.scheduler.cancel("shoot")
+        if isinstance(self.state, PlayingState) and self.state.release_plan:
+            for motor in self.state.release_plan.goals:
+                self.scheduler.cancel(("release", motor))
+
+    def _on_start_shoot_deadline(self, deadline: float):
+        with self._lock:
             if (
-                self.state.started_shoot_move is None
-                and est_phase >= self.delay_compensate_phase(4, CONTROL_PREEMPT_SECS)
+                isinstance(self.state, PlayingState)
+                and self.state.started_shoot_move is None
             ):
                 self.start_shoot_movement()
-            elif est_phase >= 4:
-                self.shoot()
+                self.send_timings.append(
+                    SendTiming("start_shoot", deadline, self.clock())
+                )
+
+    def _on_release_deadline(self, motor: int, deadline: float):
+        with self._lock:
+            if (
+                isinstance(self.state, PlayingState)
+                and self.state.release_plan is not None
+                and motor not in self.state.released
+            ):
+                self.release_fingers([motor])
+                now = self.clock()
+                self.send_timings.append(SendTiming("release", deadline, now))
+                if len(self.state.released) == 1:
+                    self.send_timings.append(SendTiming("start_shoot", deadline, now))
+
+    def release_fingers(self, motors: list[int]):
+        """Release fingers (by motor ID) toward the planned pose."""
+        assert isinstance(self.state, PlayingState)
+
+        self.serial.release(self.state.release_plan, motors)
+        self.state.released.update(motors)
+        self.state.started_shoot_move = self.state.bot_move
+
+    def _on_shoot_deadline(self, deadline: float):
+        with self._lock:
+            if isinstance(self.state, PlayingState):
+                self.shoot(predicted_ts=deadline)
+                self.send_timings.append(SendTiming("shoot", deadline, self.clock()))
 
     def bob_if_needed(self):
         assert isinstance(self.state, PlayingState)
 
         if (
             self.state.last_bob_time is None
-            or time.time() - self.state.last_bob_time
-            >= self.recognizer.motion_predictor.est_period
+            or self.clock() - self.state.last_bob_time
+            >= self.state.swing.est_period_secs
         ):
-            self.state.last_bob_time = time.time()
+            self.state.last_bob_time = self.clock()
             if self.serial:
                 self.serial.bob()
 
@@ -78,8 +259,7 @@ class GameController:
             and self.state.started_shoot_move is None
         )
 
-        # Pick the move to play
-        bot_move = random.choice([HandGesture.ROCK, HandGesture.SCISSORS])
+        bot_move = self.pick_move()
         # Set control to make gesture
         if self.serial:
             match bot_move:
@@ -92,60 +272,107 @@ class GameController:
 
         self.state.started_shoot_move = bot_move
 
-    def shoot(self):
+    def pick_move(self) -> HandGesture:
+        """Pick the move to play."""
+        return random.choice([HandGesture.ROCK, HandGesture.SCISSORS])
+
+    def shoot(self, predicted_ts: float | None = None):
+        """Shoot now. predicted_ts is the shoot time predicted from the motion, if any."""
         assert isinstance(self.state, PlayingState)
 
+        # Release any fingers not released yet, late
+        if self.state.release_plan is not None:
+            unreleased = [
+                motor
+                for motor in self.state.release_plan.goals
+                if motor not in self.state.released
+            ]
+            if unreleased:
+                self.release_fingers(unreleased)
+            # All fingers may already be at the goal, with none to release
+            self.state.started_shoot_move = self.state.bot_move
         # If haven't started bot movement yet (no preempt), do it now
         if self.state.started_shoot_move is None:
             self.start_shoot_movement()
+        self.cancel_shoot()
 
         # Transition to waiting for result to be recognized
-        self.state = PendingState(time.time(), self.state.started_shoot_move)
+        self.state = PendingState(
+            self.clock(),
+            self.state.started_shoot_move,
+            GestureVote(self.gesture_decision_margin),
+            predicted_ts,
+        )
 
     def update_pending(self):
         assert isinstance(self.state, PendingState)
 
-        time_since_shoot = time.time() - self.state.ts_shoot
+        time_since_shoot = self.clock() - self.state.ts_shoot
+        vote = self.state.vote
 
-        # Wait a moment after shooting before trying to read result
-        if time_since_shoot < WAIT_AFTER_SHOOT:
+        # Read the result as soon as the player's gesture is recognized confidently,
+        # otherwise settle for the best guess once too much time has passed
+        if (
+            not vote.is_decided()
+            and time_since_shoot < MAX_WAIT_FOR_GESTURE_RECOGNITION
+        ):
             return
 
-        # Try to determine result
-        # Check if a gesture is recognized
-        player_move = self.recognizer.get_gesture()
-        # If so, compare against own move
-        if player_move is not None and player_move != HandGesture.NONE:
+        player_move = vote.leader()
+        # If a gesture was recognized, compare against own move
+        if player_move is not None:
             result = self.state.bot_move.versus(player_move)
             # ... control update
             self.state = GameEndState(
-                time.time(),
+                self.clock(),
                 self.state.bot_move,
                 player_move,
                 result,
-                self.recognizer.get_gesture_score(),
+                vote.mean_score(player_move),
+                self.state.ts_shoot,
+                self.state.predicted_ts_shoot,
             )
-        elif time_since_shoot >= MAX_WAIT_FOR_GESTURE_RECOGNITION:
-            # Too much time has passed
+        else:
             self.state = GameEndState(
-                time.time(), self.state.bot_move, player_move, GameResult.UNKNOWN, None
+                self.clock(),
+                self.state.bot_move,
+                None,
+                GameResult.UNKNOWN,
+                None,
+                self.state.ts_shoot,
+                self.state.predicted_ts_shoot,
             )
 
     def update_game_end(self):
-        if time.time() - self.state.ts_game_end >= GAME_RESULTS_PAUSE_SECS:
+        if self.clock() - self.state.ts_game_end >= GAME_RESULTS_PAUSE_SECS:
             # Reset robot hand gesture
             if self.serial:
                 self.serial.paper()
             # Transition back to waiting state
             self.state = GameStage.WAITING
 
-    def delay_compensate_phase(self, phase: int, control_delay: float):
-        """"""
-        control_delay_phases = (
-            control_delay / self.recognizer.motion_predictor.est_period
-        )
-        # Clamp neg values to 0
-        return max(0, phase - control_delay_phases)
+    def send_timing_errors(self, command: str | None = None) -> list[float]:
+        """
+        Errors (secs) of the actual times the shoot commands were sent,
+        relative to their ideal times, optionally for only one command.
+        Positive is late.
+        """
+        with self._lock:
+            return [
+                timing.actual_ts - timing.ideal_ts
+                for timing in self.send_timings
+                if command is None or timing.command == command
+            ]
+
+
+@dataclass
+class SendTiming:
+    # "start_shoot", "shoot", or "release" of a finger
+    command: str
+    # Time the command was scheduled for, from the latest prediction
+    ideal_ts: float
+    # Time the command was actually sent
+    actual_ts: float
 
 
 class GameStage(Enum):
@@ -155,13 +382,24 @@ class GameStage(Enum):
 @dataclass
 class PlayingState:
     started_shoot_move: HandGesture | None
+    # The latest motion prediction
+    swing: Swinging | None = None
     last_bob_time = None
+    # If releasing fingers on their own: the move picked, its plan, and the fingers
+    # (motor IDs) released so far
+    bot_move: HandGesture | None = None
+    release_plan: ReleasePlan | None = None
+    released: set[int] = field(default_factory=set)
 
 
 @dataclass
 class PendingState:
     ts_shoot: float
     bot_move: HandGesture
+    # Vote over the gestures recognized since shooting
+    vote: GestureVote = field(default_factory=GestureVote)
+    # The shoot time predicted from the motion, which ts_shoot was scheduled for
+    predicted_ts_shoot: float | None = None
 
 
 @dataclass
@@ -171,3 +409,6 @@ class GameEndState:
     player_move: HandGesture
     result: GameResult
     gesture_score: float | None
+    # When the bot shot, and when the motion predicted it should
+    ts_shoot: float | None = None
+    predicted_ts_shoot: float | None = None
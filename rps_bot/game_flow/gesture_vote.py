@@ -0,0 +1,51 @@
+from rps_bot.recognizer.gestures import HandGesture
+
+# How far the leading gesture's total confidence must be ahead of the runner-up's
+# for the vote to be decided
+DEFAULT_DECISION_MARGIN = 3.0
+
+
+class GestureVote:
+    """
+    Streaming vote over the gestures recognized in consecutive frames,
+    each weighted by its recognition confidence.
+
+    The vote is decided once the leading gesture's total confidence is ahead of
+    every other gesture's by the decision margin, so a few confident frames are enough
+    and a single misclassified frame can't decide it.
+    NONE (no hand, or a hand that isn't playing) doesn't count for anything.
+    """
+
+    def __init__(self, decision_margin: float = DEFAULT_DECISION_MARGIN):
+        self.decision_margin = decision_margin
+        # Total confidence and number of votes of each gesture
+        self.totals: dict[HandGesture, float] = {}
+        self.counts: dict[HandGesture, int] = {}
+
+    def add(self, gesture: HandGesture, score: float | None):
+        if gesture == HandGesture.NONE or score is None:
+            return
+        self.totals[gesture] = self.totals.get(gesture, 0) + score
+        self.counts[gesture] = self.counts.get(gesture, 0) + 1
+
+    def leader(self) -> HandGesture | None:
+        """The gesture with the most total confidence so far, None if there are no votes."""
+        if not self.totals:
+            return None
+        return max(self.totals, key=self.totals.get)
+
+    def is_decided(self) -> bool:
+        leader = self.leader()
+        if leader is None:
+            return False
+        runner_up = max(
+            (total for gesture, total in self.totals.items() if gesture != leader),
+            default=0,
+        )
+        return self.totals[leader] - runner_up >= self.decision_margin
+
+    def mean_score(self, gesture: HandGesture) -> float | None:
+        """Mean confidence of the votes for a gesture, None if it has none."""
+        if gesture not in self.counts:
+            return None
+        return self.totals[gesture] / self.counts[gesture]
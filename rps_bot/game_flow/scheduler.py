@@ -0,0 +1,213 @@
+import asyncio
+from collections.abc import Callable, Hashable
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import time
+import traceback
+
+from ..metrics import LatencyStats
+
+# How long before a deadline the timer thread stops sleeping and spins, for precision
+DEFAULT_SPIN_SECS = 0.002
+
+
+class Scheduler:
+    """
+    Runs jobs once their deadlines pass, whenever poll() is called.
+    Jobs are keyed, and scheduling a job under a key that's already scheduled replaces it,
+    so a job can be re-scheduled as predictions change.
+    Jobs are called with the deadline they were scheduled for.
+
+    Works with any clock, e.g. a virtual clock when replaying or simulating.
+    """
+
+    def __init__(self, clock: Callable[[], float] = time.monotonic):
+        self.clock = clock
+        # Scheduled jobs by key, as (deadline, job)
+        self._jobs: dict[Hashable, tuple[float, Callable[[float], None]]] = {}
+        self._cond = threading.Condition()
+
+    def schedule(self, key: Hashable, deadline: float, job: Callable[[float], None]):
+        with self._cond:
+            self._jobs[key] = (deadline, job)
+            self._cond.notify()
+
+    def cancel(self, key: Hashable):
+        """Unschedule a job. Does nothing if not scheduled."""
+        with self._cond:
+            self._jobs.pop(key, None)
+            self._cond.notify()
+
+    def deadline(self, key: Hashable) -> float | None:
+        """The deadline a job is scheduled for, or None if not scheduled."""
+        with self._cond:
+            scheduled = self._jobs.get(key)
+        return scheduled[0] if scheduled else None
+
+    def next_deadline(self) -> float | None:
+        """The earliest deadline scheduled, or None if nothing is."""
+        with self._cond:
+            return min((deadline for deadline, _ in self._jobs.values()), default=None)
+
+    def poll(self):
+        """Run all jobs whose deadlines have passed, earliest first."""
+        now = self.clock()
+        with self._cond:
+            due = sorted(
+                (deadline, key, job)
+                for key, (deadline, job) in self._jobs.items()
+                if deadline <= now
+            )
+            for _, key, _ in due:
+                del self._jobs[key]
+        for deadline, _, job in due:
+            job(deadline)
+
+
+class DeadlineTimer(Scheduler):
+    """
+    Scheduler that runs jobs from its own thread as soon as their deadlines pass,
+    independent of how often anything else runs.
+    It sleeps until shortly before the earliest deadline, then spins to hit it precisely.
+    Requires a real clock.
+    """
+
+    def __init__(
+        self,
+        clock: Callable[[], float] = time.monotonic,
+        spin_secs: float = DEFAULT_SPIN_SECS,
+    ):
+        super().__init__(clock)
+        self._spin_secs = spin_secs
+        self._stopped = False
+        self._thread = threading.Thread(
+            target=self._run, name="rps-deadlines", daemon=True
+        )
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+        self._thread.join()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_tb):
+        self.stop()
+
+    def poll(self):
+        # Jobs are run by the timer thread
+        pass
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if self._stopped:
+                    return
+                if not self._jobs:
+                    self._cond.wait()
+                    continue
+
+                key, (deadline, job) = min(
+                    self._jobs.items(), key=lambda item: item[1][0]
+                )
+                remaining = deadline - self.clock()
+                if remaining > self._spin_secs:
+                    # Wake early, or when jobs change
+                    self._cond.wait(remaining - self._spin_secs)
+                    continue
+
+            # Spin for the last stretch, without holding the lock
+            while self.clock() < deadline:
+                pass
+
+            with self._cond:
+                # Skip if re-scheduled or cancelled meanwhile
+                if self._jobs.get(key) != (deadline, job):
+                    continue
+                del self._jobs[key]
+
+            try:
+                job(deadline)
+            except Exception:
+                traceback.print_exc()
+
+
+class AsyncScheduler(Scheduler):
+    """
+    Scheduler whose jobs are run as soon as their deadlines pass, timed by an asyncio task,
+    run(), on the event loop it's given. Jobs may be scheduled and cancelled from any thread.
+    Like DeadlineTimer, it sleeps until shortly before the earliest deadline, then spins,
+    though yielding to the loop's other tasks as it spins. How late jobs run is recorded.
+
+    The jobs themselves run on a thread of their own, as on DeadlineTimer's, not on the
+    event loop: the controller's jobs take its lock, which other threads hold, and waiting
+    for it on the loop would stall every other task.
+    """
+
+    def __init__(
+        self,
+        loop: asyncio.AbstractEventLoop,
+        clock: Callable[[], float] = time.monotonic,
+        spin_secs: float = DEFAULT_SPIN_SECS,
+    ):
+        super().__init__(clock)
+        self._loop = loop
+        self._spin_secs = spin_secs
+        self._changed = asyncio.Event()
+        self._executor = ThreadPoolExecutor(1, thread_name_prefix="rps-deadlines")
+        # How late (secs) the earliest due job was run, each time jobs were run
+        self.lateness = LatencyStats()
+
+    def schedule(self, key: Hashable, deadline: float, job: Callable[[float], None]):
+        super().schedule(key, deadline, job)
+        self._loop.call_soon_threadsafe(self._changed.set)
+
+    def cancel(self, key: Hashable):
+        super().cancel(key)
+        self._loop.call_soon_threadsafe(self._changed.set)
+
+    def poll(self):
+        # Jobs are run by run()
+        pass
+
+    async def run(self):
+        """Run jobs at their deadlines, until cancelled."""
+        try:
+            while True:
+                self._changed.clear()
+                deadline = self.next_deadline()
+                if deadline is None:
+                    await self._changed.wait()
+                    continue
+                remaining = deadline - self.clock()
+                if remaining > self._spin_secs:
+                    try:
+                        # Wake shortly before the deadline, or earlier when jobs change
+                        await asyncio.wait_for(
+                            self._changed.wait(), remaining - self._spin_secs
+                        )
+                    except TimeoutError:
+                        pass
+                    continue
+                if remaining > 0:
+                    await asyncio.sleep(0)
+                    continue
+                await self._loop.run_in_executor(
+                    self._executor, self._run_due, deadline
+                )
+        finally:
+            # Jobs already started finish on their thread
+            self._executor.shutdown(wait=False)
+
+    def _run_due(self, deadline: float):
+        self.lateness.add(self.clock() - deadline)
+        try:
+            super().poll()
+        except Exception:
+            traceback.print_exc()
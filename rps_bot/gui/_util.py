@@ -1,4 +1,3 @@
-from mediapipe.tasks.python.vision.hand_landmarker import HandLandmark
 from mediapipe.python.solutions import (
     drawing_utils as mp_drawing,
     drawing_styles as mp_drawing_styles,
@@ -8,39 +7,38 @@ from mediapipe.framework.formats import landmark_pb2
 import numpy as np
 import cv2 as cv
 
-from rps_bot.recognizer import HandRecognizer
+from rps_bot.recognizer._util import bbox_screen_to_cam
+from rps_bot.shared_state import StateSnapshot
 
 
-def annotate_frame(frame: np.array, recognizer: HandRecognizer):
-    landmarks = recognizer.get_hand_landmarks()
-    if landmarks:
-        _draw_hand_landmarks(frame, landmarks)
+def annotate_frame(frame: np.array, snapshot: StateSnapshot):
+    if snapshot.landmarks is not None:
+        _draw_hand_landmarks(frame, snapshot.landmarks)
 
-    bbox = recognizer.tracker.get_hand_bbox_camera(frame.shape)
-    if bbox:
-        if recognizer.is_hand_recognized():
+    if snapshot.roi_screen:
+        bbox = bbox_screen_to_cam(snapshot.roi_screen, frame.shape)
+        if snapshot.hand_recognized:
             box_color = (255, 255, 255)
         else:
             box_color = (0, 208, 255)
-            filtered_sample = recognizer.motion_predictor.filtered_history[-1]
-            if filtered_sample is not None:
-                filtered_height = int(filtered_sample[0] * frame.shape[0])
+            if snapshot.latest_filtered_y is not None:
+                filtered_height = int(snapshot.latest_filtered_y * frame.shape[0])
                 bbox_center_y = bbox[1] + bbox[3] // 2
                 diff_y = filtered_height - bbox_center_y
                 bbox = (bbox[0], bbox[1] + diff_y, bbox[2], bbox[3])
         cv.rectangle(frame, bbox, box_color, 2, 1)
 
 
-def _draw_hand_landmarks(frame: np.ndarray, hand_landmarks: list[HandLandmark]):
+def _draw_hand_landmarks(frame: np.ndarray, hand_landmarks: np.ndarray):
     """
-    Draw hand landmarks on the given frame.
+    Draw hand landmarks (21x3 array of screen coords) on the given frame.
     Adapted directly from MP code example.
     """
     hand_landmarks_proto = landmark_pb2.NormalizedLandmarkList()
     hand_landmarks_proto.landmark.extend(
         [
-            landmark_pb2.NormalizedLandmark(x=landmark.x, y=landmark.y, z=landmark.z)
-            for landmark in hand_landmarks
+            landmark_pb2.NormalizedLandmark(x=x, y=y, z=z)
+            for x, y, z in hand_landmarks.tolist()
         ]
     )
     mp_drawing.draw_landmarks(
@@ -3,9 +3,8 @@ import matplotlib.style as mplstyle
 
 import time
 
-from rps_bot.recognizer import HandRecognizer
+from rps_bot.shared_state import StateSnapshot
 from .game_state import LiveGameStatePlot
-from rps_bot.game_flow.controller import GameStage
 
 mplstyle.use(["fast"])
 
@@ -21,23 +20,21 @@ class GuiMainFigure:
         plt.ion()
         plt.show()
 
-    def update(self, recognizer: HandRecognizer, stage: GameStage):
-        preds = recognizer.motion_predictor.filtered_from_last_n_secs(3)
-        ts = [p[0] for p in preds]
-        y = [p[1][0] for p in preds]
-        # vy = [p[1][1] for p in preds]
+    def update(self, snapshot: StateSnapshot):
+        ts = snapshot.filtered[:, 0]
+        y = snapshot.filtered[:, 1]
+        # vy = snapshot.filtered[:, 2]
 
         self.hand_height_plt.set_data(ts, y)
 
-        peaks = [p.ts for p in recognizer.motion_predictor.turning_points]
-        self.hand_height_plt.axvlines(peaks)
+        self.hand_height_plt.axvlines(snapshot.turning_points)
 
-        self.game_state_plt.update(stage)
+        self.game_state_plt.update(snapshot.game_state)
 
-        eta = recognizer.motion_predictor.move_eta
+        eta = snapshot.move_eta
         self.motion_pred_plot.update_phase(
-            recognizer.motion_predictor.est_phase or 0,
-            f"+{(eta - time.time()):.1f}s" if eta else "Shoot",
+            snapshot.est_phase or 0,
+            f"+{(eta - time.monotonic()):.1f}s" if eta else "Shoot",
         )
 
         # Draw
@@ -74,7 +71,7 @@ class LiveDataPlot:
         self.line.set_ydata(vals)
         # Adjust bounds of time axis.
         # Slides to the right over time. Will appear as if data is shifting left over time.
-        self.ax.set_xlim(time.time() - self.time_range_secs, time.time())
+        self.ax.set_xlim(time.monotonic() - self.time_range_secs, time.monotonic())
 
     def axvlines(self, x):
         for line in self.ax.lines[1:]:
@@ -1,9 +1,8 @@
 import pyqtgraph as pg
-import numpy as np
 
 import time
 
-from rps_bot.recognizer import HandRecognizer, HandGesture
+from rps_bot.shared_state import StateSnapshot
 
 
 class RecognizerFigureQt:
@@ -40,26 +39,24 @@ class RecognizerFigureQt:
 
         self.inflines = []
 
-    def update(self, recognizer: HandRecognizer):
-        preds = recognizer.motion_predictor.filtered_from_last_n_secs(
-            self.time_range_secs
-        )
-        ts = np.array([p[0] for p in preds])
-        y = np.array([p[1][0] for p in preds]).reshape(-1)
-        peaks = [p.ts for p in recognizer.motion_predictor.turning_points]
+    def update(self, snapshot: StateSnapshot):
+        ts = snapshot.filtered[:, 0]
+        y = snapshot.filtered[:, 1]
+        peaks = snapshot.turning_points
 
         self.curve1.setData(x=ts, y=y)
-        self.p1.setXRange(time.time() - self.time_range_secs, time.time())
+        self.p1.setXRange(time.monotonic() - self.time_range_secs, time.monotonic())
 
         for p in self.inflines:
             self.p1.removeItem(p)
+        self.inflines.clear()
         for p in peaks:
             inf = pg.InfiniteLine(pos=p, angle=90)
             self.p1.addItem(inf)
             self.inflines.append(inf)
 
-        gesture = recognizer.get_gesture()
-        gesture_score = recognizer.get_gesture_score()
+        gesture = snapshot.gesture
+        gesture_score = snapshot.gesture_score
         if gesture is None:
             self.gesture_label.setText(f"Gesture Prediction: (No prediction)")
         else:
@@ -67,6 +64,13 @@ class RecognizerFigureQt:
                 f"Gesture Prediction: {gesture.value} ({gesture_score:.2f})"
             )
 
-        self.phase_bar.setOpts(
-            x0=0, width=recognizer.motion_predictor.est_phase or 0, height=1
-        )
+        self.phase_bar.setOpts(x0=0, width=snapshot.est_phase or 0, height=1)
+
+        # Keep the window responsive, since there is no Qt event loop running
+        self.app.processEvents()
+
+    def show(self):
+        self.win.show()
+
+    def close(self):
+        self.win.close()
@@ -0,0 +1,140 @@
+"""
+Tells when the fingers have settled during calibration, from the positions and speeds the
+finger board reports, so each step goes on as soon as they have, rather than after a fixed
+wait long enough for the slowest finger from the furthest position.
+
+A finger has settled once it has arrived at its goal, or stalled short of it: it reports
+no speed and hasn't moved for a while, as against the hard stop calibration drives it to.
+A finger only counts as stalled once it has been seen moving, or after a start grace
+period, for one already at its stop, so one not started yet (the command still on its way,
+or the motor spinning up) isn't taken for stalled, and zeroed short of the stop.
+"""
+
+from dataclasses import dataclass, field
+
+from .hand_protocol import MotorState
+
+# Fingers this close to their goal (encoder ticks) have arrived
+ARRIVED_TOLERANCE_TICKS = 5
+# Fingers reporting at most this speed (ticks per second), and moving at most
+# STALL_TICKS in STALL_SECS, have stalled
+STALL_SPEED_TICKS_PER_SEC = 50
+STALL_TICKS = 5
+STALL_SECS = 0.15
+# Fingers not seen moving this long after the move was sent, plus the command latency
+# if known, are taken to be already at their stop
+START_GRACE_SECS = 0.5
+
+ARRIVED = "arrived"
+STALLED = "stalled"
+
+
+class SettleDetector:
+    """
+    Follows the reported state of motors moving to their goals (by motor ID),
+    and tells when each has arrived or stalled.
+    """
+
+    def __init__(
+        self,
+        goals: dict[int, float],
+        start_ts: float,
+        start_grace_secs: float = START_GRACE_SECS,
+        arrived_tolerance_ticks: float = ARRIVED_TOLERANCE_TICKS,
+        stall_secs: float = STALL_SECS,
+        stall_ticks: float = STALL_TICKS,
+        stall_speed_ticks_per_sec: float = STALL_SPEED_TICKS_PER_SEC,
+    ):
+        self.goals = goals
+        # When the move was sent
+        self.start_ts = start_ts
+        self.start_grace_secs = start_grace_secs
+        self.arrived_tolerance_ticks = arrived_tolerance_ticks
+        self.stall_secs = stall_secs
+        self.stall_ticks = stall_ticks
+        self.stall_speed_ticks_per_sec = stall_speed_ticks_per_sec
+        # How each motor has settled, ARRIVED or STALLED, by motor ID
+        self.outcomes: dict[int, str] = {}
+        # Position of each motor when it last moved more than stall_ticks, and when
+        self._moved_pos: dict[int, float] = {}
+        self._moved_ts: dict[int, float] = {}
+        # Motors seen moving since the move was sent
+        self._started: set[int] = set()
+
+    @property
+    def settled(self) -> bool:
+        return len(self.outcomes) == len(self.goals)
+
+    def update(self, ts: float, states: dict[int, MotorState]) -> bool:
+        """Take the motors' state reported at ts. Returns whether all have settled."""
+        for motor, goal in self.goals.items():
+            if motor not in states:
+                continue
+            position, speed = states[motor]
+            if motor not in self._moved_pos:
+                self._moved_pos[motor] = position
+                self._moved_ts[motor] = ts
+            elif abs(position - self._moved_pos[motor]) > self.stall_ticks:
+                self._moved_pos[motor] = position
+                self._moved_ts[motor] = ts
+                self._started.add(motor)
+            if abs(speed) > self.stall_speed_ticks_per_sec:
+                self._started.add(motor)
+            if abs(position - goal) <= self.arrived_tolerance_ticks:
+                self.outcomes[motor] = ARRIVED
+            elif (
+                abs(speed) <= self.stall_speed_ticks_per_sec
+                and ts - self._moved_ts[motor] >= self.stall_secs
+                and (
+                    motor in self._started
+                    or ts - self.start_ts >= self.start_grace_secs
+                )
+            ):
+                self.outcomes[motor] = STALLED
+            else:
+                self.outcomes.pop(motor, None)
+        return self.settled
+
+
+@dataclass
+class CalibrationStep:
+    """A step of calibration: a move, or zeroing, and waiting for the fingers to settle."""
+
+    name: str
+    secs: float
+    # How each finger settled, by motor ID, empty if waited out without telemetry
+    outcomes: dict[int, str] = field(default_factory=dict)
+    # Whether the step waited out its whole timeout, not seeing all fingers settle
+    timed_out: bool = False
+
+    def __str__(self) -> str:
+        counts = [
+            f"{list(self.outcomes.values()).count(outcome)} {outcome}"
+            for outcome in (ARRIVED, STALLED)
+            if outcome in self.outcomes.values()
+        ]
+        if self.timed_out:
+            counts.append("timed out")
+        return f"{self.name} {self.secs:.2f} s" + (
+            f" ({', '.join(counts)})" if counts else ""
+        )
+
+
+@dataclass
+class CalibrationReport:
+    """How long a calibration took, step by step."""
+
+    steps: list[CalibrationStep] = field(default_factory=list)
+    # Whether the finger board answered state queries, so the steps waited on telemetry
+    telemetry: bool = True
+
+    @property
+    def secs(self) -> float:
+        return sum(step.secs for step in self.steps)
+
+    def __str__(self) -> str:
+        return (
+            f"Calibrated in {self.secs:.2f} s"
+            f"{'' if self.telemetry else ' (no telemetry, fixed waits)'}: "
+            + ", ".join(str(step) for step in self.steps)
+        )
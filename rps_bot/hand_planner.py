@@ -0,0 +1,110 @@
+"""
+Plans when to release each finger toward a pose, so that all fingers finish moving together
+at the predicted shoot time, rather than at different times and early, giving the move away.
+
+A finger released on its own moves at its speed limit, so its travel time follows from how
+far it is from its goal. Each finger is released that long, plus the command latency,
+before the shoot. A plan is re-timed to a new shoot time by shifting the release times,
+with no need to recompute travel, so it can follow every new prediction.
+"""
+
+from dataclasses import dataclass, replace
+
+# Fingers closer than this to their goal (encoder ticks) aren't released at all
+ARRIVED_TOLERANCE_TICKS = 1
+
+
+class MotorEstimate:
+    """
+    Where a motor is, estimated from the commands sent to it: it moves toward its goal at
+    its speed limit once a move is sent, as the boards move their motors.
+    """
+
+    def __init__(self, speed: float):
+        # Speed limit, in encoder ticks per second
+        self.speed = speed
+        # Position and time when the current movement started
+        self.start_pos = 0.0
+        self.start_ts = 0.0
+        # Goal the motor is moving to, and goal set for the next movement
+        self.goal = 0.0
+        self.pending_goal = 0.0
+
+    def position(self, ts: float) -> float:
+        travel = self.speed * max(0.0, ts - self.start_ts)
+        if abs(self.goal - self.start_pos) <= travel:
+            return self.goal
+        return self.start_pos + travel * (1 if self.goal > self.start_pos else -1)
+
+    def arrival_ts(self) -> float:
+        """When the current movement finishes."""
+        return self.start_ts + abs(self.goal - self.start_pos) / self.speed
+
+    def move(self, ts: float):
+        self.start_pos = self.position(ts)
+        self.start_ts = ts
+        self.goal = self.pending_goal
+
+    def zero(self, ts: float):
+        self.start_pos = self.goal = self.pending_goal = 0.0
+        self.start_ts = ts
+
+
+@dataclass(frozen=True)
+class ReleasePlan:
+    """When to release each finger toward its goal, for all to arrive at eta."""
+
+    # Goal of each finger to release, by motor ID
+    goals: dict[int, int]
+    # Time each finger takes from its release until it's at its goal
+    travel_secs: dict[int, float]
+    # When all fingers should arrive
+    eta: float
+    # Time from sending a release to the finger starting to move
+    latency_secs: float = 0.0
+
+    @property
+    def releases(self) -> dict[int, float]:
+        """Time to send each finger's release, by motor ID."""
+        return {
+            motor: self.eta - travel - self.latency_secs
+            for motor, travel in self.travel_secs.items()
+        }
+
+    @property
+    def first_release(self) -> float | None:
+        """When the first finger should be released, None if none need to move."""
+        return min(self.releases.values(), default=None)
+
+    def retimed(self, eta: float) -> "ReleasePlan":
+        """The same plan arriving at a new eta."""
+        return replace(self, eta=eta)
+
+    def arrival(self, motor: int, release_ts: float) -> float:
+        """When a finger released at release_ts arrives at its goal."""
+        return release_ts + self.latency_secs + self.travel_secs[motor]
+
+
+def plan_release(
+    positions: dict[int, float],
+    goals: dict[int, int],
+    speeds: dict[int, float],
+    eta: float,
+    latency_secs: float = 0.0,
+) -> ReleasePlan:
+    """
+    Plan the release of each finger from its current position to its goal, for all to
+    arrive at eta, given each finger's speed limit (ticks per second). All by motor ID.
+    Fingers already at their goal are left out.
+    """
+    travel_secs = {
+        motor: abs(goal - positions[motor]) / speeds[motor]
+        for motor, goal in goals.items()
+        if abs(goal - positions[motor]) > ARRIVED_TOLERANCE_TICKS
+    }
+    return ReleasePlan(
+        {motor: goals[motor] for motor in travel_secs},
+        travel_secs,
+        eta,
+        latency_secs,
+    )
@@ -0,0 +1,278 @@
+"""
+Wire protocols between RPSSerial and the motor boards. Each codec encodes the commands
+RPSSerial sends, and decodes them again, as the simulated board does.
+
+The commands are: set the goals of some motors, start moving all motors to their goals,
+and take the motors' current positions as zero. A pose sets goals and starts moving at once.
+The board can also be asked for each motor's position and speed, and codecs read its reply.
+That query is a firmware requirement this repo doesn't meet: no board firmware here
+implements it, only the simulated board does. Until the finger board's firmware answers it,
+RPSSerial.recalibrate gets no reply, and every calibration step waits its full fixed timeout.
+"""
+
+from dataclasses import dataclass
+import itertools
+import re
+import struct
+
+
+@dataclass(frozen=True)
+class SetGoals:
+    """Set the goal position (encoder ticks) of each motor, by ID."""
+
+    goals: dict[int, int]
+
+
+@dataclass(frozen=True)
+class Move:
+    """Start moving all motors to their goals."""
+
+
+@dataclass(frozen=True)
+class Zero:
+    """Take the motors' current positions as zero."""
+
+
+@dataclass(frozen=True)
+class GetState:
+    """Ask for each motor's position and speed."""
+
+
+Command = SetGoals | Move | Zero | GetState
+
+# A motor's reported position (encoder ticks) and speed (ticks per second, signed)
+MotorState = tuple[int, int]
+
+_GOAL_RE = re.compile(rb"(\d+)\|GOAL: (-?\d+)")
+_STATE_RE = re.compile(rb"(\d+)\|POS: (-?\d+)\|SPEED: (-?\d+)")
+# Lines, or bytes of binary frames, skipped looking for a state reply,
+# e.g. other output of the board
+MAX_SKIPPED_LINES = 8
+MAX_SKIPPED_BYTES = 256
+
+
+class TextCodec:
+    """
+    The boards' ASCII protocol: "<motor>|GOAL: <pos>\\n" for each motor's goal,
+    "STATE: MOVE\\n" to move, and "ZERO:" (not newline terminated) to zero.
+    "GET: STATE\\n" asks for the motors' state, which the board replies in one line,
+    "STATE: <motor>|POS: <pos>|SPEED: <speed>; ...\\n".
+    """
+
+    def goals(self, goals: dict[int, int]) -> bytes:
+        return b"".join(b"%d|GOAL: %d\n" % item for item in goals.items())
+
+    def move(self) -> bytes:
+        return b"STATE: MOVE\n"
+
+    def zero(self) -> bytes:
+        return b"ZERO:"
+
+    def pose(self, goals: dict[int, int]) -> bytes:
+        return self.goals(goals) + self.move()
+
+    def get_state(self) -> bytes:
+        return b"GET: STATE\n"
+
+    def state_reply(self, states: dict[int, MotorState]) -> bytes:
+        """The board's reply to get_state."""
+        return (
+            b"STATE: "
+            + b"; ".join(
+                b"%d|POS: %d|SPEED: %d" % (motor, position, speed)
+                for motor, (position, speed) in states.items()
+            )
+            + b"\n"
+        )
+
+    def read_state(self, port) -> dict[int, MotorState] | None:
+        """
+        Read the reply to get_state from port, by motor ID,
+        or None if none came before the port's read timeout.
+        """
+        for _ in range(MAX_SKIPPED_LINES + 1):
+            line = port.readline()
+            if not line.endswith(b"\n"):
+                return None
+            if line.startswith(b"STATE: ") and line != b"STATE: MOVE\n":
+                return {
+                    int(motor): (int(position), int(speed))
+                    for motor, position, speed in _STATE_RE.findall(line)
+                }
+        return None
+
+    def next_message(self, buffer: bytes) -> tuple[int, list[Command]] | None:
+        """
+        The length of the first message in buffer, and its commands,
+        or None if it isn't complete yet. Lines that aren't commands are skipped.
+        """
+        if buffer.startswith(b"ZERO:"):
+            return len(b"ZERO:"), [Zero()]
+        end = buffer.find(b"\n")
+        if end < 0:
+            return None
+        line = buffer[:end]
+        if line == b"STATE: MOVE":
+            return end + 1, [Move()]
+        if line == b"GET: STATE":
+            return end + 1, [GetState()]
+        if match := _GOAL_RE.fullmatch(line):
+            return end + 1, [SetGoals({int(match[1]): int(match[2])})]
+        return end + 1, []
+
+
+# Binary frames are: SYNC, type, payload length, payload, then a CRC-8 of all but SYNC
+SYNC = 0xA5
+FRAME_GOALS = 1
+FRAME_POSE = 2
+FRAME_MOVE = 3
+FRAME_ZERO = 4
+FRAME_GET_STATE = 5
+# The board's reply to FRAME_GET_STATE
+FRAME_STATE = 6
+# Each goal in a goals or pose payload: motor ID and position (signed 16 bit)
+_GOAL = struct.Struct("<Bh")
+# Each motor's state in a state payload: motor ID, position and speed (signed 16 bit)
+_STATE = struct.Struct("<Bhh")
+# Packs a frame's type, payload length and goals in one go, by number of goals
+_frame_structs: dict[int, struct.Struct] = {}
+
+
+def _crc8_table(poly: int) -> bytes:
+    table = []
+    for byte in range(256):
+        crc = byte
+        for _ in range(8):
+            crc = ((crc << 1) ^ poly if crc & 0x80 else crc << 1) & 0xFF
+        table.append(crc)
+    return bytes(table)
+
+
+# CRC-8 with polynomial x^8 + x^2 + x + 1
+_CRC8_TABLE = _crc8_table(0x07)
+
+
+def crc8(data: bytes) -> int:
+    crc = 0
+    for byte in data:
+        crc = _CRC8_TABLE[crc ^ byte]
+    return crc
+
+
+class BinaryCodec:
+    """
+    A compact framing, in which a whole pose, the goals of all motors plus the move,
+    is one frame of 4 + 3 * motors bytes. Frames carry a checksum, and a corrupted frame
+    is dropped, the decoder resynchronizing on the next SYNC byte.
+    The board replies to a get state frame with a state frame, of 4 + 5 * motors bytes.
+    """
+
+    def __init__(self):
+        # Frames dropped for a bad checksum or payload, when decoding
+        self.checksum_errors = 0
+
+    def goals(self, goals: dict[int, int]) -> bytes:
+        return self._frame(FRAME_GOALS, goals)
+
+    def move(self) -> bytes:
+        return self._frame(FRAME_MOVE, {})
+
+    def zero(self) -> bytes:
+        return self._frame(FRAME_ZERO, {})
+
+    def pose(self, goals: dict[int, int]) -> bytes:
+        return self._frame(FRAME_POSE, goals)
+
+    def get_state(self) -> bytes:
+        return self._frame(FRAME_GET_STATE, {})
+
+    def state_reply(self, states: dict[int, MotorState]) -> bytes:
+        """The board's reply to get_state."""
+        body = bytes((FRAME_STATE, _STATE.size * len(states))) + b"".join(
+            _STATE.pack(motor, position, speed)
+            for motor, (position, speed) in states.items()
+        )
+        return bytes((SYNC,)) + body + bytes((crc8(body),))
+
+    def read_state(self, port) -> dict[int, MotorState] | None:
+        """
+        Read the reply to get_state from port, by motor ID,
+        or None if none came before the port's read timeout, or it was corrupted.
+        """
+        # Skip anything before the frame
+        for _ in range(MAX_SKIPPED_BYTES + 1):
+            byte = port.read(1)
+            if not byte:
+                return None
+            if byte[0] == SYNC:
+                break
+        else:
+            return None
+        header = port.read(2)
+        if len(header) < 2:
+            return None
+        rest = port.read(header[1] + 1)
+        if len(rest) < header[1] + 1 or crc8(header + rest[:-1]) != rest[-1]:
+            return None
+        if header[0] != FRAME_STATE or header[1] % _STATE.size:
+            return None
+        return {
+            motor: (position, speed)
+            for motor, position, speed in _STATE.iter_unpack(rest[:-1])
+        }
+
+    def next_message(self, buffer: bytes) -> tuple[int, list[Command]] | None:
+        """
+        The length of the first frame in buffer, and its commands,
+        or None if it isn't complete yet. Bytes before a SYNC byte are skipped.
+        """
+        start = buffer.find(SYNC)
+        if start != 0:
+            return (len(buffer) if start < 0 else start), []
+        if len(buffer) < 3:
+            return None
+        frame_type, length = buffer[1], buffer[2]
+        end = 3 + length + 1
+        if len(buffer) < end:
+            return None
+
+        payload = buffer[3 : end - 1]
+        valid = crc8(buffer[1 : end - 1]) == buffer[end - 1]
+        if frame_type in (FRAME_GOALS, FRAME_POSE):
+            valid = valid and length % _GOAL.size == 0
+        if not valid:
+            # Skip just the SYNC byte, in case a real frame starts within this one
+            self.checksum_errors += 1
+            return 1, []
+
+        if frame_type in (FRAME_GOALS, FRAME_POSE):
+            commands = [SetGoals(dict(_GOAL.iter_unpack(payload)))]
+            if frame_type == FRAME_POSE:
+                commands.append(Move())
+        elif frame_type == FRAME_MOVE:
+            commands = [Move()]
+        elif frame_type == FRAME_ZERO:
+            commands = [Zero()]
+        elif frame_type == FRAME_GET_STATE:
+            commands = [GetState()]
+        else:
+            commands = []
+        return end, commands
+
+    @staticmethod
+    def _frame(frame_type: int, goals: dict[int, int]) -> bytes:
+        packer = _frame_structs.get(len(goals))
+        if packer is None:
+            packer = struct.Struct("<BB" + "Bh" * len(goals))
+            _frame_structs[len(goals)] = packer
+        body = packer.pack(
+            frame_type, _GOAL.size * len(goals), *itertools.chain(*goals.items())
+        )
+        return bytes((SYNC,)) + body + bytes((crc8(body),))
+
+
+# Codecs RPSSerial can use, by name
+CODECS = {
+    "text": TextCodec,
+    "binary": BinaryCodec,
+}
@@ -1,9 +1,16 @@
+from dataclasses import dataclass
+import json
 import threading
 import time
 from enum import Enum
 
 import serial as ps
 
+from .hand_calibration import START_GRACE_SECS, CalibrationReport, CalibrationStep, SettleDetector
+from .hand_planner import MotorEstimate, ReleasePlan, plan_release
+from .hand_protocol import CODECS
+from .hand_sim import SIM_PORT, SimulatedMotorBoard
+
 
 FINGER_RETRACTION_MAX = 1600
 
@@ -17,90 +24,263 @@ class Finger(Enum):
 
 FOUR_FINGERS = [Finger.PINKY, Finger.RING, Finger.MIDDLE, Finger.INDEX]
 
+# Finger goals of each pose, in the order they are sent
+POSES = {
+    'rock': {finger: FINGER_RETRACTION_MAX for finger in FOUR_FINGERS},
+    'paper': {finger: 0 for finger in FOUR_FINGERS},
+    'scissors': {
+        Finger.PINKY: FINGER_RETRACTION_MAX,
+        Finger.RING: FINGER_RETRACTION_MAX,
+        Finger.MIDDLE: 0,
+        Finger.INDEX: 0,
+    },
+    'win': {
+        Finger.PINKY: 0,
+        Finger.INDEX: 0,
+        Finger.MIDDLE: FINGER_RETRACTION_MAX,
+        Finger.RING: FINGER_RETRACTION_MAX,
+    },
+    'lose': {
+        Finger.MIDDLE: 0,
+        Finger.PINKY: FINGER_RETRACTION_MAX,
+        Finger.INDEX: FINGER_RETRACTION_MAX,
+        Finger.RING: FINGER_RETRACTION_MAX,
+    },
+}
+# Elbow encoder ticks per degree
+ELBOW_TICKS_PER_DEGREE = 2000 / 360
+# A bob raises the elbow this far, and holds it this long before lowering it
+BOB_DEGREES = 60
+BOB_HOLD_SECS = 0.25
+# Longest calibration waits for the fingers to settle after a move, and after zeroing,
+# and all it waits without telemetry from the finger board
+CALIBRATION_MOVE_SECS = 3
+CALIBRATION_ZERO_SECS = 1
+# Time between finger state queries while calibrating, and longest wait for a reply,
+# after which the board is taken not to answer them
+STATE_POLL_SECS = 0.02
+STATE_REPLY_TIMEOUT_SECS = 0.1
+
+
+@dataclass(frozen=True)
+class FingerTiming:
+    """
+    The fingers' timing, as measured on the hand, which planned releases depend on: each
+    finger's speed limit (encoder ticks per second), and the time from sending a command to
+    the fingers moving. Loaded from JSON, with fingers by name, e.g.
+    {"speeds": {"index": 3800, "middle": 3700, "ring": 3500, "pinky": 3200}, "latency_secs": 0.05}
+    """
+
+    speeds: dict[Finger, float]
+    latency_secs: float
+
+    def validate(self):
+        """Raise ValueError if a finger's speed is missing or not positive, or the latency negative."""
+        missing = [finger.name.lower() for finger in FOUR_FINGERS if finger not in self.speeds]
+        if missing:
+            raise ValueError(f'No speed for {", ".join(missing)}')
+        for finger, speed in self.speeds.items():
+            if speed <= 0:
+                raise ValueError(f'Speed of {finger.name.lower()} must be positive, got {speed}')
+        if self.latency_secs < 0:
+            raise ValueError(f'latency_secs must be at least 0, got {self.latency_secs}')
+
+    @classmethod
+    def load(cls, path) -> 'FingerTiming':
+        with open(path) as f:
+            data = json.load(f)
+        try:
+            timing = cls(
+                {Finger[name.upper()]: float(speed) for name, speed in data['speeds'].items()},
+                float(data['latency_secs']),
+            )
+        except KeyError as e:
+            raise ValueError(f'Invalid finger timing {path}: unknown or missing {e}')
+        timing.validate()
+        return timing
+
 
 def read_forever(serial: ps.Serial, lock: threading.Lock):
     while lock.locked():
         print(serial.readline())
 
 
+def open_port(port, baudrate: int):
+    """
+    Open a port by name or pyserial URL (e.g. 'COM3', '/dev/ttyACM0', 'socket://host:port'),
+    or a simulated board with 'sim://'. An already open port object is used as is.
+    """
+    if not isinstance(port, str):
+        return port
+    if port == SIM_PORT:
+        return SimulatedMotorBoard()
+    return ps.serial_for_url(port, baudrate)
+
+
 class RPSSerial:
-    def __init__(self, port: str, eport: str, baudrate=250000):
-        self.finger_control = ps.Serial(port, baudrate)
-        self.elbow_control = ps.Serial(eport, baudrate)
+    """
+    Controls the hand's fingers and elbow through their motor boards' serial ports.
+    Commands are encoded by a codec from hand_protocol.CODECS, 'text' for the boards'
+    ASCII protocol, or 'binary' for compact frames with a checksum.
+
+    Given the fingers' measured timing (FingerTiming), finger positions are estimated from
+    the commands sent, so poses can be planned to arrive on time (see hand_planner).
+    Without it, nothing is estimated, and planning a pose raises ValueError.
+    Unless start_reader is False, the elbow board's replies are printed from a thread.
+    """
+
+    def __init__(self, port, eport, baudrate=250000, codec='text', finger_timing=None,
+                 clock=time.monotonic, start_reader=True):
+        if codec not in CODECS:
+            raise ValueError(f'Unknown codec {codec!r}, expected one of {list(CODECS)}')
+        self.codec = CODECS[codec]()
+        self.clock = clock
+        self.finger_timing: FingerTiming | None = finger_timing
+        self.finger_estimates = {} if finger_timing is None else {
+            finger.value: MotorEstimate(speed) for finger, speed in finger_timing.speeds.items()
+        }
+        self.finger_control = open_port(port, baudrate)
+        self.finger_control.timeout = STATE_REPLY_TIMEOUT_SECS
+        self.elbow_control = open_port(eport, baudrate)
         self.stop = threading.Lock()
         self.stop.acquire()
-        debug_thread = threading.Thread(target=lambda: read_forever(self.elbow_control, self.stop))
-        debug_thread.start()
+        if start_reader:
+            debug_thread = threading.Thread(target=lambda: read_forever(self.elbow_control, self.stop))
+            debug_thread.start()
 
         self.quit_bob_thread = False
         self.bob_thread = None
-
-    def __set_finger_position(self, finger: Finger, position: int):
-        self.finger_control.write(f'{finger.value}|GOAL: {position}\n'.encode('utf-8'))
-
-    def __trigger_movement(self):
-        self.finger_control.write(b'STATE: MOVE\n')
+        self.last_calibration: CalibrationReport | None = None
+
+    def __set_pose(self, goals: dict[Finger, int], move: bool = True):
+        # A whole pose goes in one write, which the binary codec makes one frame
+        goals = {finger.value: position for finger, position in goals.items()}
+        self.finger_control.write(self.codec.pose(goals) if move else self.codec.goals(goals))
+
+        # Follow the board: goals are set, then every motor moves to its goal
+        now = self.clock()
+        for motor, position in goals.items():
+            if motor in self.finger_estimates:
+                self.finger_estimates[motor].pending_goal = float(position)
+        if move:
+            for estimate in self.finger_estimates.values():
+                estimate.move(now)
 
     def __zero(self):
-        self.finger_control.write(b'ZERO:')
-        time.sleep(1)
-
-    def __extend_finger(self, finger: Finger):
-        self.__set_finger_position(finger, 0)
-
-    def __retract_finger(self, finger: Finger):
-        self.__set_finger_position(finger, FINGER_RETRACTION_MAX)
-
-    def recalibrate(self):
-        self.elbow_control.write(b'ZERO:')
-        for finger in FOUR_FINGERS:
-            self.__set_finger_position(finger, int(FINGER_RETRACTION_MAX * 2))
-        self.__trigger_movement()
-        time.sleep(3)
+        self.finger_control.write(self.codec.zero())
+        for estimate in self.finger_estimates.values():
+            estimate.zero(self.clock())
+
+    def read_state(self) -> dict[int, tuple[int, int]] | None:
+        """
+        Each finger's position and speed as the finger board reports them, by motor ID,
+        or None if it doesn't reply in time.
+        """
+        # Drop anything left over, e.g. a reply that came after its query timed out
+        if hasattr(self.finger_control, 'reset_input_buffer'):
+            self.finger_control.reset_input_buffer()
+        self.finger_control.write(self.codec.get_state())
+        return self.codec.read_state(self.finger_control)
+
+    def __settle(self, name: str, goals: dict[Finger, int], timeout_secs: float,
+                 report: CalibrationReport) -> CalibrationStep:
+        """
+        Wait until every finger has arrived at its goal or stalled, as the board reports,
+        or timeout_secs, which is all it waits once the board doesn't answer.
+        """
+        start = time.monotonic()
+        # Fingers take the command latency to start moving, if it's been measured
+        latency_secs = self.finger_timing.latency_secs if self.finger_timing is not None else 0.0
+        detector = SettleDetector({finger.value: position for finger, position in goals.items()},
+                                  start, START_GRACE_SECS + latency_secs)
+        while report.telemetry and not detector.settled:
+            if time.monotonic() - start >= timeout_secs:
+                break
+            states = self.read_state()
+            if states is None:
+                report.telemetry = False
+            elif not detector.update(time.monotonic(), states):
+                time.sleep(STATE_POLL_SECS)
+        if not report.telemetry:
+            time.sleep(max(0.0, timeout_secs - (time.monotonic() - start)))
+        step = CalibrationStep(name, time.monotonic() - start, dict(detector.outcomes),
+                               timed_out=report.telemetry and not detector.settled)
+        report.steps.append(step)
+        return step
+
+    @property
+    def can_plan(self) -> bool:
+        """Whether poses can be planned, which needs the fingers' measured timing."""
+        return self.finger_timing is not None
+
+    def finger_positions(self, ts=None) -> dict[Finger, float]:
+        """Estimated position of each finger at ts, now if None, empty without finger timing."""
+        ts = self.clock() if ts is None else ts
+        return {Finger(motor): estimate.position(ts) for motor, estimate in self.finger_estimates.items()}
+
+    def plan_pose(self, name: str, eta: float) -> ReleasePlan:
+        """Plan releasing each finger from where it is now, for the pose to complete at eta."""
+        if not self.can_plan:
+            raise ValueError('Planning a pose needs the fingers\' measured timing (finger_timing)')
+        now = self.clock()
+        return plan_release(
+            {motor: estimate.position(now) for motor, estimate in self.finger_estimates.items()},
+            {finger.value: position for finger, position in POSES[name].items()},
+            {motor: estimate.speed for motor, estimate in self.finger_estimates.items()},
+            eta,
+            self.finger_timing.latency_secs,
+        )
+
+    def release(self, plan: ReleasePlan, motors):
+        """Start the given fingers (by motor ID) moving to their goals in the plan."""
+        self.__set_pose({Finger(motor): plan.goals[motor] for motor in motors})
+
+    def recalibrate(self, use_telemetry=True) -> CalibrationReport:
+        """
+        Drive the fingers closed against their stops, then open from there, taking that as
+        zero. Each step goes on once the fingers have settled, as the finger board reports,
+        waiting out fixed timeouts if it doesn't answer (or not use_telemetry).
+        Prints and returns how long each step took.
+        """
+        report = CalibrationReport(telemetry=use_telemetry)
+        all_zero = {finger: 0 for finger in FOUR_FINGERS}
+        self.elbow_control.write(self.codec.zero())
+        closed = {finger: int(FINGER_RETRACTION_MAX * 2) for finger in FOUR_FINGERS}
+        self.__set_pose(closed)
+        self.__settle('close', closed, CALIBRATION_MOVE_SECS, report)
         self.__zero()
-        for finger in FOUR_FINGERS:
-            self.__set_finger_position(finger, -FINGER_RETRACTION_MAX)
-        self.__trigger_movement()
-        time.sleep(3)
+        self.__settle('zero', all_zero, CALIBRATION_ZERO_SECS, report)
+        opened = {finger: -FINGER_RETRACTION_MAX for finger in FOUR_FINGERS}
+        self.__set_pose(opened)
+        self.__settle('open', opened, CALIBRATION_MOVE_SECS, report)
         self.__zero()
+        self.__settle('zero', all_zero, CALIBRATION_ZERO_SECS, report)
+        self.last_calibration = report
+        print(report)
+        return report
     
     def recalibrate_elbow(self):
-        self.elbow_control.write(b'ZERO:')
+        self.elbow_control.write(self.codec.zero())
 
     def rock(self):
-        for finger in FOUR_FINGERS:
-            self.__retract_finger(finger)
-
-        self.__trigger_movement()
+        self.__set_pose(POSES['rock'])
 
     def paper(self):
-        for finger in FOUR_FINGERS:
-            self.__extend_finger(finger)
-        self.__trigger_movement()
+        self.__set_pose(POSES['paper'])
 
     def scissors(self):
-        for finger in [Finger.PINKY, Finger.RING]:
-            self.__retract_finger(finger)
-        for finger in [Finger.MIDDLE, Finger.INDEX]:
-            self.__extend_finger(finger)
-        self.__trigger_movement()
+        self.__set_pose(POSES['scissors'])
         
     def winPose(self):
-        for finger in [Finger.PINKY, Finger.INDEX]:
-            self.__extend_finger(finger)
-        for finger in [Finger.MIDDLE, Finger.RING]:
-            self.__retract_finger(finger)
-        self.__trigger_movement()
+        self.__set_pose(POSES['win'])
         
     def losePose(self):
-        for finger in [Finger.MIDDLE]:
-            self.__extend_finger(finger)
-        for finger in [Finger.PINKY, Finger.INDEX, Finger.RING]:
-            self.__retract_finger(finger)
+        # Only sets the goals, for the next movement
+        self.__set_pose(POSES['lose'], move=False)
 
     def __bob(self):
-        self.begin_elbow_movement(60)
-        for i in range(25):
+        self.begin_elbow_movement(BOB_DEGREES)
+        for i in range(round(BOB_HOLD_SECS / 0.01)):
             if self.quit_bob_thread:
                 return
             time.sleep(0.01)
@@ -115,10 +295,8 @@ class RPSSerial:
         self.bob_thread.start()
 
     def begin_elbow_movement(self, pos):
-        TICK_MULT = 2000/360
-        pos = int(-pos * TICK_MULT)
-        self.elbow_control.write(f'1|GOAL: {pos}\n'.encode('utf'))
-        self.elbow_control.write(b'STATE: MOVE\n')
+        pos = int(-pos * ELBOW_TICKS_PER_DEGREE)
+        self.elbow_control.write(self.codec.pose({1: pos}))
 
     def read(self, finger):
         self.finger_control.write(b'%s: GET: POS'.format(finger))
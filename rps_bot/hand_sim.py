@@ -0,0 +1,230 @@
+from collections.abc import Callable
+import threading
+import time
+
+from .hand_protocol import (
+    SYNC,
+    BinaryCodec,
+    Command,
+    GetState,
+    Move,
+    SetGoals,
+    TextCodec,
+    Zero,
+)
+
+# Port name that opens a simulated board instead of a serial port
+SIM_PORT = "sim://"
+# How fast simulated motors move, in encoder ticks per second
+DEFAULT_SPEED_TICKS_PER_SEC = 4000
+
+
+class _Motor:
+    """
+    A motor moving toward its goal at a fixed speed, once triggered.
+    If it has travel limits, it stalls at the hard stop short of a goal beyond them.
+    """
+
+    def __init__(self, speed: float, limits: tuple[float, float] | None = None):
+        self.speed = speed
+        # Hard stops, lowest and highest position, None if it has none
+        self.limits = limits
+        # Position and time when the current movement started
+        self.start_pos = 0.0
+        self.start_ts = 0.0
+        # Goal the motor is moving to, and goal set for the next movement
+        self.goal = 0.0
+        self.pending_goal = 0.0
+
+    def _end(self) -> float:
+        """Where the current movement ends: the goal, or the hard stop before it."""
+        if self.limits is None:
+            return self.goal
+        return min(max(self.goal, self.limits[0]), self.limits[1])
+
+    def position(self, ts: float) -> float:
+        end = self._end()
+        travel = self.speed * max(0.0, ts - self.start_ts)
+        if abs(end - self.start_pos) <= travel:
+            return end
+        return self.start_pos + travel * (1 if end > self.start_pos else -1)
+
+    def velocity(self, ts: float) -> float:
+        """Signed speed at ts, 0 once arrived or stalled."""
+        end = self._end()
+        if ts < self.start_ts or self.position(ts) == end:
+            return 0.0
+        return self.speed if end > self.start_pos else -self.speed
+
+    def move(self, ts: float, start_delay_secs: float = 0.0):
+        self.start_pos = self.position(ts)
+        self.start_ts = ts + start_delay_secs
+        self.goal = self.pending_goal
+
+    def zero(self, ts: float):
+        # The hard stops stay where they are, so move relative to the new zero
+        if self.limits is not None:
+            position = self.position(ts)
+            self.limits = (self.limits[0] - position, self.limits[1] - position)
+        self.start_pos = self.goal = self.pending_goal = 0.0
+        self.start_ts = ts
+
+
+class SimulatedMotorBoard:
+    """
+    Stands in for the serial port of a motor controller board, so RPSSerial can run
+    without hardware. Implements the parts of the pyserial interface RPSSerial uses,
+    and understands the same commands as the board:
+    "<motor>|GOAL: <pos>\\n" sets a motor's goal, "STATE: MOVE\\n" starts moving all motors
+    to their goals, and "ZERO:" sets the current positions as zero.
+    It also decodes the same commands as binary frames (hand_protocol.BinaryCodec),
+    telling them apart by the SYNC byte they start with.
+    "GET: STATE\\n" (or its frame) is answered with each motor's position and speed,
+    in the same encoding, to be read back with readline() or read().
+
+    Motors may be given travel limits (position at power on is 0), hard stops they stall
+    at, as the fingers do at fully open and fully closed, and may start moving
+    start_delay_secs after a move, as real motors take to spin up.
+
+    Every message received is logged with the time it arrived, for checking timing.
+    """
+
+    def __init__(
+        self,
+        num_motors: int = 4,
+        speed_ticks_per_sec: float | dict[int, float] = DEFAULT_SPEED_TICKS_PER_SEC,
+        clock: Callable[[], float] = time.monotonic,
+        travel_limits: dict[int, tuple[float, float]] | None = None,
+        start_delay_secs: float = 0.0,
+    ):
+        self.clock = clock
+        self.start_delay_secs = start_delay_secs
+        # Speed of each motor by ID, or one speed for all
+        if not isinstance(speed_ticks_per_sec, dict):
+            speed_ticks_per_sec = dict.fromkeys(
+                range(1, num_motors + 1), speed_ticks_per_sec
+            )
+        travel_limits = travel_limits or {}
+        # Motors by ID, starting from 1 as on the board
+        self.motors = {
+            i: _Motor(speed_ticks_per_sec[i], travel_limits.get(i))
+            for i in range(1, num_motors + 1)
+        }
+        # Messages received, as (time, message bytes)
+        self.commands: list[tuple[float, bytes]] = []
+        self._text = TextCodec()
+        self._binary = BinaryCodec()
+        # Seconds reads wait for data, forever if None, as pyserial's timeout
+        self.timeout: float | None = None
+
+        self._buffer = b""
+        self._cond = threading.Condition()
+        # Bytes sent by the board, not read yet
+        self._output = bytearray()
+        self.is_open = True
+
+    @property
+    def checksum_errors(self) -> int:
+        """Binary frames dropped as corrupted."""
+        return self._binary.checksum_errors
+
+    def positions(self, ts: float | None = None) -> dict[int, float]:
+        """Position of each motor at ts, now if None."""
+        ts = self.clock() if ts is None else ts
+        with self._cond:
+            return {i: motor.position(ts) for i, motor in self.motors.items()}
+
+    def write(self, data: bytes) -> int:
+        ts = self.clock()
+        with self._cond:
+            self._buffer += data
+            while self._buffer:
+                message = self._next_message()
+                if message is None:
+                    break
+                length, commands = message
+                # Replies go in the encoding of the message
+                codec = self._binary if self._buffer[0] == SYNC else self._text
+                self.commands.append((ts, self._buffer[:length]))
+                self._buffer = self._buffer[length:]
+                for command in commands:
+                    self._execute(command, ts, codec)
+        return len(data)
+
+    def readline(self) -> bytes:
+        """
+        Block until the board sends a line, or the timeout passes, returning what was sent
+        so far, or b"" once closed.
+        """
+        with self._cond:
+            self._wait_for(lambda: b"\n" in self._output)
+            end = self._output.find(b"\n") + 1 or len(self._output)
+            return self._take(end)
+
+    def read(self, size: int = 1) -> bytes:
+        """Block until the board sends size bytes, or the timeout passes."""
+        with self._cond:
+            self._wait_for(lambda: len(self._output) >= size)
+            return self._take(min(size, len(self._output)))
+
+    @property
+    def in_waiting(self) -> int:
+        return len(self._output)
+
+    def reset_input_buffer(self):
+        with self._cond:
+            self._output.clear()
+
+    def flush(self):
+        pass
+
+    def close(self):
+        with self._cond:
+            self.is_open = False
+            self._cond.notify_all()
+
+    def _wait_for(self, ready: Callable[[], bool]):
+        deadline = None if self.timeout is None else time.monotonic() + self.timeout
+        while not ready() and self.is_open:
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                return
+            self._cond.wait(remaining)
+
+    def _take(self, size: int) -> bytes:
+        data = bytes(self._output[:size])
+        del self._output[:size]
+        return data
+
+    def _next_message(self) -> tuple[int, list[Command]] | None:
+        if self._buffer[0] == SYNC:
+            return self._binary.next_message(self._buffer)
+        # Text never contains the SYNC byte, so text cut short by one is dropped
+        sync = self._buffer.find(SYNC)
+        message = self._text.next_message(
+            self._buffer[:sync] if sync > 0 else self._buffer
+        )
+        if message is None and sync > 0:
+            return sync, []
+        return message
+
+    def _execute(self, command: Command, ts: float, codec: TextCodec | BinaryCodec):
+        if isinstance(command, GetState):
+            self._output += codec.state_reply(
+                {
+                    i: (round(motor.position(ts)), round(motor.velocity(ts)))
+                    for i, motor in self.motors.items()
+                }
+            )
+            self._cond.notify_all()
+        elif isinstance(command, Zero):
+            for motor in self.motors.values():
+                motor.zero(ts)
+        elif isinstance(command, Move):
+            for motor in self.motors.values():
+                motor.move(ts, self.start_delay_secs)
+        elif isinstance(command, SetGoals):
+            for motor_id, goal in command.goals.items():
+                motor = self.motors.get(motor_id)
+                if motor is not None:
+                    motor.pending_goal = float(goal)
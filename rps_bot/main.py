@@ -1,72 +1,459 @@
+import asyncio
 import signal
 import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from dataclasses import replace
+from typing import Callable
 
 import cv2 as cv
 
-from rps_bot.hand_serial import RPSSerial
-from .gui import GuiMainFigure, annotate_frame
-from .recognizer import HandRecognizer
+from rps_bot.hand_protocol import CODECS
+from rps_bot.hand_serial import FingerTiming, RPSSerial
+from .capture import CameraCapture, ReplayCapture
+from .metrics import (
+    ThroughputMeter,
+    report_first_frames,
+    report_send_timings,
+    report_warm_up,
+)
+from .profiling import ProfilingControl, StageTimings
+from .recognizer.idle_gate import IdleGate
+from .recognizer.inference_profile import GESTURE_CLASSIFIERS, InferenceProfile
+from .recognizer.motion_analysis import MotionAnalyzerConfig
 from .game_flow.controller import GameController
+from .game_flow.scheduler import DeadlineTimer
+from .session_store import SessionStore
+from .shared_state import StateSnapshot
+from .viewer import PLOT_KINDS, ViewerProcess, make_figure
 
-import time
-from argparse import ArgumentParser
+from argparse import ArgumentParser, BooleanOptionalAction
+
+# Synthetic frames run through the model before the game loop starts,
+# as MediaPipe's first calls are much slower than steady state
+DEFAULT_WARM_UP_FRAMES = 10
 
 
 def main():
     argparser = ArgumentParser(prog="Rock Paper Scissors Bot")
     argparser.add_argument("-c", "--cam-index", type=int, default=0)
+    argparser.add_argument(
+        "--video", help="Replay a recorded video file in real time instead of a camera"
+    )
+    argparser.add_argument(
+        "--headless",
+        action="store_true",
+        help="Run without the camera window and plots, and without blocking prompts",
+    )
+    argparser.add_argument(
+        "--viewer",
+        choices=["inline", "process"],
+        default="inline",
+        help="Render the camera window and plots in the game loop, or in a separate process",
+    )
+    argparser.add_argument("--plot", choices=PLOT_KINDS, default="matplotlib")
+    argparser.add_argument(
+        "-y",
+        "--confirm-calibration",
+        action="store_true",
+        help="Confirm up front that the elbow is lowered and the finger winch gears are coupled",
+    )
+    argparser.add_argument(
+        "--idle-gate",
+        action=BooleanOptionalAction,
+        default=True,
+        help="Recognize at a low frame rate while waiting with no motion or hand in view",
+    )
+    argparser.add_argument(
+        "--recognizer-workers",
+        type=int,
+        help="Recognize frames in parallel with this many worker processes "
+        "(0 = in-process, default: as the inference profile sets)",
+    )
+    argparser.add_argument(
+        "--queue-events",
+        action="store_true",
+        help="Deliver recognizer events to the game controller from a listener thread",
+    )
+    argparser.add_argument(
+        "--num-hands",
+        type=int,
+        help="Track up to this many hands, each with a stable ID (the first recognized plays) "
+        "(default: as the inference profile sets)",
+    )
+    argparser.add_argument(
+        "--inference-profile",
+        help="Inference profile JSON: the model, delegate, workers, CPUs per worker and "
+        "hand settings, e.g. as compared by tools.bench_inference (default: the bundled "
+        "model on the CPU, in-process)",
+    )
+    argparser.add_argument(
+        "--gesture-classifier",
+        choices=GESTURE_CLASSIFIERS,
+        help="Classify gestures with the gesture model, or from the hand landmarks only "
+        "with the trained landmark classifier, which is cheaper "
+        "(default: as the inference profile sets)",
+    )
+    argparser.add_argument(
+        "--motion-config",
+        help="Motion analysis config JSON, e.g. from tools.tune_motion "
+        "(default: the tuned config, if saved, else the built-in values)",
+    )
+    argparser.add_argument(
+        "--serial-codec",
+        choices=list(CODECS),
+        default="text",
+        help="Wire protocol of the motor boards: their ASCII commands, or compact binary "
+        "frames with a checksum, which need firmware that decodes them",
+    )
+    argparser.add_argument(
+        "--plan-finger-release",
+        action=BooleanOptionalAction,
+        default=False,
+        help="Release each finger on its own, timed for all to arrive at the predicted "
+        "shoot, rather than sending the whole pose a fixed time before it. "
+        "Needs --finger-timing",
+    )
+    argparser.add_argument(
+        "--finger-timing",
+        help="JSON of the fingers' speed limits and command latency, as measured on the "
+        "hand, which finger releases are planned from (see hand_serial.FingerTiming)",
+    )
+    argparser.add_argument(
+        "--warm-up-frames",
+        type=int,
+        default=DEFAULT_WARM_UP_FRAMES,
+        help="Synthetic frames to recognize before the game loop starts (0 = no warm-up)",
+    )
+    argparser.add_argument(
+        "--session-dir",
+        help="Record each game, for analysis, in a session store under this directory",
+    )
+    argparser.add_argument(
+        "--frame-diagnostics",
+        action="store_true",
+        help="Also record the hand height, filtered state, phase and source of each frame "
+        "(needs --session-dir)",
+    )
+    argparser.add_argument(
+        "--runtime",
+        choices=["threads", "asyncio"],
+        default="threads",
+        help="Run the game loop on the main thread with a timer thread, or as asyncio tasks "
+        "(needs --headless or --viewer process)",
+    )
+    argparser.add_argument(
+        "--profiling-port",
+        type=int,
+        help="Take profiling commands on this localhost port (see rps_bot.profiling)",
+    )
+    argparser.add_argument(
+        "--profile-dir",
+        default="profiles",
+        help="Where profiles and stage timing dumps are written",
+    )
+    argparser.add_argument(
+        "--fps-report-secs",
+        type=float,
+        default=10,
+        help="How often to print the processed frame rate",
+    )
     args = argparser.parse_args()
+    if args.headless and not args.confirm_calibration:
+        argparser.error(
+            "--headless cannot prompt before calibrating, pass --confirm-calibration"
+        )
+    if args.frame_diagnostics and not args.session_dir:
+        argparser.error("--frame-diagnostics needs --session-dir")
+    if args.runtime == "asyncio" and not args.headless and args.viewer == "inline":
+        argparser.error("--runtime asyncio needs --headless or --viewer process")
     cam_index = args.cam_index
 
-    serial = RPSSerial(port='COM3', eport='COM4')
+    try:
+        profile = (
+            InferenceProfile.load(args.inference_profile)
+            if args.inference_profile
+            else InferenceProfile()
+        )
+        # The flags override the profile
+        if args.recognizer_workers is not None:
+            profile = replace(profile, num_workers=args.recognizer_workers)
+        if args.num_hands is not None:
+            profile = replace(profile, num_hands=args.num_hands)
+        if args.gesture_classifier is not None:
+            profile = replace(profile, gesture_classifier=args.gesture_classifier)
+        profile.validate()
+    except ValueError as e:
+        argparser.error(f"Invalid inference profile: {e}")
+
+    finger_timing = None
+    if args.finger_timing:
+        try:
+            finger_timing = FingerTiming.load(args.finger_timing)
+        except ValueError as e:
+            argparser.error(str(e))
+    elif args.plan_finger_release:
+        argparser.error("--plan-finger-release needs the fingers' measured timing, "
+                        "from --finger-timing")
+
+    if args.runtime == "asyncio":
+        from .async_runtime import AsyncRPSSerial
+        serial = AsyncRPSSerial(port='COM3', eport='COM4', codec=args.serial_codec,
+                                finger_timing=finger_timing)
+    else:
+        serial = RPSSerial(port='COM3', eport='COM4', codec=args.serial_codec,
+                           finger_timing=finger_timing)
+    session_store = (
+        SessionStore(args.session_dir, args.frame_diagnostics)
+        if args.session_dir
+        else None
+    )
+
+    stage_timings = StageTimings()
+    profiling = None
+
+    shutting_down = False
 
     def shutdown_handler(_, __):
-        # This function will be called when Ctrl+C is pressed
+        # This function will be called when Ctrl+C is pressed or the process is terminated
+        nonlocal shutting_down
+        # Ignore repeated signals while already closing the serial connection
+        if shutting_down:
+            return
+        shutting_down = True
         print("Shutting down")
-        serial.close()
         sys.exit(0)
     signal.signal(signal.SIGINT, shutdown_handler)
+    signal.signal(signal.SIGTERM, shutdown_handler)
+
+    try:
+        # Profiles on SIGUSR1 or a command, and dumps the last frames' stage timings on
+        # SIGUSR2. Binding the profiling port may fail, after the hand's ports are open.
+        profiling = ProfilingControl(stage_timings, args.profile_dir, args.profiling_port)
+        profiling.install_signal_handlers()
+
+        # Open video capture
+        if args.video:
+            video_cap = ReplayCapture(args.video)
+        else:
+            video_cap = CameraCapture(cam_index, width=1920 // 2, height=1080 // 2)
+
+        if not args.confirm_calibration:
+            input('Verify that the elbow is at the lowest position. [Enter to proceed]')
+            input('Verify that the finger winch gears are coupled. [Enter to proceed]')
+        # Calibrate in the background while the model loads and warms up,
+        # and start the game loop once both are done
+        executor = ThreadPoolExecutor(1, thread_name_prefix="recalibrate")
+        calibration = executor.submit(serial.recalibrate)
+        executor.shutdown(wait=False)
+
+        display = "none" if args.headless else args.viewer
+        run_args = (
+            video_cap,
+            serial,
+            display,
+            args.plot,
+            args.fps_report_secs,
+            IdleGate() if args.idle_gate else None,
+            profile.num_workers,
+            args.queue_events,
+            profile.num_hands,
+            (
+                MotionAnalyzerConfig.load(args.motion_config)
+                if args.motion_config
+                else None
+            ),
+        )
+        run_kwargs = dict(
+            warm_up_frames=args.warm_up_frames,
+            ready=calibration.result,
+            inference_profile=profile,
+            session_store=session_store,
+            plan_finger_release=args.plan_finger_release,
+            stage_timings=stage_timings,
+        )
+        if args.runtime == "asyncio":
+            from .async_runtime import run_async
+            asyncio.run(run_async(*run_args, **run_kwargs))
+        else:
+            run(*run_args, **run_kwargs)
+    finally:
+        shutting_down = True
+        if profiling is not None:
+            profiling.close()
+        serial.close()
+        if session_store is not None:
+            session_store.close()
+            _report_session(session_store)
+
+
+def run(
+    video_cap: CameraCapture | ReplayCapture,
+    serial: RPSSerial,
+    display: str,
+    plot: str,
+    fps_report_secs: float,
+    idle_gate: IdleGate | None = None,
+    recognizer_workers: int = 0,
+    queue_events: bool = False,
+    num_hands: int = 1,
+    motion_config: MotionAnalyzerConfig | None = None,
+    on_frame: Callable[[GameController], bool] | None = None,
+    warm_up_frames: int = 0,
+    ready: Callable[[], object] | None = None,
+    inference_profile: InferenceProfile | None = None,
+    session_store: SessionStore | None = None,
+    plan_finger_release: bool = False,
+    stage_timings: StageTimings | None = None,
+):
+    """
+    Run the game loop until quit.
+    Before the loop, warm_up_frames synthetic frames of the capture's size are recognized,
+    then ready is called if given, e.g. to wait for calibration to finish.
+    MediaPipe is run as inference_profile sets (the default profile if not given),
+    except for the number of workers and hands, which are given separately.
+    plan_finger_release is passed to the GameController.
+    If given, session_store records each game, and frame diagnostics if it's set to.
+    The time each frame spends in each stage is recorded in stage_timings, if given.
+    If given, on_frame is called with the controller after each frame,
+    and the loop stops once it returns True.
+    display is one of:
+    - "none": nothing is rendered and the GUI is never imported,
+      so all time is spent on recognition and control.
+    - "inline": the camera window and plots are rendered in the loop.
+    - "process": state is published to a viewer process, which renders without blocking the loop.
+    """
+    if display == "inline":
+        # Only load matplotlib and drawing utilities when there is something to show
+        from .gui import annotate_frame
+
+        fig = make_figure(plot)
+        if fig is not None:
+            fig.show()
+
+    throughput = ThroughputMeter(display, fps_report_secs)
+    if stage_timings is None:
+        stage_timings = StageTimings()
+
+    # Loaded here rather than at the top, as MediaPipe is slow to import,
+    # and processes spawned from this module (e.g. the viewer) don't need it
+    from .recognizer import HandRecognizer
+    from .recognizer.hand_recognizer import FIRST_FRAMES_TRACKED
+
+    profile = replace(
+        inference_profile or InferenceProfile(),
+        num_workers=recognizer_workers,
+        num_hands=num_hands,
+    )
+
+    with HandRecognizer.from_profile(
+        profile,
+        idle_gate=idle_gate,
+        queue_events=queue_events,
+        motion_config=motion_config,
+    ) as recognizer, (
+        ViewerProcess(plot) if display == "process" else nullcontext()
+    ) as viewer, DeadlineTimer() as deadlines:
+        if warm_up_frames > 0:
+            report_warm_up(recognizer.warm_up([video_cap.frame_size], warm_up_frames))
+        if ready is not None:
+            ready()
+        # Whether the latency of the first frames after warm-up was reported
+        first_frames_reported = False
+        recognizer.stage_timings = stage_timings
+
+        # Shoot commands are sent from the timer thread, on time regardless of the frame rate
+        controller = GameController(
+            recognizer,
+            serial,
+            scheduler=deadlines,
+            plan_finger_release=plan_finger_release,
+        )
+        try:
+            while True:
+                ts = None
+                try:
+                    # Get frame, timestamped at capture
+                    start = time.perf_counter()
+                    ret, frame, ts = video_cap.read()
+                    stage_timings.add("capture", time.perf_counter() - start)
+
+                    # Failed to get frame, bail
+                    if not ret:
+                        if video_cap.finished:
+                            break
+                        print(f"Did not receive frame on attempt to read.")
+                        continue
+
+                    recognizer.next_frame(frame, ts)
+                    latencies = recognizer.first_frame_latencies
+                    if (
+                        not first_frames_reported
+                        and len(latencies) >= FIRST_FRAMES_TRACKED
+                    ):
+                        report_first_frames(latencies)
+                        first_frames_reported = True
 
-    # Open video capture
-    video_cap = cv.VideoCapture(cam_index, cv.CAP_DSHOW)
-    if not video_cap.isOpened():
-        raise RuntimeError("Failed to open video camera")
+                    start = time.perf_counter()
+                    controller.update()
+                    stage_timings.add("controller", time.perf_counter() - start)
+                    if session_store is not None:
+                        start = time.perf_counter()
+                        session_store.observe(recognizer, controller)
+                        stage_timings.add("session", time.perf_counter() - start)
 
-    video_cap.set(cv.CAP_PROP_FRAME_WIDTH, 1920 / 2)
-    video_cap.set(cv.CAP_PROP_FRAME_HEIGHT, 1080 / 2)
+                    throughput.tick()
 
-    input('Verify that the elbow is at the lowest position. [Enter to proceed]')
-    input('Verify that the finger winch gears are coupled. [Enter to proceed]')
-    serial.recalibrate()
+                    if on_frame is not None and on_frame(controller):
+                        break
 
-    fig = GuiMainFigure()
-    fig.show()
+                    if display == "none":
+                        continue
 
-    with HandRecognizer() as recognizer:
-        controller = GameController(recognizer, serial)
-        while True:
-            # Timestamp
-            ts = time.time()
-            # Get frame
-            ret, frame = video_cap.read()
+                    start = time.perf_counter()
+                    snapshot = StateSnapshot.capture(recognizer, controller.state)
 
-            # Failed to get frame, bail
-            if not ret:
-                print(f"Did not receive frame on attempt to read.")
-                continue
+                    if viewer is not None:
+                        viewer.publish(frame, snapshot)
+                        stage_timings.add("display", time.perf_counter() - start)
+                        # Quit if Q pressed in the viewer
+                        if viewer.quit_requested():
+                            break
+                        continue
 
-            recognizer.next_frame(frame, ts)
+                    if fig is not None:
+                        fig.update(snapshot)
 
-            controller.update()
+                    annotate_frame(frame, snapshot)
+                    cv.imshow("Camera", frame)
 
-            fig.update(recognizer, controller.state)
+                    # Quit if Q pressed
+                    key = cv.waitKey(1)
+                    stage_timings.add("display", time.perf_counter() - start)
+                    if key == ord("q"):
+                        break
+                finally:
+                    stage_timings.end_frame(ts)
+        finally:
+            report_send_timings(controller)
 
-            annotate_frame(frame, recognizer)
-            cv.imshow("Camera", frame)
 
-            # Quit if Q pressed
-            if cv.waitKey(1) == ord("q"):
-                break
+def _report_session(session_store: SessionStore):
+    """Print what the session store wrote, and any batches it had to drop or failed to write."""
+    print(
+        f"Session recorded in {session_store.path}: {session_store.games_written} games, "
+        f"{session_store.frames_written} frames"
+    )
+    if session_store.dropped_batches:
+        print(
+            f"{session_store.dropped_batches} batches dropped as the writer fell behind"
+        )
+    if session_store.failed_batches:
+        print(
+            f"{session_store.failed_batches} batches failed to write: "
+            f"{session_store.write_error}"
+        )
 
 
 if __name__ == "__main__":
@@ -0,0 +1,84 @@
+from collections import deque
+import statistics
+import time
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from .game_flow.controller import GameController
+
+
+class ThroughputMeter:
+    """
+    Counts processed frames and periodically reports the frame rate.
+    Used to compare throughput between run modes (e.g. GUI vs. headless).
+    """
+
+    def __init__(self, label: str, report_interval_secs: float = 10):
+        self.label = label
+        self.report_interval_secs = report_interval_secs
+
+        # Frames counted since the last report, and when that report was made
+        self._count = 0
+        self._interval_start = time.perf_counter()
+        # The frame rate as of the last report
+        self.fps: float | None = None
+
+    def tick(self):
+        """Count one processed frame, reporting the frame rate if the interval elapsed."""
+        self._count += 1
+        elapsed = time.perf_counter() - self._interval_start
+        if elapsed >= self.report_interval_secs:
+            self.fps = self._count / elapsed
+            print(f"[{self.label}] {self.fps:.1f} frames/s")
+            self._count = 0
+            self._interval_start = time.perf_counter()
+
+
+class LatencyStats:
+    """Recent latencies (secs) of something that runs repeatedly, for percentiles."""
+
+    def __init__(self, window: int = 1000):
+        self._secs: deque[float] = deque(maxlen=window)
+        # Count over the whole run, not just the window
+        self.count = 0
+
+    def add(self, secs: float):
+        self._secs.append(secs)
+        self.count += 1
+
+    def percentile(self, q: float) -> float | None:
+        """The q-th percentile (0-100) of the recent latencies, None if there are none."""
+        if not self._secs:
+            return None
+        ordered = sorted(self._secs)
+        return ordered[min(len(ordered) - 1, int(q / 100 * len(ordered)))]
+
+
+def report_warm_up(latencies: dict[tuple[int, int], list[float]]):
+    """Print how long the first and last warm-up frames took to recognize, per size."""
+    for (width, height), secs in latencies.items():
+        print(
+            f"Warm-up at {width}x{height}: first frame {secs[0] * 1000:.0f} ms, "
+            f"last {secs[-1] * 1000:.0f} ms"
+        )
+
+
+def report_first_frames(latencies: list[float]):
+    """Print the recognition latency of the first frames of the game loop."""
+    print(
+        f"First {len(latencies)} frames recognized in median "
+        f"{statistics.median(latencies) * 1000:.0f} ms, "
+        f"max {max(latencies) * 1000:.0f} ms"
+    )
+
+
+def report_send_timings(controller: "GameController"):
+    """Print how far the shoot commands were sent from their ideal times."""
+    for command in ("start_shoot", "release", "shoot"):
+        errors = controller.send_timing_errors(command)
+        if errors:
+            errors_ms = [abs(e) * 1000 for e in errors]
+            print(
+                f"{command} send error: mean {sum(errors_ms) / len(errors_ms):.2f} ms, "
+                f"max {max(errors_ms):.2f} ms over {len(errors_ms)} commands"
+            )
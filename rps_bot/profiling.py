@@ -0,0 +1,317 @@
+"""
+Profiling a running bot without stopping it: a sampling profiler of all its threads,
+and a ring buffer of the time each frame spent in each stage of the game loop.
+
+Both are triggered at runtime by a ProfilingControl, from a signal (SIGUSR1 to profile,
+SIGUSR2 to dump the stage timings), or a command on a localhost port:
+    python -m rps_bot.profiling PORT profile [SECS]
+    python -m rps_bot.profiling PORT timings [N]
+Each writes a file, and the command replies with its path.
+
+Profiles are written as collapsed stacks, a line per distinct stack with how many samples
+it was seen in, which flamegraph.pl, speedscope and inferno render as flame graphs.
+Only Python frames are seen, so time in MediaPipe's or OpenCV's own threads shows up as the
+Python call waiting on them, if any.
+"""
+
+from argparse import ArgumentParser
+from collections import Counter
+from datetime import datetime
+import os
+from pathlib import Path
+import signal
+import socket
+import socketserver
+import sys
+import threading
+import time
+
+import numpy as np
+
+# Time between stack samples. Each sample walks every thread's stack, which takes about
+# 50 us with a dozen threads, so profiling costs about 1% of a CPU while it runs.
+DEFAULT_SAMPLE_INTERVAL_SECS = 0.005
+DEFAULT_PROFILE_SECS = 10
+# Frames of stage timings kept, about 100 s at 30 frames/s
+DEFAULT_STAGE_TIMINGS_CAPACITY = 3000
+# Stages of the game loop timed per frame:
+# - capture: reading the frame from the camera or video,
+# - submit: the idle gate, and submitting the frame to MediaPipe (or its workers),
+# - track: initializing or updating the tracker (e.g. CSRT) on the results,
+# - hands: tracking several hands, if enabled,
+# - motion: motion analysis (MotionAnalyzer.add_sample) and motion events,
+# - controller: the game controller's update,
+# - session: recording to the session store,
+# - display: rendering (plots, annotation) or publishing to the viewer.
+STAGES = (
+    "capture",
+    "submit",
+    "track",
+    "hands",
+    "motion",
+    "controller",
+    "session",
+    "display",
+)
+
+
+class StageTimings:
+    """
+    The time each of the last frames spent in each stage, in a ring buffer of arrays
+    allocated up front, so it can be left on for the whole run. Stages are timed with add()
+    as a frame goes through the loop, possibly several times (e.g. several results in one
+    frame), and end_frame() files the frame's row. Reading is safe from any thread.
+    """
+
+    def __init__(
+        self,
+        capacity: int = DEFAULT_STAGE_TIMINGS_CAPACITY,
+        stages: tuple[str, ...] = STAGES,
+    ):
+        self.stages = stages
+        self._index = {stage: i for i, stage in enumerate(stages)}
+        # Capture timestamp and stage times (secs, NaN if not run) of each frame
+        self._ts = np.full(capacity, np.nan)
+        self._secs = np.full((capacity, len(stages)), np.nan, np.float32)
+        # Row after the newest, and the number of rows filled
+        self._next = 0
+        self._count = 0
+        # Stage times of the frame in progress, None for stages not run
+        self._current: list[float | None] = [None] * len(stages)
+        self._lock = threading.Lock()
+
+    def add(self, stage: str, secs: float):
+        i = self._index[stage]
+        # Stages may be timed on another thread than the one ending frames (asyncio runtime)
+        with self._lock:
+            current = self._current[i]
+            self._current[i] = secs if current is None else current + secs
+
+    def end_frame(self, ts: float | None):
+        """File the stage times added since the last frame as frame ts's."""
+        with self._lock:
+            self._ts[self._next] = np.nan if ts is None else ts
+            self._secs[self._next] = [
+                np.nan if secs is None else secs for secs in self._current
+            ]
+            self._next = (self._next + 1) % len(self._ts)
+            self._count = min(self._count + 1, len(self._ts))
+            self._current = [None] * len(self.stages)
+
+    def last(self, n: int | None = None) -> dict[str, np.ndarray]:
+        """
+        The last n frames (all kept if None), oldest first,
+        as a "ts" column and a column of secs per stage.
+        """
+        with self._lock:
+            n = self._count if n is None else min(n, self._count)
+            rows = np.arange(self._next - n, self._next) % len(self._ts)
+            ts = self._ts[rows]
+            secs = self._secs[rows]
+        columns = {"ts": ts}
+        columns.update({stage: secs[:, i] for i, stage in enumerate(self.stages)})
+        return columns
+
+    def dump(self, path: str | Path, n: int | None = None) -> Path:
+        """Write the last n frames to a CSV file, times in ms. Returns its path."""
+        columns = self.last(n)
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        header = "ts," + ",".join(f"{stage}_ms" for stage in self.stages)
+        table = np.column_stack(
+            [columns["ts"]] + [columns[stage] * 1000 for stage in self.stages]
+        )
+        np.savetxt(path, table, fmt="%.6f", delimiter=",", header=header, comments="")
+        return path
+
+
+class SamplingProfiler:
+    """
+    Samples the stacks of all threads, except its own, at a fixed interval,
+    and counts how often each distinct stack is seen.
+    """
+
+    def __init__(self, interval_secs: float = DEFAULT_SAMPLE_INTERVAL_SECS):
+        self.interval_secs = interval_secs
+
+    def profile(self, duration_secs: float) -> Counter[str]:
+        """
+        Sample for duration_secs, from the calling thread.
+        Returns the number of samples of each stack, collapsed: the thread's name, then each
+        function from the outermost, as "name (file:line)", separated by semicolons.
+        """
+        me = threading.get_ident()
+        stacks: Counter[str] = Counter()
+        # Frames seen before, by code object, formatted once
+        names: dict[object, str] = {}
+        end = time.perf_counter() + duration_secs
+        next_sample = time.perf_counter()
+        while next_sample < end:
+            threads = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                functions = []
+                while frame is not None:
+                    code = frame.f_code
+                    name = names.get(code)
+                    if name is None:
+                        name = names[code] = (
+                            f"{code.co_name} "
+                            f"({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+                        )
+                    functions.append(name)
+                    frame = frame.f_back
+                functions.append(threads.get(ident, f"thread-{ident}"))
+                stacks[";".join(reversed(functions))] += 1
+            next_sample += self.interval_secs
+            time.sleep(max(0.0, next_sample - time.perf_counter()))
+        return stacks
+
+
+def write_collapsed(stacks: Counter[str], path: str | Path) -> Path:
+    """Write collapsed stacks to a file, a "stack count" line each. Returns its path."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w") as f:
+        for stack, count in stacks.most_common():
+            f.write(f"{stack} {count}\n")
+    return path
+
+
+class ProfilingControl:
+    """
+    Triggers profiles and stage timing dumps at runtime, from signals and, if port is given,
+    commands on that localhost port. Files are written to out_dir.
+    Only one profile runs at a time. Requests for another meanwhile are refused.
+    """
+
+    def __init__(
+        self,
+        stage_timings: StageTimings,
+        out_dir: str | Path = "profiles",
+        port: int | None = None,
+        profile_secs: float = DEFAULT_PROFILE_SECS,
+        sample_interval_secs: float = DEFAULT_SAMPLE_INTERVAL_SECS,
+    ):
+        self.stage_timings = stage_timings
+        self.out_dir = Path(out_dir)
+        self.profile_secs = profile_secs
+        self._profiler = SamplingProfiler(sample_interval_secs)
+        self._profiling = threading.Lock()
+
+        self._server = None
+        if port is not None:
+            # Only reachable from this host
+            self._server = socketserver.ThreadingTCPServer(
+                ("127.0.0.1", port), self._make_handler()
+            )
+            self._server.daemon_threads = True
+            threading.Thread(
+                target=self._server.serve_forever,
+                name="profiling-commands",
+                daemon=True,
+            ).start()
+
+    @property
+    def port(self) -> int | None:
+        """The port commands are taken on, None if not taking any."""
+        return self._server.server_address[1] if self._server is not None else None
+
+    def install_signal_handlers(self):
+        """
+        Profile on SIGUSR1 and dump the stage timings on SIGUSR2, where the platform has
+        them (not Windows). Must be called from the main thread.
+        """
+        if not hasattr(signal, "SIGUSR1"):
+            return
+        # Handlers run on the main thread, between its bytecodes, so they only start threads
+        signal.signal(
+            signal.SIGUSR1,
+            lambda _, __: threading.Thread(
+                target=self._report, args=(self.profile,), name="profiler", daemon=True
+            ).start(),
+        )
+        signal.signal(
+            signal.SIGUSR2,
+            lambda _, __: threading.Thread(
+                target=self._report, args=(self.dump_timings,), daemon=True
+            ).start(),
+        )
+
+    def profile(self, duration_secs: float | None = None) -> Path:
+        """Profile all threads for duration_secs, and write the collapsed stacks."""
+        if not self._profiling.acquire(blocking=False):
+            raise RuntimeError("A profile is already running")
+        try:
+            stacks = self._profiler.profile(duration_secs or self.profile_secs)
+        finally:
+            self._profiling.release()
+        return write_collapsed(stacks, self._out_path("profile", "collapsed"))
+
+    def dump_timings(self, n: int | None = None) -> Path:
+        """Write the last n frames' stage timings (all kept if None)."""
+        return self.stage_timings.dump(self._out_path("timings", "csv"), n)
+
+    def close(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+
+    def _out_path(self, kind: str, suffix: str) -> Path:
+        return (
+            self.out_dir
+            / f"{kind}-{datetime.now():%Y%m%d-%H%M%S-%f}-{os.getpid()}.{suffix}"
+        )
+
+    @staticmethod
+    def _report(action):
+        try:
+            print(f"Profiling: wrote {action()}")
+        except RuntimeError as e:
+            print(f"Profiling: {e}")
+
+    def _make_handler(self):
+        control = self
+
+        class CommandHandler(socketserver.StreamRequestHandler):
+            def handle(self):
+                words = self.rfile.readline().decode(errors="replace").split()
+                try:
+                    match words:
+                        case ["profile"]:
+                            reply = f"ok {control.profile()}"
+                        case ["profile", secs]:
+                            reply = f"ok {control.profile(float(secs))}"
+                        case ["timings"]:
+                            reply = f"ok {control.dump_timings()}"
+                        case ["timings", n]:
+                            reply = f"ok {control.dump_timings(int(n))}"
+                        case _:
+                            reply = "error expected 'profile [SECS]' or 'timings [N]'"
+                except (RuntimeError, ValueError) as e:
+                    reply = f"error {e}"
+                self.wfile.write(reply.encode() + b"\n")
+
+        return CommandHandler
+
+
+def send_command(port: int, command: str, timeout_secs: float | None = None) -> str:
+    """Send a command to a ProfilingControl's port, and return its reply."""
+    with socket.create_connection(("127.0.0.1", port), timeout=timeout_secs) as conn:
+        conn.sendall(command.encode() + b"\n")
+        return conn.makefile().readline().strip()
+
+
+def main():
+    argparser = ArgumentParser(prog="Profiling command")
+    argparser.add_argument("port", type=int)
+    argparser.add_argument("command", nargs="+", help="profile [SECS] or timings [N]")
+    args = argparser.parse_args()
+    reply = send_command(args.port, " ".join(args.command))
+    print(reply)
+    raise SystemExit(0 if reply.startswith("ok") else 1)
+
+
+if __name__ == "__main__":
+    main()
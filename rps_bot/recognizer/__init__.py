@@ -1,3 +1,13 @@
 # Reexports
-from .hand_recognizer import HandRecognizer
 from .gestures import HandGesture
+from .inference_profile import InferenceProfile
+
+
+def __getattr__(name: str):
+    # HandRecognizer imports MediaPipe, which is slow to import and pulls in matplotlib,
+    # so it's only loaded when asked for, not by every user of the submodules
+    if name == "HandRecognizer":
+        from .hand_recognizer import HandRecognizer
+
+        return HandRecognizer
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,237 @@
+import numpy as np
+
+from .motion_analysis import DEFAULT_EST_PERIOD, MotionAnalyzerConfig
+
+# Turning points kept per hand. A full motion has 8.
+MAX_TURNING_POINTS = 16
+
+
+class BatchedMotionAnalyzer:
+    """
+    Motion analysis for several hands at once.
+    Each hand occupies a slot, a row of the batched state arrays, so the Kalman filter,
+    turning point detection and predictions for all hands run as single vectorized operations.
+
+    Follows MotionAnalyzer, with the same config, except that turning points are detected
+    incrementally rather than by re-analyzing a resampled window: a peak or valley is
+    confirmed once the filtered height has moved back from it by the prominence.
+    Predictions are updated on every sample, since that's cheap.
+
+    Prediction arrays hold NaN for hands without motion in progress.
+    """
+
+    def __init__(self, num_slots: int, config: MotionAnalyzerConfig | None = None):
+        self.num_slots = num_slots
+        self.config = config or MotionAnalyzerConfig.load_default()
+
+        # Kalman filter state of [y, velocity], and its covariance
+        self.state = np.zeros((num_slots, 2))
+        self.cov = np.zeros((num_slots, 2, 2))
+        # Timestamp of each hand's last sample, with or without a measurement
+        self.last_sample_ts = np.full(num_slots, np.nan)
+        # Whether each hand has had a measurement, so the filtered state is meaningful
+        self.has_state = np.zeros(num_slots, bool)
+
+        # Turning point detection.
+        # Direction the filtered y is moving: -1 decreasing (hand rising), 1 increasing,
+        # 0 not yet known (waiting for the hand to first rise by the prominence).
+        self._direction = np.zeros(num_slots, np.int8)
+        # Extreme y reached since the last turning point, and when
+        self._extreme_y = np.full(num_slots, np.nan)
+        self._extreme_ts = np.full(num_slots, np.nan)
+
+        # Turning points of each hand, oldest first, padded with NaN
+        self.turning_point_ts = np.full((num_slots, MAX_TURNING_POINTS), np.nan)
+        self.turning_point_is_peak = np.zeros((num_slots, MAX_TURNING_POINTS), bool)
+        self.num_turning_points = np.zeros(num_slots, np.int64)
+        # Turning points must be later than this, to not combine separate motions
+        self.min_window_start = np.full(num_slots, -np.inf)
+
+        # Predictions
+        self.est_phase = np.full(num_slots, np.nan)
+        self.est_period = np.full(num_slots, float(DEFAULT_EST_PERIOD))
+        self.move_eta = np.full(num_slots, np.nan)
+        self.est_phase_ts = np.full(num_slots, np.nan)
+
+    def reset(self, slots):
+        """Clear the state of slots (an index, indices or a boolean mask), for new hands."""
+        self.state[slots] = 0
+        self.cov[slots] = 0
+        self.last_sample_ts[slots] = np.nan
+        self.has_state[slots] = False
+        self._direction[slots] = 0
+        self._extreme_y[slots] = np.nan
+        self._extreme_ts[slots] = np.nan
+        self.turning_point_ts[slots] = np.nan
+        self.turning_point_is_peak[slots] = False
+        self.num_turning_points[slots] = 0
+        self.min_window_start[slots] = -np.inf
+        self.est_phase[slots] = np.nan
+        self.est_period[slots] = DEFAULT_EST_PERIOD
+        self.move_eta[slots] = np.nan
+        self.est_phase_ts[slots] = np.nan
+
+    def add_samples(self, ts: float, hand_screen_y: np.ndarray):
+        """
+        Update all hands with the samples from a frame captured at ts.
+        hand_screen_y has one hand screen Y per slot, NaN where there's no measurement.
+        """
+        measured = ~np.isnan(hand_screen_y)
+        self._kalman_update(ts, hand_screen_y, measured)
+        self.last_sample_ts[:] = ts
+        self._detect_turning_points(ts, measured)
+        self._expire_turning_points(ts)
+        self._update_predictions(ts)
+
+    def _kalman_update(self, ts: float, y: np.ndarray, measured: np.ndarray):
+        # Constant velocity model with each hand's own time step.
+        # (Before the first sample the state and covariance are zero, so the step doesn't matter.)
+        dt = np.where(np.isnan(self.last_sample_ts), 1, ts - self.last_sample_ts)[
+            measured
+        ]
+        x = self.state[measured]
+        p = self.cov[measured]
+
+        # Predict
+        x_pred = np.stack([x[:, 0] + dt * x[:, 1], x[:, 1]], axis=1)
+        p00 = (
+            p[:, 0, 0]
+            + dt * (p[:, 0, 1] + p[:, 1, 0])
+            + dt * dt * p[:, 1, 1]
+            + self.config.process_noise
+        )
+        p01 = p[:, 0, 1] + dt * p[:, 1, 1]
+        p10 = p[:, 1, 0] + dt * p[:, 1, 1]
+        p11 = p[:, 1, 1] + self.config.process_noise
+
+        # Correct with the measured y
+        innovation_cov = p00 + self.config.measurement_noise
+        k0 = p00 / innovation_cov
+        k1 = p10 / innovation_cov
+        innovation = y[measured] - x_pred[:, 0]
+
+        self.state[measured, 0] = x_pred[:, 0] + k0 * innovation
+        self.state[measured, 1] = x_pred[:, 1] + k1 * innovation
+        self.cov[measured] = np.stack(
+            [
+                np.stack([p00 - k0 * p00, p01 - k0 * p01], axis=1),
+                np.stack([p10 - k1 * p00, p11 - k1 * p01], axis=1),
+            ],
+            axis=1,
+        )
+        self.has_state |= measured
+
+    def _detect_turning_points(self, ts: float, measured: np.ndarray):
+        y = self.state[:, 0]
+        prominence = self.config.prominence
+        extreme = self._extreme_y
+        first_sample = measured & np.isnan(extreme)
+        extreme[first_sample] = y[first_sample]
+        self._extreme_ts[first_sample] = ts
+
+        direction = self._direction
+        # Track the lowest point (y furthest up) while rising, highest point otherwise
+        rising = measured & (direction == -1)
+        new_extreme = np.where(rising, y < extreme, y > extreme) & measured
+        extreme[new_extreme] = y[new_extreme]
+        self._extreme_ts[new_extreme] = ts
+
+        # Waiting for the first rise, which leads to the first peak
+        started = measured & (direction == 0) & (y <= extreme - prominence)
+        # A peak (top of a swing) once the hand falls back by the prominence
+        peaked = rising & (y >= extreme + prominence)
+        # A valley once the hand rises back by the prominence
+        bottomed = measured & (direction == 1) & (y <= extreme - prominence)
+
+        self._append_turning_points(peaked, True)
+        self._append_turning_points(bottomed, False)
+
+        turned_up = started | bottomed
+        direction[turned_up] = -1
+        direction[peaked] = 1
+        changed = turned_up | peaked
+        extreme[changed] = y[changed]
+        self._extreme_ts[changed] = ts
+
+    def _append_turning_points(self, slots: np.ndarray, is_peak: bool):
+        # A motion starts with a peak, so a leading valley isn't recorded
+        if not is_peak:
+            slots = slots & (self.num_turning_points > 0)
+        if not slots.any():
+            return
+
+        self._drop_leading_turning_points(
+            (slots & (self.num_turning_points == MAX_TURNING_POINTS)).astype(np.int64)
+        )
+        rows = np.flatnonzero(slots)
+        cols = self.num_turning_points[rows]
+        self.turning_point_ts[rows, cols] = self._extreme_ts[rows]
+        self.turning_point_is_peak[rows, cols] = is_peak
+        self.num_turning_points[rows] += 1
+
+    def _expire_turning_points(self, ts: float):
+        cutoff = np.maximum(ts - self.config.window_secs, self.min_window_start)
+        # NaN padding never compares as expired
+        expired = (self.turning_point_ts <= cutoff[:, None]).sum(axis=1)
+        self._drop_leading_turning_points(expired)
+
+        # As at the start of a motion, a leading valley is ignored
+        leading_valley = (self.num_turning_points > 0) & ~self.turning_point_is_peak[
+            :, 0
+        ]
+        self._drop_leading_turning_points(leading_valley.astype(np.int64))
+
+    def _drop_leading_turning_points(self, num_dropped: np.ndarray):
+        if not num_dropped.any():
+            return
+        cols = np.arange(MAX_TURNING_POINTS)[None, :] + num_dropped[:, None]
+        in_range = cols < MAX_TURNING_POINTS
+        cols = np.minimum(cols, MAX_TURNING_POINTS - 1)
+        self.turning_point_ts = np.where(
+            in_range, np.take_along_axis(self.turning_point_ts, cols, axis=1), np.nan
+        )
+        self.turning_point_is_peak = in_range & np.take_along_axis(
+            self.turning_point_is_peak, cols, axis=1
+        )
+        self.num_turning_points -= num_dropped
+
+    def _update_predictions(self, ts: float):
+        rows = np.arange(self.num_slots)
+        count = self.num_turning_points
+        first_ts = self.turning_point_ts[:, 0]
+        last_ts = self.turning_point_ts[rows, np.maximum(count - 1, 0)]
+
+        # Points always alternate, so a motion is up to the 8 points of a full one
+        motion = (count >= 1) & (count <= self.config.max_motion_points)
+
+        # Each pair of points is half a swing
+        with np.errstate(invalid="ignore", divide="ignore"):
+            period = np.where(
+                count >= 2, (last_ts - first_ts) / (count - 1) * 2, DEFAULT_EST_PERIOD
+            )
+        self.est_period = np.where(motion, period, self.est_period)
+
+        # If it's been more than a swing since the last point, assume the motion stopped,
+        # unless it's already very close to the end
+        time_since_last_point = ts - last_ts
+        stopped = (
+            motion
+            & (time_since_last_point > self.est_period)
+            & (count < self.config.min_points_to_continue)
+        )
+        if stopped.any():
+            # Don't combine the points of this motion with the next
+            self.min_window_start[stopped] = last_ts[stopped]
+            self.turning_point_ts[stopped] = np.nan
+            self.turning_point_is_peak[stopped] = False
+            self.num_turning_points[stopped] = 0
+            self._direction[stopped] = 0
+            self._extreme_y[stopped] = self.state[stopped, 0]
+            self._extreme_ts[stopped] = ts
+
+        in_progress = motion & ~stopped
+        self.est_phase = np.where(
+            in_progress, count * 0.5 + time_since_last_point / self.est_period, np.nan
+        )
+        self.est_phase_ts = np.where(in_progress, ts, np.nan)
+        self.move_eta = ts + (4 - self.est_phase) * self.est_period
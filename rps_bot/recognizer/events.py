@@ -1,17 +1,24 @@
-from mediapipe.tasks.python.vision import GestureRecognizerResult
-
 from dataclasses import dataclass
+from queue import Queue
+import threading
+from typing import Callable, Iterable, Type
 
 from .gestures import HandGesture
 
+# Phase the motion must pass to count as a game being offered
+GAME_OFFER_MIN_PHASE = 0.5
+# Phase at which the move is played
+SHOOT_PHASE = 4
+
 
 class GameOffered:
     """
-    Detected the player initiating a game, by holding a fist still at the camera.
+    Detected the player initiating a game, by starting the swinging motion.
     """
 
-    def __init__(self):
-        pass
+    def __init__(self, ts: float):
+        self.ts = ts
+        """Capture timestamp of the frame the game was detected in, on the monotonic clock."""
 
 
 class Swinging:
@@ -21,9 +28,16 @@ class Swinging:
     Contains data about the hand's current and predicted motion.
     """
 
-    def __init__(self, ts: float, est_period_secs: float, est_current_phase: float):
+    def __init__(
+        self,
+        ts: float,
+        est_period_secs: float,
+        est_current_phase: float,
+        move_eta: float | None = None,
+        move_eta_std: float | None = None,
+    ):
         self.ts = ts
-        """Timestamp of this data, from time()."""
+        """Capture timestamp of the frame this data is from, on the monotonic clock."""
         self.est_period_secs = est_period_secs
         """The estimated time (secs) taken for each full swing in the periodic motion,
         i.e. time to move "to and back"."""
@@ -34,18 +48,150 @@ class Swinging:
         For example:
         1.0 = 1 swing completed (hand at top),
         1.5 = midway through 2nd swing (hand at bottom)."""
+        self.move_eta = move_eta
+        """The predicted time the move will be played, on the monotonic clock."""
+        self.move_eta_std = move_eta_std
+        """Std dev (secs) of move_eta, None if the estimator doesn't provide one."""
+
+    def phase_at(self, ts: float) -> float:
+        """Extrapolate the estimated phase to ts."""
+        return self.est_current_phase + (ts - self.ts) / self.est_period_secs
 
 
 class GesturePlayed:
-    """Detected the hand play their gesture in the game, after finishing the swings."""
+    """
+    The hand's gesture, as recognized in a processed frame.
+    Occurs for every processed frame, so the latest event is the current gesture.
+    """
 
-    def __init__(self, gesture: HandGesture):
+    def __init__(self, ts: float, gesture: HandGesture, score: float | None = None):
+        self.ts = ts
+        """Capture timestamp of the frame the gesture was recognized in."""
         self.gesture = gesture
         """The gesture played. May be NONE if not recognized."""
+        self.score = score
+        """Confidence of the recognized gesture, None if not recognized."""
 
 
 class GameCancelled:
     """The player didn't finish the started motion, or the recognizer failed."""
 
-    def __init__(self):
-        pass
+    def __init__(self, ts: float):
+        self.ts = ts
+        """Capture timestamp of the frame the cancellation was detected in."""
+
+
+class EventDispatcher:
+    """
+    Registry of listeners for a fixed set of event types, which delivers emitted events to them.
+
+    Events are either delivered synchronously from emit(), or, if queued, delivered in order
+    from a listener thread running between start() and stop().
+    """
+
+    def __init__(self, event_types: Iterable[Type], queued: bool = False, owner=None):
+        # Dict of event type to its set of callbacks
+        self._listeners = {event_type: set() for event_type in event_types}
+        # Name used in error messages
+        self._owner_name = (owner or self).__class__.__name__
+
+        self.queued = queued
+        self._queue: Queue = Queue()
+        self._thread: threading.Thread | None = None
+
+    def add_listener(self, event_type: Type, callback: Callable):
+        """
+        Register a callback for when the specified event type occurs.
+        callback should accept an event of the given type as argument.
+        """
+        try:
+            self._listeners[event_type].add(callback)
+        except KeyError:
+            raise ValueError(
+                f"{event_type} is not an event raised by {self._owner_name}"
+            )
+
+    def remove_listener(self, event_type: Type, callback: Callable):
+        """
+        Unregister a callback for the specified event type, stop receiving calls.
+        Does nothing if not already registered.
+        """
+        try:
+            event_listeners = self._listeners[event_type]
+        except KeyError:
+            raise ValueError(
+                f"{event_type.__name__} is not an event raised by {self._owner_name}"
+            )
+
+        event_listeners.discard(callback)
+
+    def emit(self, event):
+        if self.queued:
+            self._queue.put(event)
+        else:
+            self._deliver(event)
+
+    def start(self):
+        """Start the listener thread, if events are queued."""
+        if self.queued and self._thread is None:
+            self._thread = threading.Thread(
+                target=self._deliver_forever, name="rps-events", daemon=True
+            )
+            self._thread.start()
+
+    def stop(self):
+        """Deliver any events already queued, then stop the listener thread."""
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+
+    def _deliver_forever(self):
+        while (event := self._queue.get()) is not None:
+            self._deliver(event)
+
+    def _deliver(self, event):
+        # Copy, in case callbacks change the listeners
+        for callback in list(self._listeners[type(event)]):
+            callback(event)
+
+
+class MotionEventDetector:
+    """
+    Derives game events from the predictions of a MotionAnalyzer,
+    to be checked each time its predictions are updated.
+    """
+
+    def __init__(self, emit: Callable):
+        self._emit = emit
+        # Whether a game's motion is in progress, and its last estimated phase
+        self._in_game = False
+        self._last_phase: float | None = None
+
+    def update(self, analyzer, ts: float):
+        phase = analyzer.est_phase
+
+        if self._in_game and (phase is None or phase < GAME_OFFER_MIN_PHASE):
+            self._in_game = False
+            # Motion stopping after the shoot is the game finishing, not a cancellation
+            if self._last_phase < SHOOT_PHASE:
+                self._emit(GameCancelled(ts))
+
+        if phase is None:
+            return
+
+        if not self._in_game and phase > GAME_OFFER_MIN_PHASE:
+            self._in_game = True
+            self._emit(GameOffered(ts))
+
+        if self._in_game:
+            self._last_phase = phase
+            self._emit(
+                Swinging(
+                    analyzer.est_phase_ts,
+                    analyzer.est_period,
+                    phase,
+                    analyzer.move_eta,
+                    analyzer.move_eta_std,
+                )
+            )
@@ -1,90 +1,285 @@
 import mediapipe as mp
 from mediapipe.tasks.python.vision import (
-    GestureRecognizer,
-    GestureRecognizerOptions,
     RunningMode,
     GestureRecognizerResult,
 )
 from mediapipe.tasks.python.vision.hand_landmarker import HandLandmark
 
 import cv2 as cv
+import numpy as np
 import time
-from typing import Type
-from queue import Queue
+from typing import Callable, Type
+from queue import Empty, Queue
 
 from . import _util
+from ..profiling import StageTimings
 from .tracker import Tracker
 from .events import *
 from .gestures import HandGesture
-from .motion_analysis import MotionAnalyzer
-
+from .idle_gate import IdleGate
+from .inference_profile import (
+    DEFAULT_MODEL_PATH,
+    InferenceProfile,
+    create_mp_recognizer,
+)
+from .landmark_classifier import DEFAULT_LANDMARK_CLASSIFIER_PATH
+from .motion_analysis import MotionAnalyzer, MotionAnalyzerConfig
+from .pool import RecognizerPool
 
-DEFAULT_MODEL_PATH = "./models/gesture_recognizer_rps.task"
 TRACKER_INIT_MIN_INTERVAL_SECS = 0.3
 TRACKER_UPDATE_MIN_INTERVAL_SECS = 0.2
 TRACKER_EXPIRE_TIME_SECS = 1
+# How long to wait for the result of a warm-up frame before giving up
+WARM_UP_RESULT_TIMEOUT_SECS = 10
+# Recognition latency is recorded for this many frames after warm-up,
+# to confirm MediaPipe's slow first calls are out of the way
+FIRST_FRAMES_TRACKED = 30
 
 
 class HandRecognizer:
     def __init__(
         self,
-        model_path: str = DEFAULT_MODEL_PATH,
+        model_path: str = str(DEFAULT_MODEL_PATH),
         min_hand_detection_confidence: float = 0.5,
         min_hand_presence_confidence: float = 0.5,
         min_tracking_confidence: float = 0.5,
         tracking_roi_padding: float = 0.05,
+        tracker_backend: str = "csrt",
+        idle_gate: IdleGate | None = None,
+        num_workers: int = 0,
+        queue_events: bool = False,
+        num_hands: int = 1,
+        motion_config: MotionAnalyzerConfig | None = None,
+        delegate: str = "cpu",
+        cpus_per_worker: int | None = None,
+        gesture_classifier: str = "mediapipe",
+        landmark_classifier_path: str = str(DEFAULT_LANDMARK_CLASSIFIER_PATH),
     ):
-        # Responsible to analyzing hand motion to detect games
-        self.motion_predictor = MotionAnalyzer(5)
-
-        # Create gesture recognizer options
-        base_options = mp.tasks.BaseOptions(model_asset_path=model_path)
-        self._recognizer_options = GestureRecognizerOptions(
-            base_options,
-            # Live video mode
-            running_mode=RunningMode.LIVE_STREAM,
-            # Callback for results
-            result_callback=self._recognizer_result_cb,
-            min_hand_detection_confidence=min_hand_detection_confidence,
-            min_hand_presence_confidence=min_hand_presence_confidence,
-            min_tracking_confidence=min_tracking_confidence,
+        # How MediaPipe is run, checked before anything is set up
+        self.profile = InferenceProfile(
+            str(model_path),
+            delegate,
+            num_workers,
+            cpus_per_worker,
+            num_hands,
+            min_hand_detection_confidence,
+            min_hand_presence_confidence,
+            min_tracking_confidence,
+            gesture_classifier,
+            str(landmark_classifier_path),
         )
+        self.profile.validate()
+
+        # Responsible to analyzing hand motion to detect games.
+        # Uses the tuned config if none is given.
+        self.motion_predictor = MotionAnalyzer(motion_config)
+
+        # If given, decides which frames to skip recognizing while nothing is happening
+        self.idle_gate = idle_gate
+        # Whether skipping frames is currently acceptable, e.g. while waiting for a game
+        self.idle_allowed = False
+
+        # Gesture recognizer options, besides the model and delegate
+        self._mp_options = self.profile.recognizer_options
+
+        # If more than 0, recognize with a pool of this many worker processes instead
+        self._num_workers = num_workers
+        self._pool: RecognizerPool | None = None
 
         # Results from MediaPipe added here for use
         self._results_queue = Queue()
+        # If set, called from MediaPipe's thread whenever a result is ready to process
+        self.on_result_ready: Callable[[], None] | None = None
+        # If set, the time spent in each stage is added to it (see profiling.STAGES)
+        self.stage_timings: StageTimings | None = None
         self._last_result = None
         self._last_frame = None
         self._last_ts = None
         self._last_hand_found_ts = None
+        # Timestamp of the last frame submitted to MediaPipe, which requires them to increase
+        self._last_submitted_ts_ms = None
+        # Latency (secs) from submitting to processing the result, of the first frames
+        self.first_frame_latencies: list[float] = []
+        # Submission time of those first frames still in recognition, by timestamp (ms)
+        self._first_frame_submit_times: dict[int, float] = {}
 
-        # Dict of event type to its set of callbacks
-        self._events = {
-            GameOffered: set(),
-            Swinging: set(),
-            GesturePlayed: set(),
-            GameCancelled: set(),
-        }
+        # Delivers events to listeners, synchronously or from a listener thread if queued
+        self._events = EventDispatcher(
+            [GameOffered, Swinging, GesturePlayed, GameCancelled],
+            queued=queue_events,
+            owner=self,
+        )
+        # Raises motion related events as predictions are updated
+        self._motion_events = MotionEventDetector(self._events.emit)
+
+        # If recognizing several hands, tracks them all with stable IDs and analyzes their motion.
+        # The game is still played with the first hand recognized, through the single hand path.
+        self.hands = None
+        if num_hands > 1:
+            # Imported only when needed, as it loads scipy.optimize
+            from .multi_hand import MultiHandTracker
+
+            self.hands = MultiHandTracker(num_hands, self.motion_predictor.config)
 
         # Tracker to fill in for MediaPipe when its hand tracking fails
         self.tracker = Tracker(
             tracking_roi_padding,
             TRACKER_INIT_MIN_INTERVAL_SECS,
             TRACKER_UPDATE_MIN_INTERVAL_SECS,
+            tracker_backend,
         )
 
-    def __enter__(self):
-        self.mp_recognizer = GestureRecognizer.create_from_options(
-            self._recognizer_options
+    @classmethod
+    def from_profile(cls, profile: InferenceProfile, **kwargs) -> "HandRecognizer":
+        """A recognizer run as the profile sets, given any other options as keywords."""
+        return cls(
+            profile.model_path,
+            profile.min_hand_detection_confidence,
+            profile.min_hand_presence_confidence,
+            profile.min_tracking_confidence,
+            num_workers=profile.num_workers,
+            num_hands=profile.num_hands,
+            delegate=profile.delegate,
+            cpus_per_worker=profile.cpus_per_worker,
+            gesture_classifier=profile.gesture_classifier,
+            landmark_classifier_path=profile.landmark_classifier_path,
+            **kwargs,
         )
+
+    def __enter__(self):
+        self._events.start()
+        if self._num_workers > 0:
+            self._pool = RecognizerPool(
+                self._num_workers,
+                self.profile.model_path,
+                self._mp_options,
+                self._results_queue_put,
+                delegate=self.profile.delegate,
+                cpus_per_worker=self.profile.cpus_per_worker,
+                landmark_classifier_path=self.profile.landmark_classifier,
+            )
+            self._pool.start()
+        else:
+            # Either the gesture recognizer, or the landmarker and landmark classifier
+            self.mp_recognizer = create_mp_recognizer(
+                self.profile.model_path,
+                self.profile.delegate,
+                self._mp_options,
+                # Live video mode
+                RunningMode.LIVE_STREAM,
+                # Callback for results
+                self._recognizer_result_cb,
+                self.profile.landmark_classifier,
+            )
         return self
 
     def __exit__(self, exc_type, exc_value, exc_tb):
-        self.mp_recognizer.close()
+        if self._pool is not None:
+            self._pool.close()
+        else:
+            self.mp_recognizer.close()
+        self._events.stop()
 
     def next_frame(self, frame, ts: float):
+        """
+        Submit a frame for recognition, and process any results that are ready.
+        ts is the frame's capture time on the monotonic clock, and is carried with the frame
+        through recognition, tracking and motion analysis.
+        If an idle gate is set and idling is allowed, the frame may not be recognized.
+        """
+        self.submit_frame(frame, ts)
+        self.process_results()
+
+    def submit_frame(self, frame, ts: float):
+        """
+        The first half of next_frame: submit a frame for recognition, unless the idle gate
+        skips it. Its result is processed by a later call to process_results.
+        """
+        start = time.perf_counter()
+        if self.idle_gate is None or self.idle_gate.should_infer(
+            frame, ts, self.idle_allowed
+        ):
+            # Frames the pool drops never get a result, so aren't tracked
+            if self._recognize(frame, ts) and (
+                len(self.first_frame_latencies) + len(self._first_frame_submit_times)
+                < FIRST_FRAMES_TRACKED
+            ):
+                self._first_frame_submit_times[self._last_submitted_ts_ms] = (
+                    time.perf_counter()
+                )
+        if self.stage_timings is not None:
+            self.stage_timings.add("submit", time.perf_counter() - start)
+
+    def warm_up(
+        self, frame_sizes: list[tuple[int, int]], num_frames: int
+    ) -> dict[tuple[int, int], list[float]]:
+        """
+        Run synthetic frames of each (width, height) through the model, before any real
+        frames, so that MediaPipe's slow first calls aren't made during the first game.
+        With a worker pool, each worker gets num_frames frames of each size.
+        The results are discarded, without reaching tracking, motion analysis or listeners.
+        Returns the latency (secs) of each frame from submission to result, by size.
+        """
+        # Noise rather than a blank frame, so the palm detector has something to search
+        rng = np.random.default_rng(0)
+        latencies = {}
+        for width, height in frame_sizes:
+            frame = rng.integers(0, 256, (height, width, 3), np.uint8)
+            latencies[(width, height)] = []
+            for _ in range(num_frames * max(self._num_workers, 1)):
+                start = time.perf_counter()
+                self._recognize(frame, time.monotonic())
+                self._wait_for_result()
+                latencies[(width, height)].append(time.perf_counter() - start)
+        # Keep the pool's stats to real frames
+        if self._pool is not None:
+            self._pool.latencies.clear()
+        return latencies
+
+    def _wait_for_result(self):
+        """Wait for the next result to arrive, and take it off the queue unprocessed."""
+        deadline = time.monotonic() + WARM_UP_RESULT_TIMEOUT_SECS
+        while True:
+            if self._pool is not None:
+                self._pool.poll()
+            try:
+                return self._results_queue.get(timeout=0.005)
+            except Empty:
+                if time.monotonic() > deadline:
+                    raise RuntimeError("Timed out waiting for a recognition result")
+
+    def _recognize(self, frame, ts: float) -> bool:
+        """Submit a frame to MediaPipe or the pool. Returns False if the pool dropped it."""
+        # MediaPipe timestamps are integer ms, and must strictly increase
+        ts_ms = int(ts * 1000)
+        if (
+            self._last_submitted_ts_ms is not None
+            and ts_ms <= self._last_submitted_ts_ms
+        ):
+            ts_ms = self._last_submitted_ts_ms + 1
+        self._last_submitted_ts_ms = ts_ms
+
+        if self._pool is not None:
+            return self._pool.submit(frame, ts_ms)
+
         # Create MP image and recognize
         mp_image = mp.Image(image_format=mp.ImageFormat.SRGB, data=frame)
-        self.mp_recognizer.recognize_async(mp_image, int(ts * 1000))
+        self.mp_recognizer.recognize_async(mp_image, ts_ms)
+        return True
+
+    def process_results(self):
+        """
+        The second half of next_frame: run the results that are ready through tracking
+        and motion analysis, and emit the resulting events.
+        Must be called from the same thread as submit_frame.
+        """
+        timings = self.stage_timings
+        # Collect results from the pool, which arrive in frame order
+        if self._pool is not None:
+            start = time.perf_counter()
+            self._pool.poll()
+            if timings is not None:
+                timings.add("submit", time.perf_counter() - start)
 
         while not self._results_queue.empty():
             self._last_result, self._last_frame, result_ts_ms = (
@@ -92,24 +287,56 @@ class HandRecognizer:
             )
 
             self._last_ts = result_ts_ms / 1000
+            submit_time = self._first_frame_submit_times.pop(result_ts_ms, None)
+            if submit_time is not None:
+                self.first_frame_latencies.append(time.perf_counter() - submit_time)
 
+            start = time.perf_counter()
             # If MediaPipe recognized a hand
             if self.is_hand_recognized():
                 # Reinit tracker with latest frame and the hand bbox
                 self.tracker.init_with_landmarks(
-                    self._last_frame.numpy_view(), self.get_hand_landmarks()
+                    self._last_frame,
+                    self.get_hand_landmarks(),
+                    self._last_ts,
                 )
                 self._last_hand_found_ts = self._last_ts
+                if self.idle_gate is not None:
+                    self.idle_gate.hand_found(self._last_ts)
             # Elif tracking is inited
             elif self.tracker.is_inited():
                 # ...and it hasn't been to long since MediaPipe last found a hand (tracking likely still valid)
-                if time.time() - self._last_hand_found_ts <= TRACKER_EXPIRE_TIME_SECS:
-                    self.tracker.update(self._last_frame.numpy_view())
+                if self._last_ts - self._last_hand_found_ts <= TRACKER_EXPIRE_TIME_SECS:
+                    self.tracker.update(self._last_frame, self._last_ts)
                 # If exceeded, stop using tracking
                 else:
                     self.tracker.stop()
 
-            self.motion_predictor.add_sample(self._last_ts, self.tracker.get_hand_y())
+            tracked = time.perf_counter()
+            if timings is not None:
+                timings.add("track", tracked - start)
+
+            if self.hands is not None:
+                self._update_hands(self._last_result, self._last_ts)
+                if timings is not None:
+                    timings.add("hands", time.perf_counter() - tracked)
+
+            start = time.perf_counter()
+            if self.motion_predictor.add_sample(
+                self._last_ts, self.tracker.get_hand_y()
+            ):
+                self._motion_events.update(self.motion_predictor, self._last_ts)
+            if timings is not None:
+                timings.add("motion", time.perf_counter() - start)
+
+            gesture = self.get_gesture()
+            self._events.emit(
+                GesturePlayed(
+                    self._last_ts,
+                    gesture if gesture is not None else HandGesture.NONE,
+                    self.get_gesture_score(),
+                )
+            )
 
     def is_hand_recognized(self) -> bool:
         """
@@ -126,18 +353,7 @@ class HandRecognizer:
         """
         if not self.is_hand_recognized():
             return None
-        mp_gesture = self._last_result.gestures[0][0].category_name
-        match mp_gesture:
-            case "rock":
-                return HandGesture.ROCK
-            case "paper":
-                return HandGesture.PAPER
-            case "scissors":
-                return HandGesture.SCISSORS
-            case "none":
-                return HandGesture.NONE
-            case _:
-                return None
+        return _to_hand_gesture(self._last_result.gestures[0][0].category_name)
 
     def get_gesture_score(self) -> float | None:
         if self.get_gesture() is not None:
@@ -150,34 +366,39 @@ class HandRecognizer:
             self._last_result.hand_landmarks[0] if self.is_hand_recognized() else None
         )
 
+    def _update_hands(self, result: GestureRecognizerResult, ts: float):
+        landmarks = np.array(
+            [
+                [(landmark.x, landmark.y, landmark.z) for landmark in hand]
+                for hand in result.hand_landmarks
+            ],
+            np.float32,
+        ).reshape(-1, 21, 3)
+        self.hands.update(
+            ts,
+            landmarks,
+            [
+                _to_hand_gesture(gestures[0].category_name)
+                for gestures in result.gestures
+            ],
+            [gestures[0].score for gestures in result.gestures],
+        )
+
     def add_event_listener(self, event_type: Type, callback):
         """
         Register a callback for when the specified event type occurs.
         callback should accept an event of the given type as argument.
+        Callbacks are called from the thread calling next_frame,
+        or from a listener thread if events are queued.
         """
-        try:
-            self._events[event_type].add(callback)
-        except KeyError:
-            raise ValueError(
-                f"{event_type} is not an event raised by {self.__class__.__name__}"
-            )
+        self._events.add_listener(event_type, callback)
 
     def remove_event_listener(self, event_type: Type, callback):
         """
         Unregister a callback for the specified event type, stop receiving calls.
         Does nothing if not already registered.
         """
-        try:
-            event_listeners = self._events[event_type]
-        except KeyError:
-            raise ValueError(
-                f"{event_type.__name__} is not an event raised by {self.__class__.__name__}"
-            )
-
-        try:
-            event_listeners.remove(callback)
-        except KeyError:
-            pass
+        self._events.remove_listener(event_type, callback)
 
     def _recognizer_result_cb(
         self, result: GestureRecognizerResult, output_image: mp.Image, timestamp_ms: int
@@ -185,4 +406,25 @@ class HandRecognizer:
         """
         Callback for async results from MP gesture recognizer
         """
-        self._results_queue.put((result, output_image, timestamp_ms))
+        self._results_queue_put(result, output_image.numpy_view(), timestamp_ms)
+
+    def _results_queue_put(
+        self, result: GestureRecognizerResult, frame: np.ndarray, timestamp_ms: int
+    ):
+        self._results_queue.put((result, frame, timestamp_ms))
+        if self.on_result_ready is not None:
+            self.on_result_ready()
+
+
+def _to_hand_gesture(mp_gesture: str) -> HandGesture | None:
+    match mp_gesture:
+        case "rock":
+            return HandGesture.ROCK
+        case "paper":
+            return HandGesture.PAPER
+        case "scissors":
+            return HandGesture.SCISSORS
+        case "none":
+            return HandGesture.NONE
+        case _:
+            return None
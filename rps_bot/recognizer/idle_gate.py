@@ -0,0 +1,121 @@
+from collections import deque
+
+import cv2 as cv
+import numpy as np
+
+# Width of the downscaled grayscale frame used for motion detection
+MOTION_DOWNSCALE_WIDTH = 64
+# Per-pixel intensity change (0-255) that counts as changed
+MOTION_PIXEL_THRESHOLD = 15
+# Fraction of downscaled pixels that must change between frames to count as motion
+MOTION_MIN_CHANGED_FRACTION = 0.005
+
+
+class MotionDetector:
+    """
+    Cheap scene motion detector, based on differencing consecutive downscaled grayscale frames.
+    """
+
+    def __init__(
+        self,
+        downscale_width: int = MOTION_DOWNSCALE_WIDTH,
+        pixel_threshold: int = MOTION_PIXEL_THRESHOLD,
+        min_changed_fraction: float = MOTION_MIN_CHANGED_FRACTION,
+    ):
+        self._downscale_width = downscale_width
+        self._pixel_threshold = pixel_threshold
+        self._min_changed_fraction = min_changed_fraction
+        self._last_small: np.ndarray | None = None
+
+    def has_motion(self, frame: np.ndarray) -> bool:
+        """True if the frame differs noticeably from the previous one given."""
+        h, w = frame.shape[:2]
+        small_size = (self._downscale_width, max(1, h * self._downscale_width // w))
+        small = cv.resize(frame, small_size, interpolation=cv.INTER_AREA)
+        if small.ndim == 3:
+            small = cv.cvtColor(small, cv.COLOR_BGR2GRAY)
+
+        last_small = self._last_small
+        self._last_small = small
+        if last_small is None:
+            return True
+
+        changed = cv.absdiff(small, last_small) > self._pixel_threshold
+        return changed.mean() >= self._min_changed_fraction
+
+
+class IdleGate:
+    """
+    Decides which frames need full gesture recognition.
+
+    While idling is allowed (e.g. waiting for a game) and there has been neither motion
+    nor a hand for a while, only one frame per idle interval is recognized.
+    Full rate resumes as soon as motion is detected or a hand is found.
+    The time from the first motion to the hand being found is recorded,
+    and is bounded by the idle interval even if the motion is missed.
+    """
+
+    def __init__(
+        self,
+        idle_interval_secs: float = 0.5,
+        idle_after_secs: float = 2,
+        motion_detector: MotionDetector | None = None,
+    ):
+        # Time between recognized frames while idle
+        self.idle_interval_secs = idle_interval_secs
+        # How long without motion or a hand before idling
+        self.idle_after_secs = idle_after_secs
+        self._motion_detector = motion_detector or MotionDetector()
+
+        # Timestamps of the last motion or hand, and the last frame let through
+        self._last_activity_ts = float("-inf")
+        self._last_inference_ts = float("-inf")
+        # Timestamp that motion was detected after idling, until a hand is found
+        self._woken_ts: float | None = None
+
+        # Stats
+        self.frames_seen = 0
+        self.frames_inferred = 0
+        # Time (secs) from motion waking the gate to a hand being found, per occurrence
+        self.detection_latencies: deque[float] = deque(maxlen=1000)
+
+    def is_idle(self, ts: float) -> bool:
+        return ts - self._last_activity_ts >= self.idle_after_secs
+
+    def should_infer(self, frame: np.ndarray, ts: float, idle_allowed: bool) -> bool:
+        """Whether the frame captured at ts should go through full recognition."""
+        self.frames_seen += 1
+
+        if not idle_allowed:
+            infer = True
+        else:
+            was_idle = self.is_idle(ts)
+            if self._motion_detector.has_motion(frame):
+                if was_idle and self._woken_ts is None:
+                    self._woken_ts = ts
+                self._last_activity_ts = ts
+            elif was_idle:
+                # Motion without a hand (e.g. someone passing by), stop waiting for one
+                self._woken_ts = None
+
+            infer = (
+                not self.is_idle(ts)
+                or ts - self._last_inference_ts >= self.idle_interval_secs
+            )
+
+        if infer:
+            self.frames_inferred += 1
+            self._last_inference_ts = ts
+        return infer
+
+    def hand_found(self, ts: float):
+        """Report that a hand was found in the frame captured at ts."""
+        self._last_activity_ts = ts
+        if self._woken_ts is not None:
+            self.detection_latencies.append(ts - self._woken_ts)
+            self._woken_ts = None
+
+    @property
+    def duty_cycle(self) -> float:
+        """Fraction of frames seen that were recognized."""
+        return self.frames_inferred / self.frames_seen if self.frames_seen else 1
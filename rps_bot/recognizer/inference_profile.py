@@ -0,0 +1,198 @@
+from dataclasses import asdict, dataclass, fields
+import json
+import os
+from pathlib import Path
+import zipfile
+
+from .landmark_classifier import DEFAULT_LANDMARK_CLASSIFIER_PATH
+
+# The gesture model shipped with the bot, found regardless of the working directory
+DEFAULT_MODEL_PATH = (
+    Path(__file__).resolve().parents[2] / "models" / "gesture_recognizer_rps.task"
+)
+# MediaPipe delegates the model may run on
+DELEGATES = ("cpu", "gpu")
+# How gestures are classified: by the gesture model, or from the landmarks only,
+# running just the model's hand landmarker (see landmark_classifier)
+GESTURE_CLASSIFIERS = ("mediapipe", "landmarks")
+# The hand landmarker within the gesture model's task bundle
+HAND_LANDMARKER_ASSET = "hand_landmarker.task"
+
+
+@dataclass(frozen=True)
+class InferenceProfile:
+    """
+    How MediaPipe runs gesture recognition: the model, where it runs and with how many
+    CPUs, and the hand detection settings. Loaded from JSON, missing fields taking defaults.
+    """
+
+    # Gesture recognizer .task model
+    model_path: str = str(DEFAULT_MODEL_PATH)
+    # One of DELEGATES
+    delegate: str = "cpu"
+    # Recognize in this many worker processes, or in-process if 0
+    num_workers: int = 0
+    # Pin each worker to this many CPUs, or None to let it use all of them.
+    # MediaPipe's Python API has no thread count setting, so this is how its threads
+    # are limited, and it only applies to workers.
+    cpus_per_worker: int | None = None
+    # Max hands recognized per frame
+    num_hands: int = 1
+    min_hand_detection_confidence: float = 0.5
+    min_hand_presence_confidence: float = 0.5
+    min_tracking_confidence: float = 0.5
+    # One of GESTURE_CLASSIFIERS
+    gesture_classifier: str = "mediapipe"
+    # Trained LandmarkClassifier, if gesture_classifier is "landmarks"
+    landmark_classifier_path: str = str(DEFAULT_LANDMARK_CLASSIFIER_PATH)
+
+    def validate(self):
+        """
+        Raise ValueError if a setting is of the wrong type or out of range,
+        or the model doesn't exist.
+        """
+        for f in fields(self):
+            value = getattr(self, f.name)
+            # JSON numbers without a point load as int, and bools are ints to isinstance
+            expected = (int, float) if f.type is float else f.type
+            if isinstance(value, bool) or not isinstance(value, expected):
+                raise ValueError(
+                    f"{f.name} must be {getattr(f.type, '__name__', f.type)}, "
+                    f"got {value!r}"
+                )
+        if self.delegate not in DELEGATES:
+            raise ValueError(
+                f"Unknown delegate {self.delegate!r}, expected one of {DELEGATES}"
+            )
+        if self.num_workers < 0:
+            raise ValueError(f"num_workers must be at least 0, got {self.num_workers}")
+        if self.cpus_per_worker is not None:
+            if self.num_workers == 0:
+                raise ValueError("cpus_per_worker only applies with num_workers > 0")
+            if not 1 <= self.cpus_per_worker <= os.cpu_count():
+                raise ValueError(
+                    f"cpus_per_worker must be between 1 and {os.cpu_count()}, "
+                    f"got {self.cpus_per_worker}"
+                )
+        if self.num_hands < 1:
+            raise ValueError(f"num_hands must be at least 1, got {self.num_hands}")
+        for name, value in self.recognizer_options.items():
+            if name.endswith("confidence") and not 0 <= value <= 1:
+                raise ValueError(f"{name} must be between 0 and 1, got {value}")
+        if not Path(self.model_path).is_file():
+            raise ValueError(f"Model {self.model_path} doesn't exist")
+        if self.gesture_classifier not in GESTURE_CLASSIFIERS:
+            raise ValueError(
+                f"Unknown gesture classifier {self.gesture_classifier!r}, "
+                f"expected one of {GESTURE_CLASSIFIERS}"
+            )
+        if self.gesture_classifier == "landmarks":
+            if not Path(self.landmark_classifier_path).is_file():
+                raise ValueError(
+                    f"Landmark classifier {self.landmark_classifier_path} doesn't exist"
+                )
+            hand_landmarker_model(self.model_path)
+
+    @property
+    def landmark_classifier(self) -> str | None:
+        """The landmark classifier to run, or None if the gesture model classifies."""
+        if self.gesture_classifier == "landmarks":
+            return self.landmark_classifier_path
+        return None
+
+    @property
+    def recognizer_options(self) -> dict:
+        """The GestureRecognizerOptions set by the profile, besides the base options."""
+        return dict(
+            num_hands=self.num_hands,
+            min_hand_detection_confidence=self.min_hand_detection_confidence,
+            min_hand_presence_confidence=self.min_hand_presence_confidence,
+            min_tracking_confidence=self.min_tracking_confidence,
+        )
+
+    @classmethod
+    def load(cls, path: str | Path) -> "InferenceProfile":
+        """
+        Load a profile saved as JSON. Raises ValueError if it isn't an object of the
+        profile's fields. Its values are checked by validate().
+        """
+        with open(path) as f:
+            data = json.load(f)
+        if not isinstance(data, dict):
+            raise ValueError(f"Inference profile {path} must be a JSON object")
+        unknown = set(data) - {f.name for f in fields(cls)}
+        if unknown:
+            raise ValueError(
+                f"Unknown fields in inference profile {path}: {', '.join(sorted(unknown))}"
+            )
+        return cls(**data)
+
+    def save(self, path: str | Path):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(asdict(self), f, indent=2)
+
+
+def to_mp_delegate(delegate: str):
+    """The MediaPipe BaseOptions.Delegate of one of DELEGATES. Imports MediaPipe."""
+    from mediapipe.tasks.python.core.base_options import BaseOptions
+
+    return BaseOptions.Delegate[delegate.upper()]
+
+
+def hand_landmarker_model(model_path: str | Path) -> bytes:
+    """
+    The hand landmarker model bundled in a gesture model, which is a zip of its stages.
+    Raises ValueError if it has none.
+    """
+    try:
+        with zipfile.ZipFile(model_path) as bundle:
+            return bundle.read(HAND_LANDMARKER_ASSET)
+    except (zipfile.BadZipFile, KeyError):
+        raise ValueError(f"Model {model_path} has no {HAND_LANDMARKER_ASSET} bundled")
+
+
+def create_mp_recognizer(
+    model_path: str | Path,
+    delegate: str,
+    recognizer_options: dict,
+    running_mode,
+    result_callback=None,
+    landmark_classifier_path: str | Path | None = None,
+):
+    """
+    A MediaPipe GestureRecognizer in the given RunningMode, or if a landmark classifier is
+    given, a LandmarkGestureRecognizer running the model's hand landmarker and that
+    classifier, which has the same interface. Imports MediaPipe.
+    """
+    import mediapipe as mp
+    from mediapipe.tasks.python.vision import (
+        GestureRecognizer,
+        GestureRecognizerOptions,
+        HandLandmarkerOptions,
+    )
+    from .landmark_classifier import LandmarkClassifier, LandmarkGestureRecognizer
+
+    if landmark_classifier_path is None:
+        return GestureRecognizer.create_from_options(
+            GestureRecognizerOptions(
+                mp.tasks.BaseOptions(
+                    model_asset_path=str(model_path), delegate=to_mp_delegate(delegate)
+                ),
+                running_mode=running_mode,
+                result_callback=result_callback,
+                **recognizer_options,
+            )
+        )
+    return LandmarkGestureRecognizer(
+        HandLandmarkerOptions(
+            mp.tasks.BaseOptions(
+                model_asset_buffer=hand_landmarker_model(model_path),
+                delegate=to_mp_delegate(delegate),
+            ),
+            running_mode=running_mode,
+            **recognizer_options,
+        ),
+        LandmarkClassifier.load(landmark_classifier_path),
+        result_callback,
+    )
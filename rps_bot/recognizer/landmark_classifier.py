@@ -0,0 +1,229 @@
+"""
+A small NumPy gesture classifier on hand landmarks, as a cheaper alternative to the
+gesture model's classifier head.
+
+Landmarks are turned into geometric features that don't depend on the hand's size or
+orientation: how far each finger extends, how bent it is, and how far apart the fingertips
+are. Gestures are then classified by their nearest centroid in the standardized features.
+The classifier is trained offline, e.g. by tools.train_landmark_classifier, on landmarks
+labelled by the gesture model.
+"""
+
+from pathlib import Path
+
+import numpy as np
+
+# Trained classifier shipped with the bot, found regardless of the working directory
+DEFAULT_LANDMARK_CLASSIFIER_PATH = (
+    Path(__file__).resolve().parents[2] / "models" / "landmark_classifier.npz"
+)
+
+# Landmark indices (see HandLandmark)
+WRIST = 0
+MIDDLE_FINGER_MCP = 9
+PINKY_MCP = 17
+# Base, middle joint and tip of each finger, thumb first
+FINGER_MCPS = np.array([2, 5, 9, 13, 17])
+FINGER_PIPS = np.array([3, 6, 10, 14, 18])
+FINGER_TIPS = np.array([4, 8, 12, 16, 20])
+# Each pair of fingertips
+_TIP_PAIRS = np.array([(a, b) for a in range(5) for b in range(a + 1, 5)])
+
+NUM_FEATURES = 5 + 5 + len(_TIP_PAIRS)
+
+
+def landmark_features(landmarks: np.ndarray) -> np.ndarray:
+    """
+    Nx21x3 landmarks (preferably world landmarks, which aren't distorted by the image's
+    aspect ratio) to NxNUM_FEATURES features:
+    - extension of each finger: its tip's distance from the wrist over its base's,
+      or for the thumb, from the pinky's base over the palm size,
+    - bend of each finger: cosine of the angle between its base and tip segments,
+    - distance between each pair of fingertips, over the palm size.
+    """
+    landmarks = np.asarray(landmarks, np.float32).reshape(-1, 21, 3)
+    wrist = landmarks[:, WRIST, None]
+    palm_size = np.linalg.norm(
+        landmarks[:, MIDDLE_FINGER_MCP] - landmarks[:, WRIST], axis=-1
+    )
+    palm_size = np.maximum(palm_size, 1e-6)[:, None]
+
+    mcps = landmarks[:, FINGER_MCPS]
+    pips = landmarks[:, FINGER_PIPS]
+    tips = landmarks[:, FINGER_TIPS]
+
+    extension = np.linalg.norm(tips - wrist, axis=-1) / np.maximum(
+        np.linalg.norm(mcps - wrist, axis=-1), 1e-6
+    )
+    extension[:, 0] = (
+        np.linalg.norm(tips[:, 0] - landmarks[:, PINKY_MCP], axis=-1) / palm_size[:, 0]
+    )
+
+    base = pips - mcps
+    end = tips - pips
+    bend = np.sum(base * end, axis=-1) / np.maximum(
+        np.linalg.norm(base, axis=-1) * np.linalg.norm(end, axis=-1), 1e-6
+    )
+
+    spread = (
+        np.linalg.norm(tips[:, _TIP_PAIRS[:, 0]] - tips[:, _TIP_PAIRS[:, 1]], axis=-1)
+        / palm_size
+    )
+    return np.concatenate([extension, bend, spread], axis=1)
+
+
+class LandmarkClassifier:
+    """
+    Nearest centroid classifier over landmark_features. Labels are gesture names as the
+    gesture model outputs them, e.g. "rock", or "none" if trained on unrecognized poses.
+    """
+
+    def __init__(
+        self,
+        labels: list[str],
+        centroids: np.ndarray,
+        feature_mean: np.ndarray,
+        feature_std: np.ndarray,
+    ):
+        self.labels = list(labels)
+        # Centroid of each label, in standardized features
+        self.centroids = np.asarray(centroids, np.float32)
+        self.feature_mean = np.asarray(feature_mean, np.float32)
+        self.feature_std = np.asarray(feature_std, np.float32)
+        self._label_array = np.array(self.labels)
+
+    @classmethod
+    def fit(cls, landmarks: np.ndarray, labels: list[str]) -> "LandmarkClassifier":
+        """Train on Nx21x3 landmarks, each labelled with its gesture."""
+        features = landmark_features(landmarks)
+        labels = np.asarray(labels)
+        if len(features) != len(labels):
+            raise ValueError(
+                f"Got {len(features)} landmark sets but {len(labels)} labels"
+            )
+        if len(features) == 0:
+            raise ValueError("No landmarks to train on")
+
+        mean = features.mean(axis=0)
+        std = np.maximum(features.std(axis=0), 1e-6)
+        standardized = (features - mean) / std
+        names = sorted(set(labels.tolist()))
+        centroids = np.stack(
+            [standardized[labels == name].mean(axis=0) for name in names]
+        )
+        return cls(names, centroids, mean, std)
+
+    def predict(self, landmarks: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Classify Nx21x3 landmarks. Returns the label of each, and its score:
+        the softmax of the negative squared distances to the centroids.
+        """
+        features = (landmark_features(landmarks) - self.feature_mean) / self.feature_std
+        sq_dists = np.sum(
+            (features[:, None, :] - self.centroids[None, :, :]) ** 2, axis=-1
+        )
+        # Softmax of -d^2 / 2, shifted by the nearest distance for stability
+        weights = np.exp(-(sq_dists - sq_dists.min(axis=1, keepdims=True)) / 2)
+        nearest = np.argmin(sq_dists, axis=1)
+        scores = weights[np.arange(len(nearest)), nearest] / weights.sum(axis=1)
+        return self._label_array[nearest], scores
+
+    @classmethod
+    def load(cls, path: str | Path) -> "LandmarkClassifier":
+        with np.load(path) as data:
+            return cls(
+                data["labels"].tolist(),
+                data["centroids"],
+                data["feature_mean"],
+                data["feature_std"],
+            )
+
+    def save(self, path: str | Path):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "wb") as f:
+            np.savez(
+                f,
+                labels=self._label_array,
+                centroids=self.centroids,
+                feature_mean=self.feature_mean,
+                feature_std=self.feature_std,
+            )
+
+
+def landmarks_array(hand_landmarks: list) -> np.ndarray:
+    """Nx21x3 array of MediaPipe landmark lists, one per hand."""
+    return np.array(
+        [[(lm.x, lm.y, lm.z) for lm in hand] for hand in hand_landmarks],
+        np.float32,
+    ).reshape(-1, 21, 3)
+
+
+class LandmarkGestureRecognizer:
+    """
+    Stands in for MediaPipe's GestureRecognizer, running only its hand landmarker, and
+    classifying the landmarks with a LandmarkClassifier. Results are GestureRecognizerResults,
+    with each hand's gestures being the classifier's label, so callers can't tell the two apart.
+    Usually created by inference_profile.create_mp_recognizer.
+    """
+
+    def __init__(self, options, classifier: LandmarkClassifier, result_callback=None):
+        """
+        options are the HandLandmarkerOptions, without a result callback. In live stream
+        mode, result_callback takes the GestureRecognizerResult, image and timestamp.
+        """
+        from mediapipe.tasks.python.vision import HandLandmarker
+
+        self.classifier = classifier
+        if result_callback is not None:
+            options.result_callback = lambda result, image, timestamp_ms: (
+                result_callback(self.to_gesture_result(result), image, timestamp_ms)
+            )
+        self._landmarker = HandLandmarker.create_from_options(options)
+
+    def recognize_async(self, image, timestamp_ms: int):
+        self._landmarker.detect_async(image, timestamp_ms)
+
+    def recognize_for_video(self, image, timestamp_ms: int):
+        return self.to_gesture_result(
+            self._landmarker.detect_for_video(image, timestamp_ms)
+        )
+
+    def recognize(self, image):
+        return self.to_gesture_result(self._landmarker.detect(image))
+
+    def to_gesture_result(self, result):
+        """A HandLandmarkerResult as a GestureRecognizerResult, with classified gestures."""
+        from mediapipe.tasks.python.components.containers.category import Category
+        from mediapipe.tasks.python.vision import GestureRecognizerResult
+
+        gestures = []
+        if result.hand_world_landmarks:
+            labels, scores = self.classifier.predict(
+                landmarks_array(result.hand_world_landmarks)
+            )
+            gestures = [
+                [
+                    Category(
+                        index=self.classifier.labels.index(label),
+                        score=float(score),
+                        display_name="",
+                        category_name=str(label),
+                    )
+                ]
+                for label, score in zip(labels, scores)
+            ]
+        return GestureRecognizerResult(
+            gestures,
+            result.handedness,
+            result.hand_landmarks,
+            result.hand_world_landmarks,
+        )
+
+    def close(self):
+        self._landmarker.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_tb):
+        self.close()
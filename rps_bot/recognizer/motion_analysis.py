@@ -1,23 +1,88 @@
 from collections import deque, namedtuple
 from bisect import bisect
-import time
+from dataclasses import asdict, dataclass
 from itertools import pairwise
+import math
+from pathlib import Path
+import json
 
-from scipy import signal
 import numpy as np
 import cv2 as cv
 
+from .phase_tracker import PhaseTracker
+
 REPREDICT_INTERVAL_SECS = 0.2
 REPEATED_PEAK_DIFF_THRESHOLD_SECS = 0.2
 DEFAULT_EST_PERIOD = 1
+# Ways to resample the window's irregularly timed samples evenly for finding turning points:
+# interpolating at their timestamps onto a grid kept up to date as samples arrive,
+# or by FFT over the window's samples as if they were evenly spaced
+RESAMPLING_METHODS = ("interpolate", "fft")
+# Ways to estimate the phase: by counting turning points (re-estimated each analysis),
+# or by tracking it continuously with a PhaseTracker (updated every sample)
+PHASE_ESTIMATORS = ("turning_points", "tracker")
+# If the tracker's phase is off from the turning point count by more than this,
+# it has slipped, and is re-counted by whole cycles
+TRACKER_SLIP_CYCLES = 0.75
+# Tuned config loaded at startup if present, as written by tools.tune_motion
+DEFAULT_CONFIG_PATH = (
+    Path(__file__).resolve().parents[2] / "config" / "motion_analyzer.json"
+)
 
 TurningPoint = namedtuple("TurningPoint", ["ts", "type"])
 
 
+@dataclass
+class MotionAnalyzerConfig:
+    """
+    The tunable constants of motion analysis. The defaults are the hand-picked values.
+    """
+
+    # How far back analysis should consider samples from
+    window_secs: float = 5
+    # Min time between re-analyzing the motion for predictions, which is expensive
+    repredict_interval_secs: float = REPREDICT_INTERVAL_SECS
+    # Number of evenly spaced samples a full window is resampled to
+    num_resamples: int = 50
+    # One of RESAMPLING_METHODS
+    resampling: str = "interpolate"
+    # Prominence (screen heights) a peak or valley needs to count as a turning point.
+    # Lower than the 0.3 used with FFT resampling, whose ringing overstated prominences.
+    prominence: float = 0.25
+    # Max turning points in a motion (a full one has 8). With more, it may have been missed.
+    max_motion_points: int = 8
+    # A motion with fewer points than this that has paused for a swing has stopped
+    min_points_to_continue: int = 6
+    # Kalman filter process and measurement noise
+    process_noise: float = 0.1
+    measurement_noise: float = 1.0
+    # One of PHASE_ESTIMATORS
+    phase_estimator: str = "turning_points"
+
+    @classmethod
+    def load(cls, path: str | Path) -> "MotionAnalyzerConfig":
+        with open(path) as f:
+            return cls(**json.load(f))
+
+    @classmethod
+    def load_default(cls) -> "MotionAnalyzerConfig":
+        """The tuned config, if one has been saved to the default path, else the defaults."""
+        if DEFAULT_CONFIG_PATH.exists():
+            return cls.load(DEFAULT_CONFIG_PATH)
+        return cls()
+
+    def save(self, path: str | Path):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(asdict(self), f, indent=2)
+
+
 class MotionAnalyzer:
-    def __init__(self, window_secs: float):
+    def __init__(self, config: MotionAnalyzerConfig | None = None):
+        # Tunable constants, the tuned ones by default
+        self.config = config or MotionAnalyzerConfig.load_default()
         # How far back analysis should consider samples from
-        self._window_secs = window_secs
+        self._window_secs = self.config.window_secs
         # The window for samples must start at least this late
         # Used to prevent detection of earlier, unrelated/abandoned motions
         self.min_window_start = 0
@@ -35,26 +100,73 @@ class MotionAnalyzer:
         self.move_eta: float = None
         # The estimated phase in the motion, if in progress
         self.est_phase: float = None
+        # The timestamp of the sample the phase was estimated at
+        self.est_phase_ts: float = None
+        # The estimated time (secs) taken for each full swing
+        self.est_period: float = DEFAULT_EST_PERIOD
+        # Std devs of the phase and move time estimates, if the estimator provides them
+        self.est_phase_std: float | None = None
+        self.move_eta_std: float | None = None
+
+        # Filtered heights linearly interpolated onto an evenly spaced grid of times
+        # (whole multiples of the grid step), extended as samples arrive,
+        # and the last filtered sample (ts, y) to interpolate from
+        if self.config.resampling not in RESAMPLING_METHODS:
+            raise ValueError(
+                f"Unknown resampling {self.config.resampling!r}, "
+                f"expected one of {RESAMPLING_METHODS}"
+            )
+        self._grid_step = self._window_secs / self.config.num_resamples
+        grid_len = self.config.num_resamples + 1
+        self._grid_ts: deque[float] = deque(maxlen=grid_len)
+        self._grid_y: deque[float] = deque(maxlen=grid_len)
+        self._last_filtered: tuple[float, float] | None = None
+
+        # Tracks the phase continuously while motion is in progress, if that's the estimator
+        if self.config.phase_estimator not in PHASE_ESTIMATORS:
+            raise ValueError(
+                f"Unknown phase estimator {self.config.phase_estimator!r}, "
+                f"expected one of {PHASE_ESTIMATORS}"
+            )
+        self._phase_tracker: PhaseTracker | None = None
+
+        # scipy.signal is slow to import, so it's only loaded once an analyzer is made,
+        # which is before the game loop starts rather than at the first analysis
+        from scipy import signal
+
+        self._signal = signal
 
         # Set up Kalman filter
         self._kalman = cv.KalmanFilter(2, 1)
         self._kalman.measurementMatrix = np.array([[1, 0]], np.float32)
         self._kalman.transitionMatrix = np.array([[1, 1], [0, 1]], np.float32)
-        self._kalman.processNoiseCov = np.array([[1, 0], [0, 1]], np.float32) * 0.1
+        self._kalman.processNoiseCov = (
+            np.array([[1, 0], [0, 1]], np.float32) * self.config.process_noise
+        )
+        self._kalman.measurementNoiseCov = np.array(
+            [[self.config.measurement_noise]], np.float32
+        )
 
-        # The time that the motion data was last analyzed for predictions. Recorded for limiting rate.
-        self._time_last_prediction = time.time()
+        # The sample time that the motion data was last analyzed for predictions.
+        # Recorded for limiting rate.
+        self._time_last_prediction = float("-inf")
 
-    def add_sample(self, ts: float, hand_screen_y: float | None):
+    def add_sample(self, ts: float, hand_screen_y: float | None) -> bool:
         """
-        Update with a new sample of the hand screen Y at ts.
+        Update with a new sample of the hand screen Y at ts, the frame's capture time
+        on the monotonic clock.
         If ts is less recent than already seen samples, it is ignored.
+        Returns True if the predictions were updated, which is on every sample while the
+        phase is being tracked.
         """
+        if len(self.ts_history) > 0 and ts <= self.ts_history[-1]:
+            return False
+
         if hand_screen_y:
             # If there's been any previous samples
             if len(self.ts_history) > 0:
                 # Time delta from last sample
-                dt = self.ts_history[-1] - ts
+                dt = ts - self.ts_history[-1]
                 # Update transition matrix to account for varying time delta
                 self._kalman.transitionMatrix = np.array([[1, dt], [0, 1]], np.float32)
             # Kalman predict
@@ -63,6 +175,7 @@ class MotionAnalyzer:
             self._kalman.correct(np.array([[hand_screen_y]], np.float32))
             # Append filtered state to history
             self.filtered_history.append(self._kalman.statePost)
+            self._extend_grid(ts, float(self._kalman.statePost[0, 0]))
         else:
             self.filtered_history.append(None)
 
@@ -70,10 +183,21 @@ class MotionAnalyzer:
         self.ts_history.append(ts)
         self.measured_history.append(hand_screen_y)
 
+        # Tracking is cheap, so done every sample
+        if self._phase_tracker is not None:
+            self._phase_tracker.update(ts, hand_screen_y or None)
+
         # Update predictions, if haven't done this work too recently (expensive)
-        if time.time() - self._time_last_prediction >= REPREDICT_INTERVAL_SECS:
-            self._time_last_prediction = time.time()
+        if ts - self._time_last_prediction >= self.config.repredict_interval_secs:
+            self._time_last_prediction = ts
             self._update_predictions(ts)
+            if self.config.phase_estimator == "tracker":
+                self._update_tracking()
+            return True
+        if self._phase_tracker is not None:
+            self._predict_from_tracker()
+            return True
+        return False
 
     def filtered_from_last_n_secs(
         self, n: float, limit_window: bool = False
@@ -95,37 +219,94 @@ class MotionAnalyzer:
             if self.filtered_history[i] is not None
         ]
 
-    def _update_predictions(self, ts: float):
-        # Number of evenly spaced samples to resample provided height data points into
-        NUM_RESAMPLES = 50
+    def _extend_grid(self, ts: float, filtered_y: float):
+        """
+        Interpolate the grid points between the last filtered sample and this one.
+        Only these new points are computed, the earlier ones being kept from before.
+        """
+        if self._last_filtered is not None:
+            last_ts, last_y = self._last_filtered
+            step = self._grid_step
+            # The first grid point after the last sample, skipping any that would
+            # be out of the window already after a long gap
+            k = max(
+                math.floor(last_ts / step) + 1,
+                math.ceil((ts - self._window_secs) / step),
+            )
+            slope = (filtered_y - last_y) / (ts - last_ts)
+            while k * step <= ts:
+                grid_ts = k * step
+                self._grid_ts.append(grid_ts)
+                self._grid_y.append(last_y + slope * (grid_ts - last_ts))
+                k += 1
+        self._last_filtered = (ts, filtered_y)
 
-        # RESET PREDICTIONS
-        self.est_phase = None
-        self.move_eta = None
+    def _resampled_window(self, ts: float) -> tuple[np.ndarray, np.ndarray] | None:
+        """
+        The filtered heights in the window, evenly resampled, and their timestamps,
+        or None if there are too few samples.
+        """
+        if self.config.resampling == "interpolate":
+            cutoff_ts = max(ts - self._window_secs, self.min_window_start)
+            grid_ts = np.fromiter(self._grid_ts, float, len(self._grid_ts))
+            start = np.searchsorted(grid_ts, cutoff_ts, side="right")
+            if len(grid_ts) - start < 5:
+                return None
+            grid_y = np.fromiter(self._grid_y, float, len(self._grid_y))
+            return grid_ts[start:], grid_y[start:]
 
         # Get filtered samples from within time window of interest
         window_samples = self.filtered_from_last_n_secs(
             self._window_secs, limit_window=True
         )
-
         # If too few samples, don't bother
         if len(window_samples) < 5:
-            return
-
-        # RESAMPLING
-        # Extract just the y values, and resample uniformly (then reshape into 1D)
-        window_y_resampled = signal.resample(
-            [p[1][0] for p in window_samples], NUM_RESAMPLES
+            return None
+        # Extract just the y values, and resample uniformly (then reshape into 1D).
+        # Assumes the samples are evenly spaced.
+        window_y_resampled = self._signal.resample(
+            [p[1][0] for p in window_samples], self.config.num_resamples
         ).reshape(-1)
         # Timestamps corresponding to resampled values
         window_ts_resampled = np.linspace(
-            window_samples[0][0], window_samples[-1][0], NUM_RESAMPLES
+            window_samples[0][0], window_samples[-1][0], self.config.num_resamples
         )
+        return window_ts_resampled, window_y_resampled
+
+    def phase_at(self, ts: float) -> float | None:
+        """
+        Extrapolate the estimated phase to ts (on the same clock as the samples),
+        or None if no motion is in progress.
+        """
+        if self.est_phase is None:
+            return None
+        return self.est_phase + (ts - self.est_phase_ts) / self.est_period
+
+    def _update_predictions(self, ts: float):
+        config = self.config
+
+        # RESET PREDICTIONS
+        self.est_phase = None
+        self.move_eta = None
+        self.est_phase_std = None
+        self.move_eta_std = None
+
+        # RESAMPLING
+        # Filtered samples from within time window of interest, evenly resampled
+        resampled = self._resampled_window(ts)
+        # If too few samples, don't bother
+        if resampled is None:
+            return
+        window_ts_resampled, window_y_resampled = resampled
 
         # FIND PEAKS AND VALLEYS (TURNING POINTS)
         # (Reversed because lower y = higher physically)
-        peaks, _ = signal.find_peaks(-window_y_resampled, prominence=0.3)
-        valleys, _ = signal.find_peaks(window_y_resampled, prominence=0.3)
+        peaks, _ = self._signal.find_peaks(
+            -window_y_resampled, prominence=config.prominence
+        )
+        valleys, _ = self._signal.find_peaks(
+            window_y_resampled, prominence=config.prominence
+        )
 
         # Map indices to actual timestamps
         peaks = window_ts_resampled[peaks]
@@ -155,7 +336,9 @@ class MotionAnalyzer:
 
         # If points are alternating, and number does not exceed 8 (amount in a full motion; if exceeded, may have missed it),
         # may be a bobbing action, in progress or recently stopped
-        motion_detected = is_alternating and len(turning_points) <= 8
+        motion_detected = (
+            is_alternating and len(turning_points) <= config.max_motion_points
+        )
 
         # If motion not detected, stop
         if not motion_detected:
@@ -178,7 +361,10 @@ class MotionAnalyzer:
         time_since_last_point = ts - turning_points[-1].ts
         # If it's been more than a phase since then, assume the motion stopped...
         # unless we're already very close to the end, in which case just go with it
-        if time_since_last_point > self.est_period and len(turning_points) < 6:
+        if (
+            time_since_last_point > self.est_period
+            and len(turning_points) < config.min_points_to_continue
+        ):
             # Also, don't look before the last point again, to prevent accidentally
             # combining peaks from different attempts
             self.min_window_start = turning_points[-1].ts
@@ -188,6 +374,54 @@ class MotionAnalyzer:
         self.est_phase = (
             len(turning_points) * 0.5 + time_since_last_point / self.est_period
         )
+        self.est_phase_ts = ts
 
         # ESTIMATE TIME TO PLAY MOVE (time of 4th valley)
         self.move_eta = ts + (4 - self.est_phase) * self.est_period
+
+    def _update_tracking(self):
+        """
+        Start, continue or stop tracking the phase, following the turning point analysis,
+        and take the predictions from the tracker while tracking.
+        """
+        # The turning points decide whether there's motion, and count its cycles
+        if self.est_phase is None:
+            self._phase_tracker = None
+            return
+
+        if self._phase_tracker is None:
+            self._phase_tracker = self._start_tracker()
+        else:
+            slip = self.est_phase - self._phase_tracker.phase
+            if abs(slip) > TRACKER_SLIP_CYCLES:
+                self._phase_tracker.shift_cycles(round(slip))
+        self._predict_from_tracker()
+
+    def _start_tracker(self) -> PhaseTracker:
+        """
+        Start tracking from the first turning point (a peak, at phase 0.5),
+        catching up on the samples since.
+        """
+        first_ts = self.turning_points[0].ts
+        window_y = [
+            float(state[0, 0])
+            for _, state in self.filtered_from_last_n_secs(
+                self._window_secs, limit_window=True
+            )
+        ]
+        top, bottom = min(window_y), max(window_y)
+        tracker = PhaseTracker(
+            first_ts, 0.5, self.est_period, (top + bottom) / 2, (bottom - top) / 2
+        )
+        for i in range(bisect(self.ts_history, first_ts), len(self.ts_history)):
+            tracker.update(self.ts_history[i], self.measured_history[i] or None)
+        return tracker
+
+    def _predict_from_tracker(self):
+        tracker = self._phase_tracker
+        self.est_phase = tracker.phase
+        self.est_phase_ts = tracker.ts
+        self.est_period = tracker.period
+        self.est_phase_std = tracker.phase_std
+        # Time of 4th valley
+        self.move_eta, self.move_eta_std = tracker.eta(4)
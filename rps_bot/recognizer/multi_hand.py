@@ -0,0 +1,144 @@
+from dataclasses import dataclass
+
+import numpy as np
+from scipy.optimize import linear_sum_assignment
+
+from .batched_motion import BatchedMotionAnalyzer
+from .motion_analysis import MotionAnalyzerConfig
+from .gestures import HandGesture
+
+# Max mean landmark distance (screen units) between frames for a detection to be the same hand
+MAX_ASSOCIATION_DIST = 0.15
+# Forget a hand if it hasn't been seen for this long
+HAND_EXPIRE_SECS = 1
+
+
+@dataclass
+class TrackedHand:
+    """A snapshot of one tracked hand."""
+
+    hand_id: int
+    # 21x3 landmarks in screen coords, as last recognized
+    landmarks: np.ndarray
+    # Capture timestamp of the frame the hand was last recognized in
+    last_seen_ts: float
+    gesture: HandGesture | None
+    gesture_score: float | None
+    # Motion predictions, None if no motion in progress
+    est_phase: float | None
+    est_period: float
+    move_eta: float | None
+
+
+class MultiHandTracker:
+    """
+    Tracks several hands across frames, giving each a stable ID.
+
+    The hands recognized in each frame are associated with the tracked hands by
+    optimal assignment on their mean landmark distance. Unmatched hands get new IDs,
+    and tracked hands not seen for a while are forgotten.
+    Each hand's motion is analyzed in a slot of a BatchedMotionAnalyzer.
+    """
+
+    def __init__(
+        self,
+        max_hands: int,
+        motion_config: MotionAnalyzerConfig | None = None,
+        max_association_dist: float = MAX_ASSOCIATION_DIST,
+        expire_secs: float = HAND_EXPIRE_SECS,
+    ):
+        self.max_hands = max_hands
+        self._max_association_dist = max_association_dist
+        self._expire_secs = expire_secs
+
+        # Per slot: ID of the hand in it (-1 if free), and its latest recognition
+        self.ids = np.full(max_hands, -1, np.int64)
+        self.landmarks = np.zeros((max_hands, 21, 3), np.float32)
+        self.last_seen_ts = np.full(max_hands, -np.inf)
+        self.gestures: list[HandGesture | None] = [None] * max_hands
+        self.gesture_scores: list[float | None] = [None] * max_hands
+        self._next_id = 0
+
+        self.motion = BatchedMotionAnalyzer(max_hands, motion_config)
+
+    def update(
+        self,
+        ts: float,
+        landmarks: np.ndarray,
+        gestures: list[HandGesture | None] | None = None,
+        gesture_scores: list[float | None] | None = None,
+    ) -> np.ndarray:
+        """
+        Update with the hands recognized in a frame captured at ts.
+        landmarks is Mx21x3, for M hands. Returns the ID given to each hand,
+        -1 if there was no free slot for it.
+        """
+        landmarks = np.asarray(landmarks, np.float32).reshape(-1, 21, 3)
+        num_detected = len(landmarks)
+        gestures = gestures or [None] * num_detected
+        gesture_scores = gesture_scores or [None] * num_detected
+
+        # Forget hands that haven't been seen for a while
+        expired = (self.ids >= 0) & (ts - self.last_seen_ts > self._expire_secs)
+        if expired.any():
+            self.ids[expired] = -1
+            self.motion.reset(expired)
+
+        detection_slots = np.full(num_detected, -1, np.int64)
+        tracked = np.flatnonzero(self.ids >= 0)
+        if num_detected and len(tracked):
+            # Mean distance between corresponding landmarks, for each tracked x detected pair
+            diff = self.landmarks[tracked, None, :, :2] - landmarks[None, :, :, :2]
+            cost = np.linalg.norm(diff, axis=3).mean(axis=2)
+            rows, cols = linear_sum_assignment(cost)
+            close = cost[rows, cols] <= self._max_association_dist
+            detection_slots[cols[close]] = tracked[rows[close]]
+
+        # New hands take free slots
+        free = list(np.flatnonzero(self.ids < 0))
+        for i in np.flatnonzero(detection_slots < 0):
+            if not free:
+                break
+            slot = free.pop(0)
+            self.ids[slot] = self._next_id
+            self._next_id += 1
+            self.motion.reset(slot)
+            detection_slots[i] = slot
+
+        matched = detection_slots >= 0
+        slots = detection_slots[matched]
+        self.landmarks[slots] = landmarks[matched]
+        self.last_seen_ts[slots] = ts
+        for i, slot in zip(np.flatnonzero(matched), slots):
+            self.gestures[slot] = gestures[i]
+            self.gesture_scores[slot] = gesture_scores[i]
+
+        # Hand height is the center of its landmarks' bounds, as for the single hand tracker
+        hand_y = np.full(self.max_hands, np.nan)
+        hand_y[slots] = (
+            landmarks[matched, :, 1].min(axis=1) + landmarks[matched, :, 1].max(axis=1)
+        ) / 2
+        self.motion.add_samples(ts, hand_y)
+
+        return np.where(matched, self.ids[np.maximum(detection_slots, 0)], -1)
+
+    def hands(self) -> list[TrackedHand]:
+        """The hands currently tracked, in slot order."""
+        motion = self.motion
+        return [
+            TrackedHand(
+                int(self.ids[slot]),
+                self.landmarks[slot].copy(),
+                float(self.last_seen_ts[slot]),
+                self.gestures[slot],
+                self.gesture_scores[slot],
+                _none_if_nan(motion.est_phase[slot]),
+                float(motion.est_period[slot]),
+                _none_if_nan(motion.move_eta[slot]),
+            )
+            for slot in np.flatnonzero(self.ids >= 0)
+        ]
+
+
+def _none_if_nan(value: float) -> float | None:
+    return None if np.isnan(value) else float(value)
@@ -0,0 +1,128 @@
+import math
+
+import numpy as np
+
+# How fast each part of the state may wander, as variance per second:
+# the phase (cycles) beyond what the frequency predicts, the frequency (Hz),
+# and the rest height and amplitude (screen heights) of the motion
+PHASE_NOISE = 0.005
+FREQUENCY_NOISE = 0.2
+OFFSET_NOISE = 0.005
+AMPLITUDE_NOISE = 0.005
+# Variance of measured heights about the fitted sinusoid
+MEASUREMENT_VAR = 0.03**2
+# Measurements further than this many std devs from the fit are ignored as glitches
+OUTLIER_STDS = 4
+# Frequencies (Hz) the motion is kept within
+MIN_FREQUENCY = 0.4
+MAX_FREQUENCY = 4
+# Uncertainty of the initial estimates
+INITIAL_PHASE_STD = 0.1
+INITIAL_FREQUENCY_STD = 0.5
+INITIAL_OFFSET_STD = 0.05
+INITIAL_AMPLITUDE_STD = 0.1
+
+
+class PhaseTracker:
+    """
+    Tracks the phase and frequency of the bobbing motion continuously, by fitting a sinusoid
+    to each height sample as it arrives, with an extended Kalman filter.
+
+    The hand's height is modelled as offset + amplitude * cos(2 pi phase), so whole phases
+    are at rest (bottom, the greatest screen y) and halves at the top,
+    as MotionAnalyzer counts them.
+    The state is [phase (cycles), frequency (Hz), offset, amplitude].
+    Each sample takes constant time, and the state covariance gives the uncertainty
+    of the estimates.
+    """
+
+    def __init__(
+        self,
+        ts: float,
+        phase: float,
+        period: float,
+        offset: float,
+        amplitude: float,
+    ):
+        # Time the state is estimated at
+        self.ts = ts
+        self.state = np.array([phase, 1 / period, offset, amplitude])
+        self.cov = np.diag(
+            np.square(
+                [
+                    INITIAL_PHASE_STD,
+                    INITIAL_FREQUENCY_STD,
+                    INITIAL_OFFSET_STD,
+                    INITIAL_AMPLITUDE_STD,
+                ]
+            )
+        )
+        self._process_noise = np.diag(
+            [PHASE_NOISE, FREQUENCY_NOISE, OFFSET_NOISE, AMPLITUDE_NOISE]
+        )
+
+    @property
+    def phase(self) -> float:
+        return float(self.state[0])
+
+    @property
+    def period(self) -> float:
+        return float(1 / self.state[1])
+
+    @property
+    def phase_std(self) -> float:
+        return math.sqrt(self.cov[0, 0])
+
+    def update(self, ts: float, hand_screen_y: float | None):
+        """
+        Advance the state to ts, then correct it with the height measured then, if any.
+        Samples not later than the current state are ignored.
+        """
+        dt = ts - self.ts
+        if dt <= 0:
+            return
+        self.ts = ts
+
+        # Predict: the phase advances by the frequency
+        transition = np.eye(4)
+        transition[0, 1] = dt
+        self.state = transition @ self.state
+        self.cov = transition @ self.cov @ transition.T + self._process_noise * dt
+
+        if hand_screen_y is None:
+            return
+
+        # Correct, linearizing the sinusoid about the predicted phase
+        phase, _, offset, amplitude = self.state
+        angle = 2 * math.pi * phase
+        cos, sin = math.cos(angle), math.sin(angle)
+        jacobian = np.array([-2 * math.pi * amplitude * sin, 0, 1, cos])
+        innovation = hand_screen_y - (offset + amplitude * cos)
+        cov_jacobian = self.cov @ jacobian
+        innovation_var = jacobian @ cov_jacobian + MEASUREMENT_VAR
+        if innovation * innovation > OUTLIER_STDS**2 * innovation_var:
+            return
+        gain = cov_jacobian / innovation_var
+        self.state = self.state + gain * innovation
+        self.cov = self.cov - np.outer(gain, cov_jacobian)
+
+        # A negative amplitude is the same motion half a cycle out, which isn't allowed
+        self.state[3] = max(self.state[3], 0.0)
+        self.state[1] = min(max(self.state[1], MIN_FREQUENCY), MAX_FREQUENCY)
+
+    def shift_cycles(self, cycles: int):
+        """Re-count the phase by whole cycles, e.g. if a cycle has slipped."""
+        self.state[0] += cycles
+
+    def eta(self, target_phase: float) -> tuple[float, float]:
+        """
+        Predicted time the phase reaches target_phase, and its std dev,
+        assuming the frequency holds.
+        """
+        phase, frequency = self.state[:2]
+        remaining = target_phase - phase
+        eta = self.ts + remaining / frequency
+        # Sensitivity of the eta to the phase and frequency
+        jacobian = np.array([-1 / frequency, -remaining / frequency**2])
+        var = jacobian @ self.cov[:2, :2] @ jacobian
+        return float(eta), math.sqrt(max(var, 0.0))
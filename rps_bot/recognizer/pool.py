@@ -0,0 +1,270 @@
+from collections import deque
+from multiprocessing import shared_memory
+from queue import Empty
+import multiprocessing
+import os
+import time
+
+import numpy as np
+
+# Capacity of each frame slot in shared memory
+DEFAULT_MAX_FRAME_BYTES = 1920 * 1080 * 3
+# How long to wait for all workers to load the model on start
+WORKER_START_TIMEOUT_SECS = 60
+
+
+def _worker_main(
+    worker_index: int,
+    model_path: str,
+    delegate: str,
+    cpus: list[int] | None,
+    recognizer_options: dict,
+    landmark_classifier_path: str | None,
+    shm_name: str,
+    slot_bytes: int,
+    tasks: multiprocessing.Queue,
+    results: multiprocessing.Queue,
+    ready,
+):
+    """
+    Worker process entry point.
+    Recognizes frames from shared memory slots as tasks arrive, until given None.
+    """
+    # Limits MediaPipe's threads, which can't be set directly
+    if cpus and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cpus)
+
+    import mediapipe as mp
+    from mediapipe.tasks.python.vision import RunningMode
+    from .inference_profile import create_mp_recognizer
+
+    shm = shared_memory.SharedMemory(name=shm_name)
+    recognizer = create_mp_recognizer(
+        model_path,
+        delegate,
+        recognizer_options,
+        # Each worker gets a strictly increasing subset of the frames, so video mode works
+        RunningMode.VIDEO,
+        landmark_classifier_path=landmark_classifier_path,
+    )
+    ready.set()
+
+    try:
+        while (task := tasks.get()) is not None:
+            seq, slot, ts_ms, shape = task
+            frame = np.ndarray(shape, np.uint8, shm.buf, slot * slot_bytes)
+            mp_image = None
+            try:
+                mp_image = mp.Image(image_format=mp.ImageFormat.SRGB, data=frame)
+                result = recognizer.recognize_for_video(mp_image, ts_ms)
+            except Exception as e:
+                print(f"Recognizer worker {worker_index} failed on frame {seq}: {e}")
+                result = None
+            # Release views of the shared memory, so it can be closed
+            del frame, mp_image
+            results.put((seq, worker_index, slot, result))
+    finally:
+        recognizer.close()
+        shm.close()
+
+
+class WorkerDiedError(RuntimeError):
+    """A recognizer worker process exited while the pool was running."""
+
+
+class RecognizerPool:
+    """
+    Pool of MediaPipe gesture recognizers in worker processes, to recognize several frames at once.
+
+    Frames are passed through shared memory and assigned to workers round-robin.
+    Results are passed to result_callback(result, frame, timestamp_ms) in the order
+    the frames were submitted, regardless of which worker finishes first.
+    A worker dying outright (e.g. a crash in MediaPipe, or killed out of memory) would hold
+    up every later result, so poll() raises WorkerDiedError, for the pool to be restarted.
+    If landmark_classifier_path is given, workers classify gestures from the landmarks
+    with it, instead of with the gesture model (see landmark_classifier).
+    """
+
+    def __init__(
+        self,
+        num_workers: int,
+        model_path: str,
+        recognizer_options: dict,
+        result_callback,
+        max_frame_bytes: int = DEFAULT_MAX_FRAME_BYTES,
+        slots_per_worker: int = 2,
+        delegate: str = "cpu",
+        cpus_per_worker: int | None = None,
+        landmark_classifier_path: str | None = None,
+    ):
+        if num_workers < 1:
+            raise ValueError(f"num_workers must be at least 1, got {num_workers}")
+
+        self.num_workers = num_workers
+        self._result_callback = result_callback
+        self._max_frame_bytes = max_frame_bytes
+        self._slots_per_worker = slots_per_worker
+
+        self._shm = shared_memory.SharedMemory(
+            create=True, size=num_workers * slots_per_worker * max_frame_bytes
+        )
+
+        # CPUs each worker is pinned to, consecutive ones from those this process may use
+        cpus = [None] * num_workers
+        if cpus_per_worker and hasattr(os, "sched_getaffinity"):
+            available = sorted(os.sched_getaffinity(0))
+            cpus = [
+                [
+                    available[(i * cpus_per_worker + j) % len(available)]
+                    for j in range(cpus_per_worker)
+                ]
+                for i in range(num_workers)
+            ]
+
+        # Spawn, since MediaPipe can't be used safely from a forked process
+        ctx = multiprocessing.get_context("spawn")
+        self._results = ctx.Queue()
+        self._tasks = [ctx.Queue() for _ in range(num_workers)]
+        self._ready = [ctx.Event() for _ in range(num_workers)]
+        self._workers = [
+            ctx.Process(
+                target=_worker_main,
+                args=(
+                    i,
+                    model_path,
+                    delegate,
+                    cpus[i],
+                    recognizer_options,
+                    landmark_classifier_path,
+                    self._shm.name,
+                    max_frame_bytes,
+                    self._tasks[i],
+                    self._results,
+                    self._ready[i],
+                ),
+                name=f"rps-recognizer-{i}",
+                daemon=True,
+            )
+            for i in range(num_workers)
+        ]
+
+        # Free slot indices of each worker
+        self._free_slots = [
+            deque(range(i * slots_per_worker, (i + 1) * slots_per_worker))
+            for i in range(num_workers)
+        ]
+        # Worker to assign the next frame to
+        self._next_worker = 0
+
+        # Sequence number of the next frame submitted, and the next one to deliver a result for
+        self._next_submit_seq = 0
+        self._next_deliver_seq = 0
+        # Submitted frames by sequence number, as (frame, timestamp_ms, submit time)
+        self._submitted: dict[int, tuple[np.ndarray, int, float]] = {}
+        # Results waiting for earlier results to be delivered first, by sequence number
+        self._finished: dict[int, object] = {}
+
+        # Stats
+        self.frames_dropped = 0
+        # Time (secs) from submitting each frame to delivering its result
+        self.latencies: deque[float] = deque(maxlen=1000)
+
+    def start(self):
+        """Start the workers and wait for them all to load the model."""
+        for worker in self._workers:
+            worker.start()
+        deadline = time.monotonic() + WORKER_START_TIMEOUT_SECS
+        for ready in self._ready:
+            if not ready.wait(max(0, deadline - time.monotonic())):
+                raise RuntimeError("Timed out waiting for recognizer workers to start")
+
+    def close(self):
+        for tasks in self._tasks:
+            tasks.put(None)
+        for worker in self._workers:
+            worker.join(timeout=1)
+            if worker.is_alive():
+                worker.terminate()
+        self._shm.close()
+        self._shm.unlink()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_tb):
+        self.close()
+
+    def has_capacity(self) -> bool:
+        """Whether the worker next in turn can take a frame."""
+        return bool(self._free_slots[self._next_worker])
+
+    def submit(self, frame: np.ndarray, timestamp_ms: int) -> bool:
+        """
+        Submit a frame to the next worker in turn.
+        Returns False if the frame was dropped because that worker is still busy.
+        """
+        frame = np.ascontiguousarray(frame, dtype=np.uint8)
+        if frame.nbytes > self._max_frame_bytes:
+            raise ValueError(
+                f"Frame of {frame.nbytes} bytes exceeds the pool's slot size of "
+                f"{self._max_frame_bytes}"
+            )
+
+        worker = self._next_worker
+        if not self._free_slots[worker]:
+            self.frames_dropped += 1
+            return False
+        self._next_worker = (worker + 1) % self.num_workers
+
+        slot = self._free_slots[worker].popleft()
+        start = slot * self._max_frame_bytes
+        self._shm.buf[start : start + frame.nbytes] = frame.reshape(-1).data
+
+        seq = self._next_submit_seq
+        self._next_submit_seq += 1
+        # Keep a private copy for the result callback, since the caller may draw on the frame
+        self._submitted[seq] = (frame.copy(), timestamp_ms, time.perf_counter())
+        self._tasks[worker].put((seq, slot, timestamp_ms, frame.shape))
+        return True
+
+    def poll(self):
+        """
+        Collect finished results, and deliver those that are next in order.
+        Raises WorkerDiedError if a worker has died.
+        """
+        while True:
+            try:
+                seq, worker, slot, result = self._results.get_nowait()
+            except Empty:
+                break
+            self._free_slots[worker].append(slot)
+            self._finished[seq] = result
+
+        # Results a worker put before dying were collected above, the rest never come
+        for i, worker in enumerate(self._workers):
+            if worker.exitcode is not None:
+                raise WorkerDiedError(
+                    f"Recognizer worker {i} died (exit code {worker.exitcode}) "
+                    f"with {self._outstanding(i)} frames outstanding"
+                )
+
+        while self._next_deliver_seq in self._finished:
+            seq = self._next_deliver_seq
+            self._next_deliver_seq += 1
+
+            result = self._finished.pop(seq)
+            frame, timestamp_ms, submit_time = self._submitted.pop(seq)
+            self.latencies.append(time.perf_counter() - submit_time)
+            # Failed frames are skipped
+            if result is not None:
+                self._result_callback(result, frame, timestamp_ms)
+
+    def _outstanding(self, worker: int) -> int:
+        """Number of frames a worker was given and hasn't returned."""
+        return self._slots_per_worker - len(self._free_slots[worker])
+
+    @property
+    def in_flight(self) -> int:
+        """Number of frames submitted whose results haven't been delivered yet."""
+        return len(self._submitted)
@@ -1,10 +1,16 @@
 import cv2 as cv
 import numpy as np
 
-import time
-
 from . import _util
 
+# OpenCV trackers that can follow the hand, by name. All work without model files.
+# CSRT is the most accurate, KCF the fastest.
+TRACKER_BACKENDS = {
+    "csrt": cv.TrackerCSRT.create,
+    "kcf": cv.TrackerKCF.create,
+    "mil": cv.TrackerMIL.create,
+}
+
 
 class Tracker:
     def __init__(
@@ -12,8 +18,9 @@ class Tracker:
         roi_padding: float,
         min_init_interval_secs: float,
         min_update_interval_secs: float,
+        backend: str = "csrt",
     ):
-        self._csrt = cv.TrackerCSRT.create()
+        self._cv_tracker = TRACKER_BACKENDS[backend]()
         # In screen coords, the amount of padding to add around hand region to use as ROI
         self._roi_padding = roi_padding
         # Whether this tracker has been initialized
@@ -23,30 +30,32 @@ class Tracker:
 
         self._min_init_interval_secs = min_init_interval_secs
         self._min_update_interval_secs = min_update_interval_secs
-        # Time that these were last performed. Recorded for limiting rate.
-        self._last_init_time = time.time()
-        self._last_update_time = time.time()
+        # Frame timestamps that these were last performed at. Recorded for limiting rate.
+        self._last_init_time = float("-inf")
+        self._last_update_time = float("-inf")
 
     def is_inited(self):
         return self._inited
 
-    def init_with_landmarks(self, frame: np.array, hand_landmarks: list):
+    def init_with_landmarks(self, frame: np.array, hand_landmarks: list, ts: float):
+        """Set the hand region from landmarks recognized in frame, captured at ts."""
         self._roi_screen = _util.make_screen_roi_from_landmarks(
             hand_landmarks, self._roi_padding
         )
 
-        if time.time() - self._last_init_time >= self._min_init_interval_secs:
-            self._last_init_time = time.time()
+        if ts - self._last_init_time >= self._min_init_interval_secs:
+            self._last_init_time = ts
             self._inited = True
-            self._csrt.init(
+            self._cv_tracker.init(
                 frame, _util.bbox_screen_to_cam(self._roi_screen, frame.shape)
             )
 
-    def update(self, image: np.array):
-        if time.time() - self._last_update_time >= self._min_update_interval_secs:
-            self._last_update_time = time.time()
+    def update(self, image: np.array, ts: float):
+        """Track the hand region into image, captured at ts."""
+        if ts - self._last_update_time >= self._min_update_interval_secs:
+            self._last_update_time = ts
 
-            ok, bbox = self._csrt.update(image)
+            ok, bbox = self._cv_tracker.update(image)
             self._roi_screen = (
                 _util.bbox_cam_to_screen(bbox, image.shape) if ok else None
             )
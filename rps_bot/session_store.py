@@ -0,0 +1,365 @@
+"""
+Append-only store of play sessions, for analysis: a row per game played, and optionally
+per-frame diagnostics of the hand's motion.
+
+Rows are recorded from the game loop into memory, and a writer thread commits them to
+disk in batches, so the loop never waits on the disk. If the writer falls behind, batches
+are dropped (and counted) rather than the loop blocked. If committing fails (the disk is
+full, or root isn't a directory), the batches are counted as failed and the writer goes on
+with the next ones.
+
+Each session is a directory, ROOT/YYYY-MM-DD/HHMMSS-PID, holding:
+- games.jsonl: a line per game, appended at each commit,
+- frames-NNNNNN.npz: a chunk of frame diagnostics per commit, in columns.
+Files are only ever appended to or added, and chunks are renamed into place once written,
+so a session can be read while it is being recorded.
+"""
+
+from datetime import date, datetime
+import json
+import os
+from pathlib import Path
+import queue
+import threading
+import time
+
+import numpy as np
+
+from .game_flow.controller import GameEndState
+
+# Frames buffered in memory before they are handed to the writer
+DEFAULT_FRAME_BATCH = 300
+# Recorded rows are committed at least this often, even if a batch isn't full
+DEFAULT_COMMIT_INTERVAL_SECS = 5
+# Batches waiting for the writer beyond this many are dropped
+MAX_PENDING_BATCHES = 64
+# How long close() waits at a time for space to ask the writer to stop
+CLOSE_POLL_SECS = 0.5
+
+# Game row fields, as loaded. Moves are HandGesture values ("" if none was read),
+# results are GameResult names in lower case, and missing times or scores are NaN.
+GAME_COLUMNS = {
+    # Wall clock time the game ended, to order games across sessions
+    "wall_ts": np.float64,
+    # Monotonic clock times, as the frame capture timestamps
+    "ts_game_end": np.float64,
+    "ts_shoot": np.float64,
+    "predicted_ts_shoot": np.float64,
+    "bot_move": np.str_,
+    "player_move": np.str_,
+    "result": np.str_,
+    "gesture_score": np.float64,
+}
+# Frame diagnostics columns, one row per motion sample. Missing values are NaN.
+FRAME_COLUMNS = {
+    "ts": np.float64,
+    # Measured hand height (screen y), and its Kalman filtered height and velocity
+    "height": np.float32,
+    "filtered_y": np.float32,
+    "filtered_velocity": np.float32,
+    # Estimated bobbing phase, 4 being the shoot
+    "phase": np.float32,
+    # Index into SOURCES of where the height came from
+    "source": np.uint8,
+}
+# Sources of a frame's hand height: none found, MediaPipe's landmarks, or the tracker
+SOURCES = ("none", "mediapipe", "tracker")
+SOURCE_NONE, SOURCE_MEDIAPIPE, SOURCE_TRACKER = range(len(SOURCES))
+
+GAMES_FILE = "games.jsonl"
+FRAME_CHUNK_GLOB = "frames-*.npz"
+
+
+def _or_nan(value: float | None) -> float:
+    return np.nan if value is None else value
+
+
+class SessionStore:
+    """
+    Records a session's games, and optionally its frame diagnostics, under root.
+    observe() is meant to be called from the game loop after each frame.
+    """
+
+    def __init__(
+        self,
+        root: str | Path,
+        frame_diagnostics: bool = False,
+        frame_batch: int = DEFAULT_FRAME_BATCH,
+        commit_interval_secs: float = DEFAULT_COMMIT_INTERVAL_SECS,
+    ):
+        started = datetime.now()
+        self.path = (
+            Path(root) / started.date().isoformat() / f"{started:%H%M%S}-{os.getpid()}"
+        )
+        self.frame_diagnostics = frame_diagnostics
+        self.commit_interval_secs = commit_interval_secs
+
+        # Batches handed off to the writer thread, None asking it to stop
+        self._queue: queue.Queue[tuple[str, object] | None] = queue.Queue(
+            MAX_PENDING_BATCHES
+        )
+        # Frame columns being filled, and how many rows are filled
+        self._frame_batch = frame_batch
+        self._frames = self._new_frame_columns()
+        self._num_frames = 0
+        self._last_handoff = time.monotonic()
+
+        # What observe() saw last, so each game and sample is recorded once
+        self._last_state = None
+        self._last_sample_ts = None
+
+        # Batches dropped as the writer was behind, batches it failed to commit and
+        # the last error it failed with, and rows written so far
+        self.dropped_batches = 0
+        self.failed_batches = 0
+        self.write_error: Exception | None = None
+        self.games_written = 0
+        self.frames_written = 0
+        self._chunks_written = 0
+
+        self._writer = threading.Thread(
+            target=self._write_forever, name="session-store", daemon=True
+        )
+        self._writer.start()
+
+    def _new_frame_columns(self) -> dict[str, np.ndarray]:
+        return {
+            name: np.empty(self._frame_batch, dtype)
+            for name, dtype in FRAME_COLUMNS.items()
+        }
+
+    def observe(self, recognizer, controller):
+        """
+        Record the game that just ended, if the controller's state is a new GameEndState,
+        and the recognizer's latest motion sample, if frame diagnostics are on.
+        """
+        state = controller.state
+        if state is not self._last_state:
+            self._last_state = state
+            if isinstance(state, GameEndState):
+                self.record_game(state)
+
+        if self.frame_diagnostics:
+            predictor = recognizer.motion_predictor
+            if (
+                predictor.ts_history
+                and predictor.ts_history[-1] != self._last_sample_ts
+            ):
+                self._last_sample_ts = predictor.ts_history[-1]
+                height = predictor.measured_history[-1]
+                filtered = predictor.filtered_history[-1]
+                if recognizer.is_hand_recognized():
+                    source = SOURCE_MEDIAPIPE
+                # A height of 0 is the hand at the top edge of the frame, not no hand
+                elif height is not None:
+                    source = SOURCE_TRACKER
+                else:
+                    source = SOURCE_NONE
+                self.record_frame(
+                    self._last_sample_ts,
+                    height,
+                    float(filtered[0, 0]) if filtered is not None else None,
+                    float(filtered[1, 0]) if filtered is not None else None,
+                    predictor.est_phase,
+                    source,
+                )
+
+        self._handoff_if_due()
+
+    def record_game(self, state: GameEndState):
+        row = {
+            "wall_ts": time.time(),
+            "ts_game_end": state.ts_game_end,
+            "ts_shoot": state.ts_shoot,
+            "predicted_ts_shoot": state.predicted_ts_shoot,
+            "bot_move": state.bot_move.value,
+            "player_move": (
+                state.player_move.value if state.player_move is not None else ""
+            ),
+            "result": state.result.name.lower(),
+            "gesture_score": state.gesture_score,
+        }
+        # Games are few and the most valuable rows, so they aren't held for a full batch
+        self._put(("games", [row]))
+
+    def record_frame(
+        self,
+        ts: float,
+        height: float | None,
+        filtered_y: float | None,
+        filtered_velocity: float | None,
+        phase: float | None,
+        source: int,
+    ):
+        i = self._num_frames
+        frames = self._frames
+        frames["ts"][i] = ts
+        frames["height"][i] = _or_nan(height)
+        frames["filtered_y"][i] = _or_nan(filtered_y)
+        frames["filtered_velocity"][i] = _or_nan(filtered_velocity)
+        frames["phase"][i] = _or_nan(phase)
+        frames["source"][i] = source
+        self._num_frames += 1
+        if self._num_frames == self._frame_batch:
+            self._handoff_frames()
+
+    def _handoff_if_due(self):
+        if (
+            self._num_frames > 0
+            and time.monotonic() - self._last_handoff >= self.commit_interval_secs
+        ):
+            self._handoff_frames()
+
+    def _handoff_frames(self):
+        """Pass the filled frame rows to the writer, and start new columns."""
+        filled = {
+            name: column[: self._num_frames] for name, column in self._frames.items()
+        }
+        self._put(("frames", filled))
+        self._frames = self._new_frame_columns()
+        self._num_frames = 0
+        self._last_handoff = time.monotonic()
+
+    def _put(self, batch: tuple[str, object]):
+        try:
+            self._queue.put_nowait(batch)
+        except queue.Full:
+            self.dropped_batches += 1
+
+    def close(self):
+        """Hand off what is still buffered, and wait for the writer to commit it."""
+        if self._num_frames > 0:
+            self._handoff_frames()
+        # Waits for space, as nothing is left to keep responsive, unless the writer is
+        # gone and the queue will never empty
+        while self._writer.is_alive():
+            try:
+                self._queue.put(None, timeout=CLOSE_POLL_SECS)
+                break
+            except queue.Full:
+                pass
+        self._writer.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_tb):
+        self.close()
+
+    def _write_forever(self):
+        stopping = False
+        while not stopping:
+            batch = self._queue.get()
+            # Commit everything already waiting together
+            batches = [batch]
+            while True:
+                try:
+                    batches.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            stopping = None in batches
+            batches = [b for b in batches if b is not None]
+            try:
+                self._commit(batches)
+            except Exception as e:
+                # Reported once, as it likely fails the same way for every batch after
+                if self.write_error is None:
+                    print(f"Session store failed to write to {self.path}: {e}")
+                self.write_error = e
+                self.failed_batches += len(batches)
+
+    def _commit(self, batches: list[tuple[str, object]]):
+        games = [row for kind, rows in batches if kind == "games" for row in rows]
+        frame_batches = [columns for kind, columns in batches if kind == "frames"]
+        if not games and not frame_batches:
+            return
+        self.path.mkdir(parents=True, exist_ok=True)
+
+        if games:
+            with open(self.path / GAMES_FILE, "a") as f:
+                f.write("".join(json.dumps(row) + "\n" for row in games))
+                f.flush()
+                os.fsync(f.fileno())
+            self.games_written += len(games)
+
+        if frame_batches:
+            columns = {
+                name: np.concatenate([b[name] for b in frame_batches])
+                for name in FRAME_COLUMNS
+            }
+            # Written under a temporary name, so readers never see a partial chunk
+            chunk = self.path / f"frames-{self._chunks_written:06d}.npz"
+            partial = chunk.with_suffix(".partial")
+            with open(partial, "wb") as f:
+                np.savez(f, **columns)
+            os.replace(partial, chunk)
+            self._chunks_written += 1
+            self.frames_written += len(columns["ts"])
+
+
+def list_sessions(root: str | Path, day: date | str) -> list[Path]:
+    """The session directories recorded on day, in the order they started."""
+    day_dir = Path(root) / (day.isoformat() if isinstance(day, date) else day)
+    if not day_dir.is_dir():
+        return []
+    return sorted(p for p in day_dir.iterdir() if p.is_dir())
+
+
+def load_games(root: str | Path, day: date | str) -> dict[str, np.ndarray]:
+    """
+    All games played on day, as a column per GAME_COLUMNS field,
+    plus "session", the name of the session each game was played in.
+    """
+    rows, sessions = [], []
+    for session in list_sessions(root, day):
+        games_path = session / GAMES_FILE
+        if not games_path.is_file():
+            continue
+        with open(games_path) as f:
+            session_rows = [json.loads(line) for line in f if line.endswith("\n")]
+        rows += session_rows
+        sessions += [session.name] * len(session_rows)
+
+    games = {
+        name: np.array(
+            [_or_nan(row[name]) if dtype is np.float64 else row[name] for row in rows],
+            dtype=dtype,
+        )
+        for name, dtype in GAME_COLUMNS.items()
+    }
+    games["session"] = np.array(sessions, dtype=np.str_)
+    return games
+
+
+def load_frames(root: str | Path, day: date | str) -> dict[str, np.ndarray]:
+    """
+    All frame diagnostics recorded on day, as a column per FRAME_COLUMNS field,
+    plus "session", the name of the session each frame was recorded in.
+    """
+    chunks, sessions = [], []
+    for session in list_sessions(root, day):
+        for chunk_path in sorted(session.glob(FRAME_CHUNK_GLOB)):
+            with np.load(chunk_path) as chunk:
+                chunks.append({name: chunk[name] for name in FRAME_COLUMNS})
+            sessions.append(session.name)
+
+    frames = {
+        name: (
+            np.concatenate([chunk[name] for chunk in chunks])
+            if chunks
+            else np.empty(0, dtype)
+        )
+        for name, dtype in FRAME_COLUMNS.items()
+    }
+    frames["session"] = np.repeat(
+        np.array(sessions, dtype=np.str_), [len(chunk["ts"]) for chunk in chunks]
+    )
+    return frames
+
+
+def shoot_errors(games: dict[str, np.ndarray]) -> np.ndarray:
+    """
+    How late (secs) each game's shoot was sent relative to its predicted time,
+    NaN where there was no prediction.
+    """
+    return games["ts_shoot"] - games["predicted_ts_shoot"]
@@ -0,0 +1,219 @@
+import pickle
+import struct
+from dataclasses import dataclass, field
+from multiprocessing import shared_memory
+
+import numpy as np
+
+# How much of the filtered hand height history to include in snapshots
+SNAPSHOT_HISTORY_SECS = 3
+# Capacity of each buffer slot, fixed when the shared memory is created
+DEFAULT_MAX_FRAME_BYTES = 1920 * 1080 * 3
+DEFAULT_MAX_SNAPSHOT_BYTES = 1 << 16
+
+# Global header: index of the latest published slot (-1 if none yet), quit requested flag.
+# Written separately, the former only by the writer and the latter only by readers.
+_HEADER = struct.Struct("<iI")
+_LATEST = struct.Struct("<i")
+_QUIT = struct.Struct("<I")
+# Per slot header: sequence number (odd while being written), frame h, w, channels, snapshot length
+_SLOT_HEADER = struct.Struct("<QIIII")
+
+
+@dataclass
+class StateSnapshot:
+    """
+    A compact, picklable copy of everything needed to visualize the recognizer and game,
+    so rendering can happen without access to the live objects (e.g. in another process).
+    """
+
+    ts: float | None
+    """Timestamp of the latest sample analyzed."""
+    landmarks: np.ndarray | None
+    """21x3 array of the recognized hand's landmark screen coordinates, if any."""
+    hand_recognized: bool
+    roi_screen: tuple[float, float, float, float] | None
+    """The hand region as (xmin, ymin, xsize, ysize) in screen coords, if tracked."""
+    filtered: np.ndarray = field(default_factory=lambda: np.empty((0, 3)))
+    """Nx3 array of (ts, y, velocity) filtered hand height samples in the recent window."""
+    latest_filtered_y: float | None = None
+    """Filtered hand height of the most recent sample, None if it had no measurement."""
+    turning_points: list[float] = field(default_factory=list)
+    """Timestamps of the turning points found in the latest motion prediction."""
+    est_phase: float | None = None
+    move_eta: float | None = None
+    gesture: object = None
+    """The latest recognized HandGesture, if any."""
+    gesture_score: float | None = None
+    game_state: object = None
+    """The GameController state (GameStage or one of the state dataclasses)."""
+
+    @staticmethod
+    def capture(recognizer, game_state=None) -> "StateSnapshot":
+        """Take a snapshot of a HandRecognizer and, optionally, a GameController state."""
+        predictor = recognizer.motion_predictor
+
+        landmarks = recognizer.get_hand_landmarks()
+        if landmarks is not None:
+            landmarks = np.array(
+                [(lm.x, lm.y, lm.z) for lm in landmarks], dtype=np.float32
+            )
+
+        filtered = predictor.filtered_from_last_n_secs(SNAPSHOT_HISTORY_SECS)
+        filtered = np.array(
+            [(ts, p[0][0], p[1][0]) for ts, p in filtered], dtype=np.float64
+        ).reshape(-1, 3)
+
+        latest = predictor.filtered_history[-1] if predictor.filtered_history else None
+
+        roi = recognizer.tracker.get_hand_bbox_screen()
+
+        return StateSnapshot(
+            ts=predictor.ts_history[-1] if predictor.ts_history else None,
+            landmarks=landmarks,
+            hand_recognized=bool(recognizer.is_hand_recognized()),
+            roi_screen=tuple(roi) if roi else None,
+            filtered=filtered,
+            latest_filtered_y=float(latest[0][0]) if latest is not None else None,
+            turning_points=[p.ts for p in predictor.turning_points],
+            est_phase=predictor.est_phase,
+            move_eta=predictor.move_eta,
+            gesture=recognizer.get_gesture(),
+            gesture_score=recognizer.get_gesture_score(),
+            game_state=game_state,
+        )
+
+
+class _SharedStateBuffer:
+    """
+    Double buffer in shared memory holding the latest frame and state snapshot.
+
+    Each slot is guarded by a sequence number (seqlock): the writer makes it odd while writing,
+    and readers discard copies during which it changed. The writer never waits on readers.
+    """
+
+    def __init__(self, shm: shared_memory.SharedMemory, max_frame_bytes: int):
+        self._shm = shm
+        self._max_frame_bytes = max_frame_bytes
+        self._slot_size = (len(shm.buf) - _HEADER.size) // 2
+
+    @property
+    def name(self) -> str:
+        return self._shm.name
+
+    def _slot_offset(self, slot: int) -> int:
+        return _HEADER.size + slot * self._slot_size
+
+    def _read_header(self) -> tuple[int, int]:
+        return _HEADER.unpack_from(self._shm.buf, 0)
+
+    def _read_slot_header(self, slot: int) -> tuple[int, int, int, int, int]:
+        return _SLOT_HEADER.unpack_from(self._shm.buf, self._slot_offset(slot))
+
+    def quit_requested(self) -> bool:
+        return self._read_header()[1] != 0
+
+    def request_quit(self):
+        _QUIT.pack_into(self._shm.buf, _LATEST.size, 1)
+
+
+class SharedStateWriter(_SharedStateBuffer):
+    """Publishing side of the shared state buffer. Creates and owns the shared memory."""
+
+    def __init__(
+        self,
+        max_frame_bytes: int = DEFAULT_MAX_FRAME_BYTES,
+        max_snapshot_bytes: int = DEFAULT_MAX_SNAPSHOT_BYTES,
+    ):
+        slot_size = _SLOT_HEADER.size + max_frame_bytes + max_snapshot_bytes
+        shm = shared_memory.SharedMemory(create=True, size=_HEADER.size + 2 * slot_size)
+        super().__init__(shm, max_frame_bytes)
+        _HEADER.pack_into(shm.buf, 0, -1, 0)
+        for slot in (0, 1):
+            _SLOT_HEADER.pack_into(shm.buf, self._slot_offset(slot), 0, 0, 0, 0, 0)
+
+        self._seq = 0
+        self.dropped = 0
+        """Number of publishes skipped because the frame or snapshot didn't fit."""
+
+    def publish(self, frame: np.ndarray, snapshot: StateSnapshot):
+        """Write the frame and snapshot into the inactive slot, then make it the latest."""
+        snapshot_bytes = pickle.dumps(snapshot, protocol=pickle.HIGHEST_PROTOCOL)
+        frame = np.ascontiguousarray(frame, dtype=np.uint8)
+        frame_offset = _SLOT_HEADER.size
+        snapshot_offset = frame_offset + self._max_frame_bytes
+        if (
+            frame.nbytes > self._max_frame_bytes
+            or snapshot_offset + len(snapshot_bytes) > self._slot_size
+        ):
+            self.dropped += 1
+            return
+
+        latest, _ = self._read_header()
+        slot = 0 if latest != 0 else 1
+        offset = self._slot_offset(slot)
+        buf = self._shm.buf
+        h, w = frame.shape[:2]
+        c = frame.shape[2] if frame.ndim == 3 else 1
+
+        # Mark slot as being written
+        self._seq += 1
+        _SLOT_HEADER.pack_into(buf, offset, 2 * self._seq - 1, h, w, c, 0)
+
+        buf[offset + frame_offset : offset + frame_offset + frame.nbytes] = (
+            frame.reshape(-1).data
+        )
+        start = offset + snapshot_offset
+        buf[start : start + len(snapshot_bytes)] = snapshot_bytes
+
+        # Mark slot as complete and make it the latest
+        _SLOT_HEADER.pack_into(buf, offset, 2 * self._seq, h, w, c, len(snapshot_bytes))
+        _LATEST.pack_into(buf, 0, slot)
+
+    def close(self):
+        self._shm.close()
+        self._shm.unlink()
+
+
+class SharedStateReader(_SharedStateBuffer):
+    """Viewing side of the shared state buffer. Attaches to a writer's shared memory by name."""
+
+    def __init__(self, name: str, max_frame_bytes: int = DEFAULT_MAX_FRAME_BYTES):
+        super().__init__(shared_memory.SharedMemory(name=name), max_frame_bytes)
+        self._last_seq = 0
+
+    def read_latest(self) -> tuple[np.ndarray, StateSnapshot] | None:
+        """
+        Copy out the latest frame and snapshot.
+        Returns None if nothing new has been published since the last read,
+        or if the writer overwrote the slot while it was being copied.
+        """
+        latest, _ = self._read_header()
+        if latest < 0:
+            return None
+
+        seq, h, w, c, snapshot_len = self._read_slot_header(latest)
+        if seq == self._last_seq or seq % 2 == 1:
+            return None
+
+        offset = self._slot_offset(latest)
+        frame_start = offset + _SLOT_HEADER.size
+        frame = (
+            np.frombuffer(self._shm.buf, np.uint8, h * w * c, frame_start)
+            .reshape((h, w, c) if c > 1 else (h, w))
+            .copy()
+        )
+        snapshot_start = frame_start + self._max_frame_bytes
+        snapshot_bytes = bytes(
+            self._shm.buf[snapshot_start : snapshot_start + snapshot_len]
+        )
+
+        # Discard if the writer started overwriting this slot while copying
+        if self._read_slot_header(latest)[0] != seq:
+            return None
+        self._last_seq = seq
+
+        return frame, pickle.loads(snapshot_bytes)
+
+    def close(self):
+        self._shm.close()
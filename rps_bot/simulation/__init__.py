@@ -0,0 +1,3 @@
+# Reexports
+from .players import PlayerProfile, SyntheticTrace, generate_trace, sample_profile
+from .game_loop import SimulatedRecognizer, TraceResult, VirtualClock, simulate_trace
@@ -0,0 +1,172 @@
+from dataclasses import dataclass
+import time
+from typing import Type
+
+import numpy as np
+
+from rps_bot.game_flow.controller import GameController
+from rps_bot.game_flow.scheduler import Scheduler
+from rps_bot.recognizer.events import (
+    EventDispatcher,
+    GameCancelled,
+    GameOffered,
+    GesturePlayed,
+    MotionEventDetector,
+    Swinging,
+)
+from rps_bot.recognizer.gestures import HandGesture
+from rps_bot.recognizer.motion_analysis import MotionAnalyzer, MotionAnalyzerConfig
+from .players import SyntheticTrace
+
+# Time from a frame's capture to its recognition result, in the simulated pipeline
+DEFAULT_RECOGNITION_LATENCY_SECS = 0.04
+# Confidence of the player's simulated gesture
+SIMULATED_GESTURE_SCORE = 0.9
+
+
+class VirtualClock:
+    """A clock that only moves when set, for running the game loop faster than real time."""
+
+    def __init__(self, now: float = 0.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class SimulatedRecognizer:
+    """
+    Stands in for HandRecognizer, taking measured hand heights instead of frames.
+    Runs the same motion analysis and raises the same events, so a GameController can be
+    driven by synthetic players.
+    """
+
+    def __init__(self, motion_config: MotionAnalyzerConfig | None = None):
+        self.motion_predictor = MotionAnalyzer(motion_config)
+        self.idle_allowed = False
+        self._events = EventDispatcher(
+            [GameOffered, Swinging, GesturePlayed, GameCancelled], owner=self
+        )
+        self._motion_events = MotionEventDetector(self._events.emit)
+
+    def next_sample(
+        self,
+        ts: float,
+        hand_y: float | None,
+        gesture: HandGesture = HandGesture.NONE,
+        score: float | None = None,
+    ):
+        """Process the hand height (and gesture) recognized in the frame captured at ts."""
+        if self.motion_predictor.add_sample(ts, hand_y):
+            self._motion_events.update(self.motion_predictor, ts)
+        self._events.emit(GesturePlayed(ts, gesture, score))
+
+    def add_event_listener(self, event_type: Type, callback):
+        self._events.add_listener(event_type, callback)
+
+    def remove_event_listener(self, event_type: Type, callback):
+        self._events.remove_listener(event_type, callback)
+
+
+@dataclass
+class TraceResult:
+    kind: str
+    true_shoot_ts: float | None
+    # When the bot started its shoot movement and shot, None if it didn't
+    start_shoot_ts: float | None
+    shoot_ts: float | None
+    # Number of games offered and cancelled, as detected from the motion
+    games_offered: int
+    games_cancelled: int
+    samples: int
+    # Processing time (secs) spent in analysis and control
+    compute_secs: float
+
+    @property
+    def shoot_error_secs(self) -> float | None:
+        """How late the bot shot, negative if early. None unless both shot."""
+        if self.shoot_ts is None or self.true_shoot_ts is None:
+            return None
+        return self.shoot_ts - self.true_shoot_ts
+
+
+def simulate_trace(
+    trace: SyntheticTrace,
+    latency_secs: float = DEFAULT_RECOGNITION_LATENCY_SECS,
+    seed: int = 0,
+    motion_config: MotionAnalyzerConfig | None = None,
+) -> TraceResult:
+    """
+    Run a synthetic trace through motion analysis and the game controller, on a virtual clock.
+    Each frame's result is processed latency_secs after its capture, and scheduled
+    commands run exactly at their deadlines, as they would on a DeadlineTimer.
+    Recorded traces work too, given the same ts, hand_y, true_shoot_ts and kind.
+    """
+    clock = VirtualClock(float(trace.ts[0]))
+    scheduler = Scheduler(clock)
+    recognizer = SimulatedRecognizer(motion_config)
+    controller = GameController(recognizer, clock=clock, scheduler=scheduler)
+
+    games_offered = games_cancelled = 0
+
+    def on_offered(event):
+        nonlocal games_offered
+        games_offered += 1
+
+    def on_cancelled(event):
+        nonlocal games_cancelled
+        games_cancelled += 1
+
+    recognizer.add_event_listener(GameOffered, on_offered)
+    recognizer.add_event_listener(GameCancelled, on_cancelled)
+
+    # The gesture the player shows once they've shot
+    rng = np.random.default_rng(seed)
+    player_move = rng.choice(
+        [HandGesture.ROCK, HandGesture.PAPER, HandGesture.SCISSORS]
+    )
+
+    compute_secs = 0.0
+    for ts, hand_y in zip(trace.ts, trace.hand_y):
+        result_ts = float(ts) + latency_secs
+
+        # Run the commands due before this result arrives, at their deadlines
+        while (deadline := scheduler.next_deadline()) is not None and (
+            deadline <= result_ts
+        ):
+            clock.now = max(clock.now, deadline)
+            start = time.perf_counter()
+            scheduler.poll()
+            compute_secs += time.perf_counter() - start
+
+        clock.now = max(clock.now, result_ts)
+        shown = (
+            trace.true_shoot_ts is not None
+            and ts >= trace.true_shoot_ts
+            and not np.isnan(hand_y)
+        )
+
+        start = time.perf_counter()
+        recognizer.next_sample(
+            float(ts),
+            None if np.isnan(hand_y) else float(hand_y),
+            player_move if shown else HandGesture.NONE,
+            SIMULATED_GESTURE_SCORE if shown else None,
+        )
+        controller.update()
+        compute_secs += time.perf_counter() - start
+
+    # When each command was first sent
+    sent = {}
+    for timing in controller.send_timings:
+        sent.setdefault(timing.command, timing.actual_ts)
+    return TraceResult(
+        trace.kind,
+        trace.true_shoot_ts,
+        sent.get("start_shoot"),
+        sent.get("shoot"),
+        games_offered,
+        games_cancelled,
+        len(trace.ts),
+        compute_secs,
+    )
@@ -0,0 +1,132 @@
+from dataclasses import dataclass
+
+import numpy as np
+
+from rps_bot.recognizer.events import SHOOT_PHASE
+
+# Frame rate of synthetic traces
+DEFAULT_FPS = 30
+
+
+@dataclass
+class PlayerProfile:
+    """How a synthetic player moves their hand, in screen heights and seconds."""
+
+    # Time taken for each bob (down and back up), and its relative random variation
+    period_secs: float = 0.6
+    period_jitter: float = 0.05
+    # How far the hand moves up from rest on each bob
+    amplitude: float = 0.5
+    # Hand height at rest, which is the bottom of each bob
+    rest_y: float = 0.75
+    # Std dev of the noise on each measured height
+    noise: float = 0.005
+    # Slow wandering of the hand (fidgeting), as the std dev of a random walk after 1 s
+    drift: float = 0.0
+    # Fraction of frames in which the hand isn't found
+    dropout_rate: float = 0.02
+    # Number of bobs. The player shoots at the end of the last one if there are at least
+    # SHOOT_PHASE, more being extra bobs, otherwise they abort the game.
+    num_bobs: int = 4
+    # Time at rest before and after the motion
+    lead_in_secs: float = 1.0
+    tail_secs: float = 4.0
+    fps: float = DEFAULT_FPS
+    # Std dev of the time between frames, relative to the frame interval
+    frame_jitter: float = 0.1
+
+    @property
+    def kind(self) -> str:
+        """
+        "game" for a normal game, "extra_bobs" if the player bobs more than usual
+        before shooting, "abort" if they stop before shooting, or "idle" if they don't move.
+        """
+        if self.num_bobs == 0:
+            return "idle"
+        if self.num_bobs < SHOOT_PHASE:
+            return "abort"
+        if self.num_bobs > SHOOT_PHASE:
+            return "extra_bobs"
+        return "game"
+
+
+@dataclass
+class SyntheticTrace:
+    profile: PlayerProfile
+    # Frame timestamps, and the measured hand height in each (NaN if the hand wasn't found)
+    ts: np.ndarray
+    hand_y: np.ndarray
+    # Time the player shoots, None if they don't
+    true_shoot_ts: float | None
+    # Phase of the motion at each frame, counted as MotionAnalyzer does
+    # (0 at rest before and after it, whole numbers at the bottom, halves at the top)
+    true_phase: np.ndarray
+
+    @property
+    def kind(self) -> str:
+        return self.profile.kind
+
+
+def generate_trace(profile: PlayerProfile, rng: np.random.Generator) -> SyntheticTrace:
+    """Generate the hand heights a player with the given profile would be measured at."""
+    # Each bob's period varies a little
+    periods = profile.period_secs * (
+        1 + profile.period_jitter * rng.standard_normal(profile.num_bobs)
+    )
+    periods = np.maximum(periods, profile.period_secs * 0.25)
+    bob_ends = profile.lead_in_secs + np.cumsum(periods)
+    motion_end = bob_ends[-1] if profile.num_bobs else profile.lead_in_secs
+    duration = motion_end + profile.tail_secs
+
+    # Frame times, with jittered intervals
+    interval = 1 / profile.fps
+    num_frames = int(duration / interval) + 1
+    intervals = interval * (1 + profile.frame_jitter * rng.standard_normal(num_frames))
+    ts = np.cumsum(np.maximum(intervals, interval * 0.1))
+    ts = ts[ts <= duration]
+
+    # Phase of the motion at each frame: whole numbers at rest (bottom), halves at the top
+    phase = np.zeros(len(ts))
+    bob_starts = np.concatenate([[profile.lead_in_secs], bob_ends[:-1]])
+    for i, (start, end) in enumerate(zip(bob_starts, bob_ends)):
+        in_bob = (ts >= start) & (ts < end)
+        phase[in_bob] = i + (ts[in_bob] - start) / (end - start)
+    hand_y = profile.rest_y - profile.amplitude * (1 - np.cos(2 * np.pi * phase)) / 2
+
+    hand_y += profile.noise * rng.standard_normal(len(ts))
+    steps = np.sqrt(np.diff(ts, prepend=0)) * rng.standard_normal(len(ts))
+    hand_y += profile.drift * np.cumsum(steps)
+    hand_y[rng.random(len(ts)) < profile.dropout_rate] = np.nan
+
+    true_shoot_ts = bob_ends[-1] if profile.num_bobs >= SHOOT_PHASE else None
+    return SyntheticTrace(profile, ts, hand_y, true_shoot_ts, phase)
+
+
+def sample_profile(
+    rng: np.random.Generator,
+    abort_rate: float = 0.1,
+    extra_bobs_rate: float = 0.1,
+    idle_rate: float = 0.1,
+) -> PlayerProfile:
+    """Draw a random player from a population of tempos, amplitudes and behaviours."""
+    kind = rng.random()
+    if kind < idle_rate:
+        num_bobs = 0
+    elif kind < idle_rate + abort_rate:
+        num_bobs = int(rng.integers(1, SHOOT_PHASE))
+    elif kind < idle_rate + abort_rate + extra_bobs_rate:
+        num_bobs = SHOOT_PHASE + 1
+    else:
+        num_bobs = SHOOT_PHASE
+
+    return PlayerProfile(
+        period_secs=rng.uniform(0.4, 1.0),
+        period_jitter=rng.uniform(0, 0.1),
+        amplitude=rng.uniform(0.3, 0.6),
+        rest_y=rng.uniform(0.7, 0.9),
+        noise=rng.uniform(0, 0.02),
+        drift=rng.uniform(0, 0.1),
+        dropout_rate=rng.uniform(0, 0.1),
+        num_bobs=num_bobs,
+        lead_in_secs=rng.uniform(0.5, 2.0),
+    )
@@ -0,0 +1,425 @@
+"""
+Run several game stations (camera + robot hand) from one host.
+
+Each station's pipeline runs in its own worker process, pinned to its own CPUs.
+Workers report their health and metrics through shared memory, and the supervisor
+restarts any station whose worker dies or stops making progress.
+
+Usage: python -m rps_bot.supervisor STATIONS_JSON [--status-secs 5]
+
+The stations file is a JSON list of stations, e.g.
+[
+    {"name": "table1", "cam_index": 0, "port": "/dev/ttyACM0", "eport": "/dev/ttyACM1"},
+    {"name": "table2", "video": "session.mp4", "port": "sim://", "eport": "sim://",
+     "cpus": [2, 3], "calibrate": false}
+]
+"""
+
+from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor
+import json
+import multiprocessing
+import os
+import signal
+import time
+from argparse import ArgumentParser
+
+# Layout of each station's row in the shared health array
+HEALTH_FIELDS = ("pid", "started_ts", "heartbeat_ts", "frames", "fps", "games")
+# How long a worker may go without a heartbeat before it's considered stuck
+HEARTBEAT_TIMEOUT_SECS = 30
+# Wait between restarts of a failing station, doubling on each consecutive failure
+RESTART_BACKOFF_SECS = 2
+MAX_RESTART_BACKOFF_SECS = 60
+# Time a terminated station has to close its ports, which returns the hand to paper
+# and waits for it to get there, before it's killed
+TERMINATE_GRACE_SECS = 5
+# How often workers update their frame rate
+FPS_INTERVAL_SECS = 2
+
+
+@dataclass
+class StationConfig:
+    name: str
+    # Camera index, or a video to replay instead
+    cam_index: int | None = None
+    video: str | None = None
+    # Finger and elbow serial ports, by name or URL, or "sim://" for a simulated board
+    port: str = "sim://"
+    eport: str = "sim://"
+    # Wire protocol of the boards, "text" or "binary" (see hand_protocol)
+    codec: str = "text"
+    # Release each finger on its own, timed to arrive at the shoot, which needs the
+    # fingers' measured timing, a JSON file (see hand_serial.FingerTiming)
+    plan_finger_release: bool = False
+    finger_timing: str | None = None
+    # CPUs to pin the worker to. If None, the supervisor shares out the available CPUs.
+    cpus: list[int] | None = None
+    # Whether to calibrate the hand on start. There are no prompts, so it must be ready.
+    calibrate: bool = True
+    idle_gate: bool = True
+    # Record the station's games in a session store under this directory, if given,
+    # and its frame diagnostics if frame_diagnostics is set
+    session_dir: str | None = None
+    frame_diagnostics: bool = False
+    # Take profiling commands on this localhost port, if given, writing to profile_dir.
+    # SIGUSR1 and SIGUSR2 to the worker profile it and dump its stage timings regardless.
+    profiling_port: int | None = None
+    profile_dir: str = "profiles"
+
+
+def load_stations(path: str) -> list[StationConfig]:
+    with open(path) as f:
+        stations = [StationConfig(**station) for station in json.load(f)]
+    names = [station.name for station in stations]
+    if len(set(names)) != len(names):
+        raise ValueError(f"Station names must be unique, got {names}")
+    for station in stations:
+        if station.plan_finger_release and station.finger_timing is None:
+            raise ValueError(
+                f"Station {station.name} plans finger releases, "
+                "which needs the fingers' measured timing (finger_timing)"
+            )
+    return stations
+
+
+@dataclass
+class StationStatus:
+    name: str
+    alive: bool
+    pid: int | None
+    uptime_secs: float
+    # Time since the worker last reported progress
+    heartbeat_age_secs: float | None
+    frames: int
+    fps: float
+    games: int
+    restarts: int
+
+
+def _station_main(config: StationConfig, health, row: int, stop):
+    """Worker process entry point. Runs a station's pipeline until stopped."""
+    # Shutdown is requested by the supervisor, not by the terminal's Ctrl-C.
+    # A hung station is terminated, which should still close its ports on the way out.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+
+    offset = row * len(HEALTH_FIELDS)
+
+    def report(field_name: str, value: float):
+        health[offset + HEALTH_FIELDS.index(field_name)] = value
+
+    started = time.monotonic()
+    report("pid", os.getpid())
+    report("started_ts", started)
+    report("heartbeat_ts", started)
+    report("frames", 0)
+    report("fps", 0)
+    report("games", 0)
+
+    import cv2 as cv
+
+    if config.cpus and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, config.cpus)
+        # Keep OpenCV's thread pool within the station's CPUs
+        cv.setNumThreads(len(config.cpus))
+
+    from .capture import CameraCapture, ReplayCapture
+    from .game_flow.controller import GameEndState
+    from .hand_serial import FingerTiming, RPSSerial
+    from .main import DEFAULT_WARM_UP_FRAMES, run
+    from .profiling import ProfilingControl, StageTimings
+    from .recognizer.idle_gate import IdleGate
+    from .session_store import SessionStore
+
+    frames = games = 0
+    interval_start, interval_frames = started, 0
+    last_state = None
+
+    def on_frame(controller) -> bool:
+        nonlocal frames, games, interval_start, interval_frames, last_state
+        now = time.monotonic()
+        frames += 1
+        interval_frames += 1
+        if controller.state is not last_state:
+            last_state = controller.state
+            if isinstance(last_state, GameEndState):
+                games += 1
+                report("games", games)
+        if now - interval_start >= FPS_INTERVAL_SECS:
+            report("fps", interval_frames / (now - interval_start))
+            interval_start, interval_frames = now, 0
+        report("frames", frames)
+        report("heartbeat_ts", now)
+        return stop.is_set()
+
+    if config.video:
+        video_cap = ReplayCapture(config.video)
+    else:
+        video_cap = CameraCapture(config.cam_index, width=1920 // 2, height=1080 // 2)
+    finger_timing = (
+        FingerTiming.load(config.finger_timing) if config.finger_timing else None
+    )
+    serial = RPSSerial(
+        config.port, config.eport, codec=config.codec, finger_timing=finger_timing
+    )
+    session_store = profiling = None
+    try:
+        session_store = (
+            SessionStore(config.session_dir, config.frame_diagnostics)
+            if config.session_dir
+            else None
+        )
+        stage_timings = StageTimings()
+        # Binding the profiling port may fail, after the hand's ports are open
+        profiling = ProfilingControl(
+            stage_timings, config.profile_dir, config.profiling_port
+        )
+        profiling.install_signal_handlers()
+        # Calibrate in the background while the model warms up
+        calibration = None
+        if config.calibrate:
+            executor = ThreadPoolExecutor(1, thread_name_prefix="recalibrate")
+            calibration = executor.submit(serial.recalibrate)
+            executor.shutdown(wait=False)
+        run(
+            video_cap,
+            serial,
+            "none",
+            "none",
+            float("inf"),
+            IdleGate() if config.idle_gate else None,
+            on_frame=on_frame,
+            warm_up_frames=DEFAULT_WARM_UP_FRAMES,
+            ready=calibration.result if calibration is not None else None,
+            session_store=session_store,
+            plan_finger_release=config.plan_finger_release,
+            stage_timings=stage_timings,
+        )
+    finally:
+        if profiling is not None:
+            profiling.close()
+        serial.close()
+        video_cap.release()
+        if session_store is not None:
+            session_store.close()
+
+
+class Supervisor:
+    """
+    Runs each station in its own worker process, and restarts stations that fail.
+    A station whose replayed video finishes is done, and isn't restarted.
+    """
+
+    def __init__(
+        self,
+        stations: list[StationConfig],
+        heartbeat_timeout_secs: float = HEARTBEAT_TIMEOUT_SECS,
+    ):
+        self.stations = stations
+        self._heartbeat_timeout_secs = heartbeat_timeout_secs
+        self._assign_cpus()
+
+        # Spawn, since MediaPipe can't be used safely from a forked process
+        self._ctx = multiprocessing.get_context("spawn")
+        # Health of each station, one row each, written by the workers
+        self._health = self._ctx.Array(
+            "d", len(stations) * len(HEALTH_FIELDS), lock=False
+        )
+        self._stop = self._ctx.Event()
+        self._processes: list[multiprocessing.Process | None] = [None] * len(stations)
+        self._restarts = [0] * len(stations)
+        self._failures = [0] * len(stations)
+        # Time before which a failed station isn't restarted, for backing off
+        self._restart_after = [0.0] * len(stations)
+        self._done = [False] * len(stations)
+
+    def _assign_cpus(self):
+        """Share out the available CPUs between stations without any set."""
+        if not hasattr(os, "sched_getaffinity"):
+            return
+        unassigned = [station for station in self.stations if station.cpus is None]
+        taken = {cpu for station in self.stations for cpu in station.cpus or []}
+        available = sorted(os.sched_getaffinity(0) - taken)
+        if not unassigned or not available:
+            return
+        per_station = max(1, len(available) // len(unassigned))
+        for i, station in enumerate(unassigned):
+            start = (i * per_station) % len(available)
+            station.cpus = available[start : start + per_station]
+
+    def start(self):
+        for i in range(len(self.stations)):
+            self._start_station(i)
+
+    def _start_station(self, i: int):
+        process = self._ctx.Process(
+            target=_station_main,
+            args=(self.stations[i], self._health, i, self._stop),
+            name=f"rps-station-{self.stations[i].name}",
+        )
+        # Count the start as a heartbeat, so a slow start isn't mistaken for being stuck
+        self._set_health(i, "heartbeat_ts", time.monotonic())
+        process.start()
+        self._processes[i] = process
+
+    def restart(self, name: str):
+        """Restart a station's worker now."""
+        i = self._index(name)
+        self._kill(i)
+        self._done[i] = False
+        self._restarts[i] += 1
+        self._start_station(i)
+
+    def poll(self):
+        """Restart the stations that have died or stopped making progress."""
+        now = time.monotonic()
+        for i, process in enumerate(self._processes):
+            if self._done[i] or self._stop.is_set():
+                continue
+
+            if process.is_alive():
+                heartbeat_age = now - self._get_health(i, "heartbeat_ts")
+                if heartbeat_age < self._heartbeat_timeout_secs:
+                    # Running properly again, so stop backing off
+                    if self._get_health(i, "frames") > 0:
+                        self._failures[i] = 0
+                    continue
+                print(
+                    f"Station {self.stations[i].name} made no progress for "
+                    f"{heartbeat_age:.0f} s, restarting"
+                )
+                self._kill(i)
+            elif process.exitcode == 0:
+                # Finished replaying
+                self._done[i] = True
+                continue
+            elif self._restart_after[i] == 0:
+                print(
+                    f"Station {self.stations[i].name} exited with code "
+                    f"{process.exitcode}, restarting"
+                )
+
+            # Back off from stations that keep failing
+            if self._restart_after[i] == 0:
+                backoff = min(
+                    RESTART_BACKOFF_SECS * 2 ** self._failures[i],
+                    MAX_RESTART_BACKOFF_SECS,
+                )
+                self._failures[i] += 1
+                self._restart_after[i] = now + backoff
+            if now >= self._restart_after[i]:
+                self._restart_after[i] = 0
+                self._restarts[i] += 1
+                self._start_station(i)
+
+    def all_done(self) -> bool:
+        return all(self._done)
+
+    def status(self) -> list[StationStatus]:
+        now = time.monotonic()
+        statuses = []
+        for i, (station, process) in enumerate(zip(self.stations, self._processes)):
+            alive = process is not None and process.is_alive()
+            started = self._get_health(i, "started_ts")
+            heartbeat = self._get_health(i, "heartbeat_ts")
+            statuses.append(
+                StationStatus(
+                    station.name,
+                    alive,
+                    int(self._get_health(i, "pid")) or None,
+                    now - started if started else 0.0,
+                    now - heartbeat if alive and heartbeat else None,
+                    int(self._get_health(i, "frames")),
+                    self._get_health(i, "fps"),
+                    int(self._get_health(i, "games")),
+                    self._restarts[i],
+                )
+            )
+        return statuses
+
+    def stop(self, timeout_secs: float = 10):
+        """Ask all workers to finish (closing their serial ports), then stop them."""
+        self._stop.set()
+        deadline = time.monotonic() + timeout_secs
+        for process in self._processes:
+            if process is not None:
+                process.join(max(0, deadline - time.monotonic()))
+        for i in range(len(self._processes)):
+            self._kill(i)
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_tb):
+        self.stop()
+
+    def _kill(self, i: int):
+        process = self._processes[i]
+        if process is not None and process.is_alive():
+            process.terminate()
+            process.join(TERMINATE_GRACE_SECS)
+            if process.is_alive():
+                process.kill()
+                process.join()
+
+    def _index(self, name: str) -> int:
+        for i, station in enumerate(self.stations):
+            if station.name == name:
+                return i
+        raise ValueError(f"No station named {name}")
+
+    def _get_health(self, i: int, field_name: str) -> float:
+        return self._health[i * len(HEALTH_FIELDS) + HEALTH_FIELDS.index(field_name)]
+
+    def _set_health(self, i: int, field_name: str, value: float):
+        self._health[i * len(HEALTH_FIELDS) + HEALTH_FIELDS.index(field_name)] = value
+
+
+def print_status(statuses: list[StationStatus]):
+    print(
+        f"{'station':<16} {'alive':>5} {'pid':>7} {'uptime':>8} {'heartbeat':>9} "
+        f"{'frames':>8} {'fps':>6} {'games':>6} {'restarts':>8}"
+    )
+    for s in statuses:
+        heartbeat = (
+            f"{s.heartbeat_age_secs:.1f}s" if s.heartbeat_age_secs is not None else "-"
+        )
+        print(
+            f"{s.name:<16} {'yes' if s.alive else 'no':>5} {s.pid or '-':>7} "
+            f"{s.uptime_secs:>7.0f}s {heartbeat:>9} {s.frames:>8} {s.fps:>6.1f} "
+            f"{s.games:>6} {s.restarts:>8}"
+        )
+
+
+def main():
+    argparser = ArgumentParser(prog="RPS station supervisor")
+    argparser.add_argument("stations", help="JSON file listing the stations")
+    argparser.add_argument(
+        "--status-secs",
+        type=float,
+        default=5,
+        help="How often to print the stations' status",
+    )
+    args = argparser.parse_args()
+
+    supervisor = Supervisor(load_stations(args.stations))
+    # Stop the workers gracefully on termination too, so they close their serial ports
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    last_status = time.monotonic()
+    with supervisor:
+        try:
+            while not supervisor.all_done():
+                time.sleep(0.5)
+                supervisor.poll()
+                if time.monotonic() - last_status >= args.status_secs:
+                    last_status = time.monotonic()
+                    print_status(supervisor.status())
+        except KeyboardInterrupt:
+            print("Shutting down")
+    print_status(supervisor.status())
+
+
+if __name__ == "__main__":
+    main()
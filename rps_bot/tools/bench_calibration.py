@@ -0,0 +1,120 @@
+"""
+Time the finger calibration (RPSSerial.recalibrate) against simulated boards, waiting for
+the fingers to settle as the board reports them ("telemetry"), and waiting out the fixed
+timeouts, as with a board that doesn't answer state queries ("fixed").
+
+The simulated fingers stall at hard stops, fully closed and fully open, and start each trial
+at a random position between them, moving at different speeds, and starting to move
+--start-delay-secs after each command, as real motors take to spin up. Calibration should leave
+every finger's zero the same distance from its closed stop, wherever it started: rock
+(FINGER_RETRACTION_MAX) fully closed. For each mode it reports how long calibration took,
+and how far the zeros ended up from that, in encoder ticks.
+
+Usage: python -m rps_bot.tools.bench_calibration [--trials 3]
+    [--finger-speeds 4500 4000 3500 3000] [--travel-ticks 1650] [--start-delay-secs 0.3]
+"""
+
+import threading
+from argparse import ArgumentParser
+from contextlib import redirect_stdout
+from io import StringIO
+
+import numpy as np
+
+from rps_bot.hand_serial import FINGER_RETRACTION_MAX, Finger, RPSSerial
+from rps_bot.hand_sim import SIM_PORT, SimulatedMotorBoard
+
+
+def calibrate(
+    use_telemetry: bool,
+    speeds: dict[int, float],
+    travel_ticks: float,
+    start_delay_secs: float,
+    rng,
+) -> tuple[float, float]:
+    """
+    Calibrate fingers starting at random positions. Returns how long it took,
+    and the largest distance of a finger's zero from where it should be.
+    """
+    # Position at power on is 0, somewhere between the stops
+    limits = {}
+    for motor in speeds:
+        start = rng.uniform(0, travel_ticks)
+        limits[motor] = (-start, travel_ticks - start)
+    board = SimulatedMotorBoard(
+        speed_ticks_per_sec=speeds,
+        travel_limits=limits,
+        start_delay_secs=start_delay_secs,
+    )
+    threads = set(threading.enumerate())
+    serial = RPSSerial(board, SIM_PORT)
+    # Closing returns the hand to paper, and the serial reader thread prints as it stops
+    with redirect_stdout(StringIO()):
+        report = serial.recalibrate(use_telemetry)
+        serial.close()
+        for thread in set(threading.enumerate()) - threads:
+            thread.join()
+
+    # Where each closed stop is from the calibrated zero
+    error = max(
+        abs(motor.limits[1] - FINGER_RETRACTION_MAX) for motor in board.motors.values()
+    )
+    return report.secs, error
+
+
+def main():
+    argparser = ArgumentParser(prog="Calibration benchmark")
+    argparser.add_argument("--trials", type=int, default=3)
+    argparser.add_argument(
+        "--finger-speeds",
+        type=float,
+        nargs=4,
+        default=[4500, 4000, 3500, 3000],
+        metavar=("INDEX", "MIDDLE", "RING", "PINKY"),
+        help="Speed limit of each finger, ticks per second",
+    )
+    argparser.add_argument(
+        "--travel-ticks",
+        type=float,
+        default=1650,
+        help="Travel of the fingers between their stops",
+    )
+    argparser.add_argument(
+        "--start-delay-secs",
+        type=float,
+        default=0.3,
+        help="Time from a command to the fingers starting to move",
+    )
+    argparser.add_argument("--seed", type=int, default=0)
+    args = argparser.parse_args()
+
+    speeds = {
+        finger.value: speed
+        for finger, speed in zip(
+            [Finger.INDEX, Finger.MIDDLE, Finger.RING, Finger.PINKY], args.finger_speeds
+        )
+    }
+    print(f"{'mode':<10} {'secs mean/max':>14} {'zero error ticks max':>21}")
+    for name, use_telemetry in (("telemetry", True), ("fixed", False)):
+        # The same starting positions for both modes
+        rng = np.random.default_rng(args.seed)
+        results = np.array(
+            [
+                calibrate(
+                    use_telemetry,
+                    speeds,
+                    args.travel_ticks,
+                    args.start_delay_secs,
+                    rng,
+                )
+                for _ in range(args.trials)
+            ]
+        )
+        print(
+            f"{name:<10} {results[:, 0].mean():>6.2f}/{results[:, 0].max():<7.2f} "
+            f"{results[:, 1].max():>21.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
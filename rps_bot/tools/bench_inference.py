@@ -0,0 +1,254 @@
+"""
+Compare inference profiles on a recorded clip, on the CPU, to choose the fastest
+acceptable setup for a machine.
+
+Each profile recognizes every frame of the clip, as fast as it accepts them, after a few
+frames to warm up. Reports the frame rate, the latency percentiles from submitting a
+frame to its result, and the rate of frames whose gesture (or lack of a hand) agrees with
+the reference profile's. Profiles recognizing in-process are timed call by call, and those
+with workers through a RecognizerPool.
+
+Profiles are given as JSON files, and/or as a matrix of models, gesture classifiers,
+worker counts, CPUs per worker and hand counts around the default profile. The reference is
+the first profile, so e.g. the landmark classifier's agreement with the gesture model is
+that of --gesture-classifiers mediapipe landmarks.
+
+Usage: python -m rps_bot.tools.bench_inference VIDEO [--profiles PROFILE_JSON ...]
+    [--models MODEL ...] [--gesture-classifiers mediapipe landmarks] [--workers 0 2]
+    [--cpus-per-worker N ...] [--num-hands 1 2] [--frames 300]
+"""
+
+import itertools
+import time
+from argparse import ArgumentParser
+from dataclasses import replace
+from pathlib import Path
+
+import numpy as np
+
+from rps_bot.recognizer.inference_profile import (
+    GESTURE_CLASSIFIERS,
+    InferenceProfile,
+    create_mp_recognizer,
+)
+from rps_bot.recognizer.pool import RecognizerPool
+from .bench_pool import FRAME_INTERVAL_MS, load_frames
+
+# Frames recognized before timing starts, as MediaPipe's first calls are slow
+WARM_UP_FRAMES = 10
+# Recorded as the gesture of frames with no hand recognized, or that failed
+NO_HAND = "-"
+
+
+def _gesture(result) -> str:
+    """The first hand's gesture in a MediaPipe result."""
+    if result is None or not result.hand_landmarks:
+        return NO_HAND
+    return result.gestures[0][0].category_name
+
+
+def bench_in_process(profile: InferenceProfile, frames: list[np.ndarray]) -> dict:
+    """Recognize the frames one by one in this process, in video mode."""
+    import mediapipe as mp
+    from mediapipe.tasks.python.vision import RunningMode
+
+    with create_mp_recognizer(
+        profile.model_path,
+        profile.delegate,
+        profile.recognizer_options,
+        RunningMode.VIDEO,
+        landmark_classifier_path=profile.landmark_classifier,
+    ) as recognizer:
+        for i in range(WARM_UP_FRAMES):
+            image = mp.Image(image_format=mp.ImageFormat.SRGB, data=frames[0])
+            recognizer.recognize_for_video(image, i * FRAME_INTERVAL_MS)
+
+        gestures, latencies = [], []
+        start = time.perf_counter()
+        for i, frame in enumerate(frames, WARM_UP_FRAMES):
+            frame_start = time.perf_counter()
+            image = mp.Image(image_format=mp.ImageFormat.SRGB, data=frame)
+            result = recognizer.recognize_for_video(image, i * FRAME_INTERVAL_MS)
+            latencies.append(time.perf_counter() - frame_start)
+            gestures.append(_gesture(result))
+        elapsed = time.perf_counter() - start
+    return {"gestures": gestures, "latencies": latencies, "elapsed": elapsed}
+
+
+def bench_pool(profile: InferenceProfile, frames: list[np.ndarray]) -> dict:
+    """Recognize the frames through a worker pool, waiting for capacity rather than dropping."""
+    gestures = {}
+
+    def on_result(result, frame, timestamp_ms):
+        gestures[timestamp_ms // FRAME_INTERVAL_MS] = _gesture(result)
+
+    with RecognizerPool(
+        profile.num_workers,
+        profile.model_path,
+        profile.recognizer_options,
+        on_result,
+        delegate=profile.delegate,
+        cpus_per_worker=profile.cpus_per_worker,
+        landmark_classifier_path=profile.landmark_classifier,
+    ) as pool:
+
+        def recognize(frame: np.ndarray, index: int):
+            while not pool.has_capacity():
+                pool.poll()
+                time.sleep(0.0005)
+            pool.submit(frame, index * FRAME_INTERVAL_MS)
+            pool.poll()
+
+        def finish():
+            while pool.in_flight:
+                pool.poll()
+                time.sleep(0.0005)
+
+        # Every worker gets warm-up frames
+        for i in range(WARM_UP_FRAMES * profile.num_workers):
+            recognize(frames[0], i)
+        finish()
+        pool.latencies.clear()
+        gestures.clear()
+
+        offset = WARM_UP_FRAMES * profile.num_workers
+        start = time.perf_counter()
+        for i, frame in enumerate(frames, offset):
+            recognize(frame, i)
+        finish()
+        elapsed = time.perf_counter() - start
+        latencies = list(pool.latencies)
+
+    return {
+        # Frames that failed in a worker have no result
+        "gestures": [
+            gestures.get(i, NO_HAND) for i in range(offset, offset + len(frames))
+        ],
+        "latencies": latencies,
+        "elapsed": elapsed,
+    }
+
+
+def bench(profile: InferenceProfile, frames: list[np.ndarray]) -> dict:
+    run = bench_pool if profile.num_workers > 0 else bench_in_process
+    return run(profile, frames)
+
+
+def describe(profile: InferenceProfile) -> str:
+    """A short name for a profile, from the settings the matrix varies."""
+    cpus = profile.cpus_per_worker or "all"
+    classifier = "lm" if profile.gesture_classifier == "landmarks" else "mp"
+    return (
+        f"{Path(profile.model_path).stem} {classifier} w={profile.num_workers} "
+        f"cpus={cpus} hands={profile.num_hands}"
+    )
+
+
+def matrix_profiles(
+    base: InferenceProfile,
+    models: list[str],
+    gesture_classifiers: list[str],
+    workers: list[int],
+    cpus_per_worker: list[int | None],
+    num_hands: list[int],
+) -> list[InferenceProfile]:
+    """Every combination of the settings, skipping CPU limits on in-process profiles."""
+    profiles = []
+    for model, classifier, num_workers, cpus, hands in itertools.product(
+        models, gesture_classifiers, workers, cpus_per_worker, num_hands
+    ):
+        if num_workers == 0 and cpus is not None:
+            continue
+        profiles.append(
+            replace(
+                base,
+                model_path=model,
+                gesture_classifier=classifier,
+                num_workers=num_workers,
+                cpus_per_worker=cpus,
+                num_hands=hands,
+            )
+        )
+    return profiles
+
+
+def main():
+    base = InferenceProfile()
+
+    argparser = ArgumentParser(prog="Inference profile benchmark")
+    argparser.add_argument("video")
+    argparser.add_argument(
+        "--profiles", nargs="+", default=[], help="Inference profile JSON files"
+    )
+    argparser.add_argument("--models", nargs="+", default=[base.model_path])
+    argparser.add_argument(
+        "--gesture-classifiers",
+        nargs="+",
+        choices=GESTURE_CLASSIFIERS,
+        default=[base.gesture_classifier],
+    )
+    argparser.add_argument("--workers", type=int, nargs="+", default=[0])
+    argparser.add_argument(
+        "--cpus-per-worker",
+        type=int,
+        nargs="+",
+        default=[None],
+        help="CPUs each worker is pinned to (all if not given)",
+    )
+    argparser.add_argument("--num-hands", type=int, nargs="+", default=[1])
+    argparser.add_argument("--frames", type=int, default=300)
+    args = argparser.parse_args()
+
+    named = [(Path(p).stem, InferenceProfile.load(p)) for p in args.profiles]
+    # Only build the matrix if asked for, or there is nothing else to run
+    matrix_args = (
+        "models",
+        "gesture_classifiers",
+        "workers",
+        "cpus_per_worker",
+        "num_hands",
+    )
+    if not named or any(
+        getattr(args, a) != argparser.get_default(a) for a in matrix_args
+    ):
+        named += [
+            (describe(p), p)
+            for p in matrix_profiles(
+                base,
+                args.models,
+                args.gesture_classifiers,
+                args.workers,
+                args.cpus_per_worker,
+                args.num_hands,
+            )
+        ]
+
+    for name, profile in named:
+        profile.validate()
+        if profile.delegate != "cpu":
+            raise ValueError(
+                f"Profile {name} isn't on the CPU, which is all this compares"
+            )
+
+    frames = load_frames(args.video, args.frames)
+    print(f"{len(frames)} frames of {frames[0].shape[1]}x{frames[0].shape[0]}")
+    print(
+        f"{'profile':<36} {'fps':>7} {'p50 ms':>7} {'p95 ms':>7} {'p99 ms':>7} "
+        f"{'agree':>6}"
+    )
+    reference = None
+    for name, profile in named:
+        result = bench(profile, frames)
+        if reference is None:
+            reference = result["gestures"]
+        latencies = np.array(result["latencies"]) * 1000
+        agreement = np.mean(np.array(result["gestures"]) == np.array(reference))
+        print(
+            f"{name:<36.36} {len(frames) / result['elapsed']:>7.1f} "
+            f"{np.percentile(latencies, 50):>7.1f} {np.percentile(latencies, 95):>7.1f} "
+            f"{np.percentile(latencies, 99):>7.1f} {agreement:>6.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
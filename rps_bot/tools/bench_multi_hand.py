@@ -0,0 +1,70 @@
+"""
+Benchmark the per-frame cost of tracking and analyzing the motion of several hands,
+batched with MultiHandTracker, against one MotionAnalyzer per hand.
+Uses synthetic hands, swinging out of phase, so no model or video is needed.
+
+Usage: python -m rps_bot.tools.bench_multi_hand [--hands 1 2 4 8 16] [--frames 900]
+"""
+
+import time
+from argparse import ArgumentParser
+
+import numpy as np
+
+from rps_bot.recognizer.motion_analysis import MotionAnalyzer
+from rps_bot.recognizer.multi_hand import MultiHandTracker
+
+FPS = 30
+
+
+def synthetic_hands(num_hands: int, num_frames: int, seed: int = 0) -> np.ndarray:
+    """Landmarks of hands side by side, swinging up and down. Shape frames x hands x 21 x 3."""
+    rng = np.random.default_rng(seed)
+    hand_shape = rng.random((21, 3)).astype(np.float32) * 0.08
+    ts = np.arange(num_frames) / FPS
+    periods = rng.uniform(0.5, 0.9, num_hands)
+    phases = rng.uniform(0, 2 * np.pi, num_hands)
+
+    x = (np.arange(num_hands) + 0.5) / num_hands
+    y = 0.5 - 0.3 * np.cos(2 * np.pi * ts[:, None] / periods + phases)
+    offsets = np.stack([np.broadcast_to(x, y.shape), y, np.zeros_like(y)], axis=2)
+    noise = rng.normal(0, 0.002, (num_frames, num_hands, 21, 3))
+    return (hand_shape + offsets[:, :, None, :] + noise).astype(np.float32)
+
+
+def bench_batched(frames: np.ndarray) -> float:
+    """Mean secs per frame to track and analyze all hands with MultiHandTracker."""
+    tracker = MultiHandTracker(frames.shape[1])
+    start = time.perf_counter()
+    for i, landmarks in enumerate(frames):
+        tracker.update(i / FPS, landmarks)
+    return (time.perf_counter() - start) / len(frames)
+
+
+def bench_per_hand(frames: np.ndarray) -> float:
+    """Mean secs per frame to analyze all hands with one MotionAnalyzer each."""
+    analyzers = [MotionAnalyzer() for _ in range(frames.shape[1])]
+    hand_y = (frames[:, :, :, 1].min(axis=2) + frames[:, :, :, 1].max(axis=2)) / 2
+    start = time.perf_counter()
+    for i, frame_y in enumerate(hand_y):
+        for analyzer, y in zip(analyzers, frame_y):
+            analyzer.add_sample(i / FPS, float(y))
+    return (time.perf_counter() - start) / len(frames)
+
+
+def main():
+    argparser = ArgumentParser(prog="Multi-hand benchmark")
+    argparser.add_argument("--hands", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    argparser.add_argument("--frames", type=int, default=900)
+    args = argparser.parse_args()
+
+    print(f"{'hands':>5} {'batched (ms/frame)':>19} {'per hand (ms/frame)':>20}")
+    for num_hands in args.hands:
+        frames = synthetic_hands(num_hands, args.frames)
+        batched = bench_batched(frames)
+        per_hand = bench_per_hand(frames)
+        print(f"{num_hands:>5} {batched * 1000:>19.3f} {per_hand * 1000:>20.3f}")
+
+
+if __name__ == "__main__":
+    main()
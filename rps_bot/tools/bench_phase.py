@@ -0,0 +1,115 @@
+"""
+Compare the phase estimators of MotionAnalyzer on the same synthetic games.
+
+For every frame a motion is estimated in while the player is bobbing, scores:
+- the phase error, against the player's true phase,
+- the phase jump, how far the estimate moved from one frame to the next beyond
+  what the true phase did (0 for a perfectly smooth estimate),
+- the move time error, over the second half of the motion,
+- how often the true move time lies within one std dev of the predicted one,
+  for estimators that give an uncertainty (about 68% if it's calibrated),
+- the compute time per sample.
+
+Usage: python -m rps_bot.tools.bench_phase [--games 300] [--estimators ...]
+"""
+
+import time
+from argparse import ArgumentParser
+from dataclasses import replace
+
+import numpy as np
+
+from rps_bot.recognizer.events import SHOOT_PHASE
+from rps_bot.recognizer.motion_analysis import (
+    PHASE_ESTIMATORS,
+    MotionAnalyzer,
+    MotionAnalyzerConfig,
+)
+from rps_bot.simulation import generate_trace, sample_profile
+
+
+def bench(
+    config: MotionAnalyzerConfig, num_games: int, seed: int
+) -> dict[str, np.ndarray | float]:
+    """Errors over all frames of the games played by the population drawn from seed."""
+    phase_errors, phase_jumps, eta_errors, eta_z = [], [], [], []
+    compute_secs = 0.0
+    samples = 0
+    for index in range(num_games):
+        rng = np.random.default_rng([seed, index])
+        trace = generate_trace(sample_profile(rng), rng)
+        if trace.true_shoot_ts is None:
+            continue
+
+        analyzer = MotionAnalyzer(config)
+        last = None
+        for ts, hand_y, true_phase in zip(trace.ts, trace.hand_y, trace.true_phase):
+            ts = float(ts)
+            start = time.perf_counter()
+            analyzer.add_sample(ts, None if np.isnan(hand_y) else float(hand_y))
+            compute_secs += time.perf_counter() - start
+            samples += 1
+
+            if analyzer.est_phase is None or not 0 < true_phase < SHOOT_PHASE:
+                last = None
+                continue
+
+            phase = analyzer.phase_at(ts)
+            phase_errors.append(phase - true_phase)
+            if last is not None:
+                phase_jumps.append((phase - last[0]) - (true_phase - last[1]))
+            last = (phase, true_phase)
+
+            if true_phase > SHOOT_PHASE / 2 and analyzer.move_eta is not None:
+                eta_error = analyzer.move_eta - trace.true_shoot_ts
+                eta_errors.append(eta_error)
+                if analyzer.move_eta_std:
+                    eta_z.append(eta_error / analyzer.move_eta_std)
+
+    return {
+        "phase_errors": np.abs(phase_errors),
+        "phase_jumps": np.abs(phase_jumps),
+        "eta_errors": np.abs(eta_errors),
+        "eta_z": np.abs(eta_z),
+        "us_per_sample": compute_secs / samples * 1e6,
+    }
+
+
+def main():
+    argparser = ArgumentParser(prog="Phase estimator benchmark")
+    argparser.add_argument("--games", type=int, default=300)
+    argparser.add_argument("--seed", type=int, default=0)
+    argparser.add_argument(
+        "--estimators", nargs="+", choices=PHASE_ESTIMATORS, default=PHASE_ESTIMATORS
+    )
+    args = argparser.parse_args()
+
+    # Compare with everything else as configured
+    base = MotionAnalyzerConfig.load_default()
+    print(
+        f"{'estimator':>14} {'frames':>7} {'phase err':>10} {'p90':>7} "
+        f"{'jump':>7} {'p99':>7} {'eta err':>8} {'median':>7} {'in 1 std':>9} "
+        f"{'us/sample':>10}"
+    )
+    for estimator in args.estimators:
+        result = bench(replace(base, phase_estimator=estimator), args.games, args.seed)
+        errors, jumps, eta_errors = (
+            result["phase_errors"],
+            result["phase_jumps"],
+            result["eta_errors"],
+        )
+        in_std = (
+            f"{(result['eta_z'] < 1).mean():>9.2f}"
+            if len(result["eta_z"])
+            else "-".rjust(9)
+        )
+        print(
+            f"{estimator:>14} {len(errors):>7} {errors.mean():>10.3f} "
+            f"{np.percentile(errors, 90):>7.3f} {jumps.mean():>7.4f} "
+            f"{np.percentile(jumps, 99):>7.3f} {eta_errors.mean():>8.3f} "
+            f"{np.median(eta_errors):>7.3f} {in_std} {result['us_per_sample']:>10.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Benchmark recognizer pool throughput and latency against the number of workers,
+on frames replayed from a recorded video as fast as the pool accepts them.
+
+Usage: python -m rps_bot.tools.bench_pool VIDEO [--workers 1 2 4] [--frames 300]
+"""
+
+import time
+from argparse import ArgumentParser
+
+import cv2 as cv
+import numpy as np
+
+from rps_bot.recognizer.hand_recognizer import DEFAULT_MODEL_PATH
+from rps_bot.recognizer.pool import RecognizerPool
+
+# Spacing of the synthetic frame timestamps given to the recognizers
+FRAME_INTERVAL_MS = 33
+
+
+def load_frames(path: str, max_frames: int) -> list[np.ndarray]:
+    cap = cv.VideoCapture(path)
+    if not cap.isOpened():
+        raise RuntimeError(f"Failed to open video file {path}")
+    frames = []
+    while len(frames) < max_frames:
+        ok, frame = cap.read()
+        if not ok:
+            break
+        frames.append(frame)
+    cap.release()
+    return frames
+
+
+def bench(frames: list[np.ndarray], num_workers: int, model_path: str) -> dict:
+    delivered_ts = []
+
+    def on_result(result, frame, timestamp_ms):
+        delivered_ts.append(timestamp_ms)
+
+    with RecognizerPool(num_workers, model_path, {}, on_result) as pool:
+        start = time.perf_counter()
+        for i, frame in enumerate(frames):
+            # Wait for the next worker rather than dropping frames
+            while not pool.has_capacity():
+                pool.poll()
+                time.sleep(0.0005)
+            pool.submit(frame, i * FRAME_INTERVAL_MS)
+            pool.poll()
+        while pool.in_flight:
+            pool.poll()
+            time.sleep(0.0005)
+        elapsed = time.perf_counter() - start
+        latencies = np.array(pool.latencies) * 1000
+
+    assert delivered_ts == sorted(delivered_ts), "Results were delivered out of order"
+
+    return {
+        "fps": len(frames) / elapsed,
+        "p50_ms": np.percentile(latencies, 50),
+        "p95_ms": np.percentile(latencies, 95),
+        "max_ms": latencies.max(),
+    }
+
+
+def main():
+    argparser = ArgumentParser(prog="Recognizer pool benchmark")
+    argparser.add_argument("video")
+    argparser.add_argument("--model", default=DEFAULT_MODEL_PATH)
+    argparser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    argparser.add_argument("--frames", type=int, default=300)
+    args = argparser.parse_args()
+
+    frames = load_frames(args.video, args.frames)
+    print(f"{len(frames)} frames of {frames[0].shape[1]}x{frames[0].shape[0]}")
+    print(f"{'workers':>7} {'fps':>8} {'p50 ms':>8} {'p95 ms':>8} {'max ms':>8}")
+    for num_workers in args.workers:
+        stats = bench(frames, num_workers, args.model)
+        print(
+            f"{num_workers:>7} {stats['fps']:>8.1f} {stats['p50_ms']:>8.1f} "
+            f"{stats['p95_ms']:>8.1f} {stats['max_ms']:>8.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
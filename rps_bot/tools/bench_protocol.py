@@ -0,0 +1,99 @@
+"""
+Compare the hand's wire codecs on each pose: the bytes sent, how long they take on the
+wire at the boards' baud rate, and the time to encode and decode them.
+
+Each pose is also checked to round trip, through the simulated board (its motors' goals)
+and through a pyserial loopback port (the decoded commands).
+
+Usage: python -m rps_bot.tools.bench_protocol [--codecs text binary] [--reps 20000]
+    [--baudrate 250000]
+"""
+
+import timeit
+from argparse import ArgumentParser
+
+import serial as ps
+
+from rps_bot.hand_protocol import CODECS, Move, SetGoals
+from rps_bot.hand_serial import POSES
+from rps_bot.hand_sim import SimulatedMotorBoard
+
+# Bits on the wire per byte, with a start and a stop bit (8N1)
+BITS_PER_BYTE = 10
+
+
+def pose_goals() -> dict[str, dict[int, int]]:
+    """Motor goals of each finger pose, plus an elbow movement, by name."""
+    goals = {
+        name: {finger.value: position for finger, position in pose.items()}
+        for name, pose in POSES.items()
+    }
+    goals["elbow"] = {1: -333}
+    return goals
+
+
+def decode_all(codec, data: bytes) -> list:
+    commands = []
+    while data:
+        message = codec.next_message(data)
+        if message is None:
+            raise ValueError(f"Incomplete message: {data!r}")
+        length, message_commands = message
+        commands += message_commands
+        data = data[length:]
+    return commands
+
+
+def round_trips(codec_name: str, goals: dict[int, int]) -> bool:
+    """Whether the pose moves the simulated board, and decodes after a loopback port."""
+    data = CODECS[codec_name]().pose(goals)
+
+    board = SimulatedMotorBoard()
+    board.write(data)
+    on_board = all(board.motors[i].goal == goal for i, goal in goals.items())
+
+    port = ps.serial_for_url("loop://", timeout=1)
+    port.write(data)
+    echoed = port.read(len(data))
+    port.close()
+    # The text codec sends a command per goal, so compare the goals set in all
+    decoded = decode_all(CODECS[codec_name](), echoed)
+    decoded_goals = {}
+    for command in decoded:
+        if isinstance(command, SetGoals):
+            decoded_goals.update(command.goals)
+    return on_board and decoded_goals == goals and decoded[-1] == Move()
+
+
+def main():
+    argparser = ArgumentParser(prog="Wire protocol benchmark")
+    argparser.add_argument(
+        "--codecs", nargs="+", choices=list(CODECS), default=list(CODECS)
+    )
+    argparser.add_argument("--reps", type=int, default=20000)
+    argparser.add_argument("--baudrate", type=int, default=250000)
+    args = argparser.parse_args()
+
+    print(
+        f"{'pose':<9} {'codec':<7} {'bytes':>6} {'wire ms':>8} {'encode us':>10} {'decode us':>10} "
+        f"{'round trip':>11}"
+    )
+    for name, goals in pose_goals().items():
+        for codec_name in args.codecs:
+            codec = CODECS[codec_name]()
+            data = codec.pose(goals)
+            encode_secs = timeit.timeit(lambda: codec.pose(goals), number=args.reps)
+            decode_secs = timeit.timeit(
+                lambda: decode_all(codec, data), number=args.reps
+            )
+            print(
+                f"{name:<9} {codec_name:<7} {len(data):>6} "
+                f"{len(data) * BITS_PER_BYTE / args.baudrate * 1000:>8.3f} "
+                f"{encode_secs / args.reps * 1e6:>10.2f} "
+                f"{decode_secs / args.reps * 1e6:>10.2f} "
+                f"{'ok' if round_trips(codec_name, goals) else 'FAILED':>11}"
+            )
+
+
+if __name__ == "__main__":
+    main()
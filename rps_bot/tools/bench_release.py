@@ -0,0 +1,188 @@
+"""
+Check when the bot's fingers arrive at its move, against the simulated board, with the
+whole pose sent the control delay before the predicted shoot ("preempt"), and with each
+finger released on its own, planned to arrive at the shoot ("planned").
+
+Games run on a virtual clock through the game controller, fed shoot predictions that
+converge on the true shoot time. The fingers have different speed limits, so in a pose
+sent at once they arrive at different times. For each game it measures the spread of the
+finger arrivals, their mean error from the true shoot, and how long before the shoot the
+first finger arrived, giving the move away. It also times the controller's handling of
+each new prediction, which re-plans the releases.
+
+Usage: python -m rps_bot.tools.bench_release [--games 200] [--finger-speeds 4500 4000 3500 3000]
+    [--eta-noise-secs 0.05] [--prediction-interval-secs 0.1]
+"""
+
+import threading
+import time
+from argparse import ArgumentParser
+from contextlib import redirect_stdout
+from io import StringIO
+
+import numpy as np
+
+from rps_bot.game_flow.controller import GameController, GameStage, PendingState
+from rps_bot.game_flow.scheduler import Scheduler
+from rps_bot.hand_serial import Finger, FingerTiming, RPSSerial
+from rps_bot.hand_sim import SimulatedMotorBoard
+from rps_bot.recognizer.events import GameOffered, Swinging, SHOOT_PHASE
+from rps_bot.simulation.game_loop import SimulatedRecognizer, VirtualClock
+
+# Swing period of the simulated player
+PERIOD_SECS = 0.6
+# Virtual time between controller updates while a game winds down
+UPDATE_STEP_SECS = 0.05
+# Time left after a game for the fingers to return to paper, before the next one
+SETTLE_SECS = 1
+
+
+def finger_arrivals(board: SimulatedMotorBoard, motors: list[int]) -> list[float]:
+    """When each motor's latest movement finished, or finishes, on the board."""
+    return [
+        motor.start_ts + abs(motor.goal - motor.start_pos) / motor.speed
+        for motor in (board.motors[i] for i in motors)
+    ]
+
+
+def run_games(
+    plan_finger_release: bool,
+    num_games: int,
+    speeds: dict[int, float],
+    eta_noise_secs: float,
+    prediction_interval_secs: float,
+    seed: int,
+) -> dict[str, np.ndarray]:
+    rng = np.random.default_rng(seed)
+    threads = set(threading.enumerate())
+    clock = VirtualClock(0.0)
+    scheduler = Scheduler(clock)
+    board = SimulatedMotorBoard(speed_ticks_per_sec=speeds, clock=clock)
+    serial = RPSSerial(
+        board,
+        SimulatedMotorBoard(clock=clock),
+        finger_timing=FingerTiming(
+            {Finger(motor): speed for motor, speed in speeds.items()}, 0.0
+        ),
+        clock=clock,
+    )
+    recognizer = SimulatedRecognizer()
+    controller = GameController(
+        recognizer,
+        serial,
+        clock=clock,
+        scheduler=scheduler,
+        plan_finger_release=plan_finger_release,
+    )
+
+    def advance(ts: float):
+        """Move the clock to ts, running commands due on the way at their deadlines."""
+        while (deadline := scheduler.next_deadline()) is not None and deadline <= ts:
+            clock.now = max(clock.now, deadline)
+            scheduler.poll()
+        clock.now = max(clock.now, ts)
+
+    spreads, errors, leads, replan_secs = [], [], [], []
+    for _ in range(num_games):
+        start = clock.now
+        true_shoot_ts = start + SHOOT_PHASE * PERIOD_SECS
+        controller.on_game_offered(GameOffered(start))
+
+        ts = start
+        while not isinstance(controller.state, PendingState):
+            # Predictions get better as the shoot approaches
+            noise = (
+                eta_noise_secs * max(0.0, true_shoot_ts - ts) / (true_shoot_ts - start)
+            )
+            swing = Swinging(
+                ts,
+                PERIOD_SECS,
+                (ts - start) / PERIOD_SECS,
+                true_shoot_ts + rng.normal(0, noise),
+            )
+            replan_start = time.perf_counter()
+            controller.on_swinging(swing)
+            replan_secs.append(time.perf_counter() - replan_start)
+            ts += prediction_interval_secs
+            advance(ts)
+            controller.update()
+
+        moved = [
+            motor
+            for motor in board.motors
+            if board.motors[motor].goal != board.motors[motor].start_pos
+        ]
+        arrivals = np.array(finger_arrivals(board, moved))
+        if len(arrivals):
+            spreads.append(arrivals.max() - arrivals.min())
+            errors.append(arrivals.mean() - true_shoot_ts)
+            leads.append(true_shoot_ts - arrivals.min())
+
+        # Let the game end and the hand return to paper
+        while controller.state != GameStage.WAITING:
+            advance(clock.now + UPDATE_STEP_SECS)
+            controller.update()
+        advance(clock.now + SETTLE_SECS)
+
+    # Closing returns the hand to paper, and the serial reader thread prints as it stops
+    with redirect_stdout(StringIO()):
+        serial.close()
+        for thread in set(threading.enumerate()) - threads:
+            thread.join()
+
+    return {
+        "spread": np.array(spreads),
+        "error": np.array(errors),
+        "lead": np.array(leads),
+        "replan": np.array(replan_secs),
+    }
+
+
+def main():
+    argparser = ArgumentParser(prog="Finger release benchmark")
+    argparser.add_argument("--games", type=int, default=200)
+    argparser.add_argument(
+        "--finger-speeds",
+        type=float,
+        nargs=4,
+        default=[4500, 4000, 3500, 3000],
+        metavar=("INDEX", "MIDDLE", "RING", "PINKY"),
+        help="Speed limit of each finger, ticks per second",
+    )
+    argparser.add_argument("--eta-noise-secs", type=float, default=0.05)
+    argparser.add_argument("--prediction-interval-secs", type=float, default=0.1)
+    argparser.add_argument("--seed", type=int, default=0)
+    args = argparser.parse_args()
+
+    speeds = {
+        finger.value: speed
+        for finger, speed in zip(
+            [Finger.INDEX, Finger.MIDDLE, Finger.RING, Finger.PINKY], args.finger_speeds
+        )
+    }
+    print(
+        f"{'mode':<8} {'spread ms p50/p95':>18} {'error ms p50/p95':>18} "
+        f"{'first early ms p50/max':>23} {'replan us p50':>14}"
+    )
+    for name, planned in (("preempt", False), ("planned", True)):
+        stats = run_games(
+            planned,
+            args.games,
+            speeds,
+            args.eta_noise_secs,
+            args.prediction_interval_secs,
+            args.seed,
+        )
+        spread = stats["spread"] * 1000
+        error = np.abs(stats["error"]) * 1000
+        lead = stats["lead"] * 1000
+        print(
+            f"{name:<8} {np.percentile(spread, 50):>8.1f}/{np.percentile(spread, 95):<9.1f} "
+            f"{np.percentile(error, 50):>8.1f}/{np.percentile(error, 95):<9.1f} "
+            f"{np.percentile(lead, 50):>11.1f}/{lead.max():<11.1f} "
+            f"{np.percentile(stats['replan'], 50) * 1e6:>14.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
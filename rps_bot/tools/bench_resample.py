@@ -0,0 +1,112 @@
+"""
+Compare MotionAnalyzer's resampling methods on the same synthetic games, as more of the
+frames drop out (the hand not being found), leaving gaps between samples.
+
+Scores, at each analysis finding motion, how far the turning points found are from the
+player's true ones, and the move time error over the second half of the motion.
+Also times the analyses, which include the resampling.
+
+Usage: python -m rps_bot.tools.bench_resample [--games 200] [--dropout-rates 0 0.1 0.3]
+"""
+
+import time
+from argparse import ArgumentParser
+from dataclasses import replace
+
+import numpy as np
+
+from rps_bot.recognizer.events import SHOOT_PHASE
+from rps_bot.recognizer.motion_analysis import (
+    RESAMPLING_METHODS,
+    MotionAnalyzer,
+    MotionAnalyzerConfig,
+)
+from rps_bot.simulation import generate_trace, sample_profile
+
+
+def true_turning_points(ts: np.ndarray, phase: np.ndarray) -> np.ndarray:
+    """Times the true phase passes each half cycle (peaks at odd multiples of 0.5)."""
+    in_motion = phase > 0
+    halves = np.arange(1, int(2 * phase.max()) + 1) / 2
+    return np.interp(halves, phase[in_motion], ts[in_motion])
+
+
+def bench(
+    config: MotionAnalyzerConfig, num_games: int, dropout_rate: float, seed: int
+) -> dict[str, np.ndarray | float]:
+    point_errors, eta_errors = [], []
+    analysis_secs = 0.0
+    analyses = 0
+    for index in range(num_games):
+        rng = np.random.default_rng([seed, index])
+        profile = replace(sample_profile(rng), dropout_rate=dropout_rate)
+        trace = generate_trace(profile, rng)
+        if trace.true_shoot_ts is None:
+            continue
+        true_points = true_turning_points(trace.ts, trace.true_phase)
+        is_peak = np.arange(len(true_points)) % 2 == 0
+
+        analyzer = MotionAnalyzer(config)
+        for ts, hand_y, true_phase in zip(trace.ts, trace.hand_y, trace.true_phase):
+            start = time.perf_counter()
+            analyzed = analyzer.add_sample(
+                float(ts), None if np.isnan(hand_y) else float(hand_y)
+            )
+            elapsed = time.perf_counter() - start
+            if not analyzed:
+                continue
+            analysis_secs += elapsed
+            analyses += 1
+
+            if analyzer.est_phase is None:
+                continue
+            for point in analyzer.turning_points:
+                same_type = true_points[is_peak == (point.type == "peak")]
+                if len(same_type):
+                    point_errors.append(np.abs(same_type - point.ts).min())
+            if SHOOT_PHASE / 2 < true_phase < SHOOT_PHASE:
+                eta_errors.append(abs(analyzer.move_eta - trace.true_shoot_ts))
+
+    return {
+        "point_errors": np.array(point_errors),
+        "eta_errors": np.array(eta_errors),
+        "us_per_analysis": analysis_secs / analyses * 1e6,
+    }
+
+
+def main():
+    argparser = ArgumentParser(prog="Resampling benchmark")
+    argparser.add_argument("--games", type=int, default=200)
+    argparser.add_argument("--seed", type=int, default=0)
+    argparser.add_argument(
+        "--dropout-rates", type=float, nargs="+", default=[0, 0.1, 0.3]
+    )
+    argparser.add_argument(
+        "--methods", nargs="+", choices=RESAMPLING_METHODS, default=RESAMPLING_METHODS
+    )
+    args = argparser.parse_args()
+
+    # Compare the turning points themselves, rather than what a tracker makes of them
+    base = replace(
+        MotionAnalyzerConfig.load_default(), phase_estimator="turning_points"
+    )
+    print(
+        f"{'dropout':>7} {'method':>12} {'points':>7} {'point err':>10} {'p90':>7} "
+        f"{'eta err':>8} {'median':>7} {'us/analysis':>12}"
+    )
+    for dropout_rate in args.dropout_rates:
+        for method in args.methods:
+            result = bench(
+                replace(base, resampling=method), args.games, dropout_rate, args.seed
+            )
+            errors, eta_errors = result["point_errors"], result["eta_errors"]
+            print(
+                f"{dropout_rate:>7.2f} {method:>12} {len(errors):>7} "
+                f"{errors.mean():>10.3f} {np.percentile(errors, 90):>7.3f} "
+                f"{eta_errors.mean():>8.3f} {np.median(eta_errors):>7.3f} "
+                f"{result['us_per_analysis']:>12.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
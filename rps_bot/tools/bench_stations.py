@@ -0,0 +1,66 @@
+"""
+Benchmark aggregate throughput as the number of stations on one host grows.
+Each station replays the same video in real time, with simulated serial ports.
+
+Usage: python -m rps_bot.tools.bench_stations VIDEO [--stations 1 2 4] [--secs 30]
+"""
+
+import os
+import time
+from argparse import ArgumentParser
+
+from rps_bot.supervisor import StationConfig, Supervisor
+
+# Max time to wait for all stations to load and start processing frames
+WARMUP_TIMEOUT_SECS = 120
+
+
+def bench(video: str, num_stations: int, secs: float) -> list[float]:
+    """Run the stations for secs once they've all started, returning each one's frame rate."""
+    stations = [
+        StationConfig(f"bench{i}", video=video, calibrate=False)
+        for i in range(num_stations)
+    ]
+    with Supervisor(stations) as supervisor:
+        deadline = time.monotonic() + WARMUP_TIMEOUT_SECS
+        while not all(s.frames > 0 for s in supervisor.status()):
+            if time.monotonic() > deadline:
+                raise RuntimeError("Timed out waiting for stations to start")
+            time.sleep(0.1)
+
+        start_frames = [s.frames for s in supervisor.status()]
+        start = time.monotonic()
+        time.sleep(secs)
+        end_frames = [s.frames for s in supervisor.status()]
+        elapsed = time.monotonic() - start
+
+    return [(end - begin) / elapsed for begin, end in zip(start_frames, end_frames)]
+
+
+def main():
+    argparser = ArgumentParser(prog="Station benchmark")
+    argparser.add_argument("video")
+    argparser.add_argument("--stations", type=int, nargs="+", default=[1, 2, 4])
+    argparser.add_argument("--secs", type=float, default=30)
+    args = argparser.parse_args()
+
+    cpus = (
+        len(os.sched_getaffinity(0))
+        if hasattr(os, "sched_getaffinity")
+        else os.cpu_count()
+    )
+    print(f"{cpus} CPUs")
+    print(
+        f"{'stations':>8} {'total fps':>10} {'min station fps':>16} "
+        f"{'max station fps':>16}"
+    )
+    for num_stations in args.stations:
+        rates = bench(args.video, num_stations, args.secs)
+        print(
+            f"{num_stations:>8} {sum(rates):>10.1f} {min(rates):>16.1f} "
+            f"{max(rates):>16.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+"""
+Replay recorded sessions through the threaded game loop (main.run) and the asyncio one
+(async_runtime.run_async), against simulated boards, and check that they play the same.
+
+Both runs pick the bot's moves from the same random seed. For each game, the bot's move,
+the player's move, the result and the shoot time relative to the first frame are
+compared, as are the commands the fingers were sent. Shoot times may differ within
+--tolerance-secs, as a shoot goes by the predictions that arrived before it was due, which
+varies with the timing of the real-time replay, as it does between runs of one runtime.
+
+Usage: python -m rps_bot.tools.compare_runtimes VIDEO [VIDEO ...] [--seed 0]
+    [--tolerance-secs 0.1] [--inference-profile PROFILE_JSON]
+"""
+
+import asyncio
+import random
+import time
+from argparse import ArgumentParser
+from contextlib import redirect_stdout
+from io import StringIO
+
+from rps_bot.async_runtime import AsyncRPSSerial, run_async
+from rps_bot.capture import ReplayCapture
+from rps_bot.game_flow.controller import GameController, GameEndState
+from rps_bot.hand_serial import RPSSerial
+from rps_bot.hand_sim import SIM_PORT
+from rps_bot.main import run
+from rps_bot.recognizer.idle_gate import IdleGate
+from rps_bot.recognizer.inference_profile import InferenceProfile
+
+
+class FirstFrameCapture:
+    """A capture that notes the timestamp of its first frame."""
+
+    def __init__(self, capture: ReplayCapture):
+        self.capture = capture
+        self.first_ts: float | None = None
+
+    def read(self):
+        ok, frame, ts = self.capture.read()
+        if ok and self.first_ts is None:
+            self.first_ts = ts
+        return ok, frame, ts
+
+    def __getattr__(self, name):
+        return getattr(self.capture, name)
+
+
+def replay(path: str, runtime: str, profile: InferenceProfile, seed: int) -> dict:
+    """Replay a session through a runtime, returning its games and the commands sent."""
+    capture = FirstFrameCapture(ReplayCapture(path))
+    serial_cls = AsyncRPSSerial if runtime == "asyncio" else RPSSerial
+    serial = serial_cls(SIM_PORT, SIM_PORT)
+    games = []
+    last_state = None
+
+    def on_frame(controller: GameController) -> bool:
+        nonlocal last_state
+        state = controller.state
+        if state is not last_state and isinstance(state, GameEndState):
+            games.append(
+                (
+                    state.bot_move.value,
+                    state.player_move.value if state.player_move else None,
+                    state.result.name.lower(),
+                    state.ts_shoot - capture.first_ts,
+                )
+            )
+        last_state = state
+        return False
+
+    args = (capture, serial, "none", "none", float("inf"), IdleGate())
+    kwargs = dict(
+        recognizer_workers=profile.num_workers,
+        num_hands=profile.num_hands,
+        on_frame=on_frame,
+        inference_profile=profile,
+    )
+    random.seed(seed)
+    cpu_start = time.process_time()
+    # Both runtimes print their reports, which aren't compared
+    with redirect_stdout(StringIO()):
+        if runtime == "asyncio":
+            asyncio.run(run_async(*args, **kwargs))
+        else:
+            run(*args, **kwargs)
+    cpu_secs = time.process_time() - cpu_start
+    capture.release()
+
+    # The finger board's commands, without their timestamps
+    commands = [data for _, data in serial.finger_control.commands]
+    with redirect_stdout(StringIO()):
+        serial.close()
+    return {"games": games, "commands": commands, "cpu_secs": cpu_secs}
+
+
+def compare(threads: dict, asyncio_: dict, tolerance_secs: float) -> list[str]:
+    """The differences between two replays of a session, empty if they played the same."""
+    differences = []
+    if len(threads["games"]) != len(asyncio_["games"]):
+        differences.append(
+            f"{len(threads['games'])} games threaded, {len(asyncio_['games'])} on asyncio"
+        )
+    for i, (a, b) in enumerate(zip(threads["games"], asyncio_["games"])):
+        if a[:3] != b[:3]:
+            differences.append(f"game {i}: {a[:3]} threaded, {b[:3]} on asyncio")
+        elif abs(a[3] - b[3]) > tolerance_secs:
+            differences.append(
+                f"game {i}: shot {(b[3] - a[3]) * 1000:+.0f} ms later on asyncio"
+            )
+    if threads["commands"] != asyncio_["commands"]:
+        differences.append(
+            f"{len(threads['commands'])} finger commands threaded, "
+            f"{len(asyncio_['commands'])} on asyncio, or in a different order"
+        )
+    return differences
+
+
+def main():
+    argparser = ArgumentParser(prog="Runtime comparison")
+    argparser.add_argument("videos", nargs="+")
+    argparser.add_argument("--seed", type=int, default=0)
+    argparser.add_argument("--tolerance-secs", type=float, default=0.1)
+    argparser.add_argument("--inference-profile")
+    args = argparser.parse_args()
+    profile = (
+        InferenceProfile.load(args.inference_profile)
+        if args.inference_profile
+        else InferenceProfile()
+    )
+    profile.validate()
+
+    all_same = True
+    print(f"{'session':<30} {'games':>6} {'cpu s threads/asyncio':>22}  differences")
+    for path in args.videos:
+        threads = replay(path, "threads", profile, args.seed)
+        asyncio_ = replay(path, "asyncio", profile, args.seed)
+        differences = compare(threads, asyncio_, args.tolerance_secs)
+        all_same = all_same and not differences
+        print(
+            f"{path[-30:]:<30} {len(threads['games']):>6} "
+            f"{threads['cpu_secs']:>10.1f}/{asyncio_['cpu_secs']:<11.1f}  "
+            f"{'; '.join(differences) or 'none'}"
+        )
+    raise SystemExit(0 if all_same else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Replay recorded sessions with and without the idle gate, and report the CPU saved
+and the time taken to detect a hand after motion wakes the gate.
+
+Usage: python -m rps_bot.tools.idle_report VIDEO [VIDEO ...] [--model MODEL_PATH]
+"""
+
+import time
+from argparse import ArgumentParser
+
+import numpy as np
+
+from rps_bot.capture import ReplayCapture
+from rps_bot.game_flow.controller import GameController
+from rps_bot.recognizer import HandRecognizer
+from rps_bot.recognizer.hand_recognizer import DEFAULT_MODEL_PATH
+from rps_bot.recognizer.idle_gate import IdleGate
+
+
+def replay_session(path: str, model_path: str, gate: IdleGate | None) -> dict:
+    """Replay a session in real time through the recognizer and controller, measuring CPU use."""
+    capture = ReplayCapture(path)
+    frames = 0
+
+    wall_start = time.monotonic()
+    cpu_start = time.process_time()
+    with HandRecognizer(model_path, idle_gate=gate) as recognizer:
+        controller = GameController(recognizer)
+        while True:
+            ok, frame, ts = capture.read()
+            if not ok:
+                break
+            recognizer.next_frame(frame, ts)
+            controller.update()
+            frames += 1
+    cpu_secs = time.process_time() - cpu_start
+    wall_secs = time.monotonic() - wall_start
+    capture.release()
+
+    return {
+        "frames": frames,
+        "wall_secs": wall_secs,
+        "cpu_secs": cpu_secs,
+        "duty_cycle": gate.duty_cycle if gate else 1.0,
+        "detection_latencies": list(gate.detection_latencies) if gate else [],
+    }
+
+
+def main():
+    argparser = ArgumentParser(prog="Idle gate report")
+    argparser.add_argument("videos", nargs="+")
+    argparser.add_argument("--model", default=DEFAULT_MODEL_PATH)
+    argparser.add_argument("--idle-interval-secs", type=float, default=0.5)
+    argparser.add_argument("--idle-after-secs", type=float, default=2)
+    args = argparser.parse_args()
+
+    print(
+        f"{'session':<30} {'mode':<6} {'frames':>7} {'duty':>6} "
+        f"{'cpu %':>7} {'saved':>7} {'detect mean/max (s)':>20}"
+    )
+    for path in args.videos:
+        baseline = replay_session(path, args.model, None)
+        gated = replay_session(
+            path,
+            args.model,
+            IdleGate(args.idle_interval_secs, args.idle_after_secs),
+        )
+
+        for mode, stats in [("full", baseline), ("gated", gated)]:
+            cpu_percent = 100 * stats["cpu_secs"] / stats["wall_secs"]
+            saved = 1 - stats["cpu_secs"] / baseline["cpu_secs"]
+            latencies = np.array(stats["detection_latencies"])
+            detect = (
+                f"{latencies.mean():.2f}/{latencies.max():.2f}"
+                if len(latencies)
+                else "-"
+            )
+            print(
+                f"{path[-30:]:<30} {mode:<6} {stats['frames']:>7} "
+                f"{stats['duty_cycle']:>6.2f} {cpu_percent:>6.1f}% "
+                f"{saved:>6.1%} {detect:>20}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,478 @@
+"""
+Microbenchmarks of the hot paths, on fixed synthetic inputs, so no camera,
+model file or robot is needed.
+
+Each benchmark times single calls, reporting latency percentiles, then repeats them under
+tracemalloc to report the memory each call allocates: its peak, and what it keeps.
+(tracemalloc sees Python and NumPy allocations, not those made inside OpenCV.)
+
+Results can be saved as JSON, as a baseline for later runs to be compared against.
+Benchmarks whose median latency or peak allocation grew by more than the threshold
+are flagged as regressions, and the exit status is then 1.
+
+Usage: python -m rps_bot.tools.microbench [--filter SUBSTRING ...] [--secs 0.5]
+    [--out RESULTS_JSON] [--compare BASELINE_JSON] [--threshold 0.2]
+"""
+
+from collections import namedtuple
+from contextlib import contextmanager, redirect_stdout
+import io
+import json
+import os
+import platform
+import sys
+import threading
+import time
+import tracemalloc
+from argparse import ArgumentParser
+from typing import Callable, Iterator
+
+import cv2 as cv
+import numpy as np
+
+from rps_bot.hand_serial import RPSSerial
+from rps_bot.recognizer import _util
+from rps_bot.recognizer.gestures import HandGesture
+from rps_bot.recognizer.motion_analysis import MotionAnalyzer
+from rps_bot.recognizer.tracker import TRACKER_BACKENDS, Tracker
+from rps_bot.shared_state import StateSnapshot
+from rps_bot.simulation import PlayerProfile, generate_trace
+
+# Calls made before timing, e.g. to fill caches
+WARMUP_CALLS = 10
+# Calls timed per benchmark are limited by time, but at least and at most these
+MIN_CALLS = 20
+MAX_CALLS = 100_000
+# Calls repeated under tracemalloc, which slows them
+ALLOC_CALLS = 20
+# Allocation growth below this (bytes) is never flagged, being too small to matter
+MIN_ALLOC_REGRESSION_BYTES = 1024
+DEFAULT_REGRESSION_THRESHOLD = 0.2
+
+# Frame size of synthetic camera frames, as captured by main
+FRAME_SHAPE = (540, 960, 3)
+
+# Registered benchmarks, by name.
+# Each is a generator function that sets up, yields the call to time, then cleans up.
+BENCHMARKS: dict[str, Callable[[], Iterator[Callable[[], object]]]] = {}
+
+
+def benchmark(name: str):
+    def register(setup: Callable[[], Iterator[Callable[[], object]]]):
+        BENCHMARKS[name] = setup
+        return setup
+
+    return register
+
+
+# SYNTHETIC INPUTS
+
+Landmark = namedtuple("Landmark", ["x", "y", "z"])
+
+
+def synthetic_trace():
+    """A player bobbing 4 times, then shooting."""
+    return generate_trace(PlayerProfile(), np.random.default_rng(0))
+
+
+def filled_analyzer(until_phase: float = 2.5) -> MotionAnalyzer:
+    """A MotionAnalyzer fed a synthetic game up to a phase, mid-motion by default."""
+    trace = synthetic_trace()
+    analyzer = MotionAnalyzer()
+    for ts, hand_y, phase in zip(trace.ts, trace.hand_y, trace.true_phase):
+        analyzer.add_sample(float(ts), None if np.isnan(hand_y) else float(hand_y))
+        if phase >= until_phase:
+            break
+    return analyzer
+
+
+def synthetic_landmarks(center_y: float = 0.5, seed: int = 0) -> list[Landmark]:
+    rng = np.random.default_rng(seed)
+    points = rng.uniform(-0.06, 0.06, (21, 3)) + (0.5, center_y, 0)
+    return [Landmark(*point) for point in points.tolist()]
+
+
+def synthetic_frames(num_frames: int = 30) -> list[np.ndarray]:
+    """Frames of a textured patch moving up and down a noisy background."""
+    rng = np.random.default_rng(0)
+    background = rng.integers(90, 110, FRAME_SHAPE, dtype=np.uint8)
+    patch = rng.integers(0, 255, (120, 100, 3), dtype=np.uint8)
+    frames = []
+    for i in range(num_frames):
+        frame = background.copy()
+        top = int(200 + 100 * np.sin(2 * np.pi * i / num_frames))
+        frame[top : top + 120, 430:530] = patch
+        frames.append(frame)
+    return frames
+
+
+def synthetic_snapshot() -> StateSnapshot:
+    analyzer = filled_analyzer()
+    filtered = np.array(
+        [(ts, p[0][0], p[1][0]) for ts, p in analyzer.filtered_from_last_n_secs(3)]
+    )
+    landmarks = synthetic_landmarks()
+    return StateSnapshot(
+        ts=float(filtered[-1, 0]),
+        landmarks=np.array(landmarks, dtype=np.float32),
+        hand_recognized=False,
+        roi_screen=tuple(_util.make_screen_roi_from_landmarks(landmarks, 0.05)),
+        filtered=filtered,
+        latest_filtered_y=float(filtered[-1, 1]),
+        turning_points=[p.ts for p in analyzer.turning_points],
+        est_phase=analyzer.est_phase,
+        move_eta=analyzer.move_eta,
+    )
+
+
+class NullPort:
+    """Stands in for a serial port, discarding writes. Reads block until closed."""
+
+    def __init__(self):
+        self.bytes_written = 0
+        self._closed = threading.Event()
+
+    def write(self, data: bytes) -> int:
+        self.bytes_written += len(data)
+        return len(data)
+
+    def readline(self) -> bytes:
+        self._closed.wait()
+        return b""
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self._closed.set()
+
+
+@contextmanager
+def null_serial() -> Iterator[RPSSerial]:
+    finger_port, elbow_port = NullPort(), NullPort()
+    threads = set(threading.enumerate())
+    serial = RPSSerial(finger_port, elbow_port)
+    # The thread RPSSerial starts to print what it reads
+    readers = set(threading.enumerate()) - threads
+    try:
+        yield serial
+    finally:
+        # Not RPSSerial.close(), which moves the hand home and waits for it.
+        # The readers print the empty read that ends them, which isn't worth showing.
+        with redirect_stdout(io.StringIO()):
+            serial.stop.release()
+            finger_port.close()
+            elbow_port.close()
+            for reader in readers:
+                reader.join()
+
+
+# BENCHMARKS
+
+
+@benchmark("motion.add_sample")
+def _motion_add_sample():
+    trace = synthetic_trace()
+    samples = [
+        (float(ts), None if np.isnan(y) else float(y))
+        for ts, y in zip(trace.ts, trace.hand_y)
+    ]
+    duration = samples[-1][0] - samples[0][0] + 1
+    analyzer = MotionAnalyzer()
+    i = 0
+
+    def add_sample():
+        # Replay the trace over and over, shifted later each time
+        nonlocal i
+        ts, hand_y = samples[i % len(samples)]
+        analyzer.add_sample(ts + duration * (i // len(samples)), hand_y)
+        i += 1
+
+    yield add_sample
+
+
+@benchmark("motion.update_predictions")
+def _motion_update_predictions():
+    analyzer = filled_analyzer()
+    ts = analyzer.ts_history[-1]
+    min_window_start = analyzer.min_window_start
+
+    def update_predictions():
+        analyzer.min_window_start = min_window_start
+        analyzer._update_predictions(ts)
+
+    yield update_predictions
+
+
+@benchmark("motion.filtered_from_last_n_secs")
+def _motion_filtered_from_last_n_secs():
+    analyzer = filled_analyzer()
+    yield lambda: analyzer.filtered_from_last_n_secs(3)
+
+
+def _tracker_benchmarks(backend: str):
+    @benchmark(f"tracker.{backend}.init_with_landmarks")
+    def _init():
+        frame = synthetic_frames(1)[0]
+        landmarks = synthetic_landmarks(center_y=0.48)
+        tracker = Tracker(0.05, 0, 0, backend)
+        ts = 0.0
+
+        def init():
+            nonlocal ts
+            ts += 1 / 30
+            tracker.init_with_landmarks(frame, landmarks, ts)
+
+        yield init
+
+    @benchmark(f"tracker.{backend}.update")
+    def _update():
+        frames = synthetic_frames()
+        tracker = Tracker(0.05, 0, 0, backend)
+        tracker.init_with_landmarks(frames[0], synthetic_landmarks(center_y=0.48), 0)
+        i = 0
+
+        def update():
+            nonlocal i
+            i += 1
+            tracker.update(frames[i % len(frames)], i / 30)
+
+        yield update
+
+
+for _backend in TRACKER_BACKENDS:
+    _tracker_benchmarks(_backend)
+
+
+@benchmark("util.bbox_screen_to_cam")
+def _util_bbox_screen_to_cam():
+    yield lambda: _util.bbox_screen_to_cam((0.4, 0.3, 0.2, 0.25), FRAME_SHAPE)
+
+
+@benchmark("util.bbox_cam_to_screen")
+def _util_bbox_cam_to_screen():
+    yield lambda: _util.bbox_cam_to_screen((384, 162, 192, 135), FRAME_SHAPE)
+
+
+@benchmark("util.make_screen_roi_from_landmarks")
+def _util_make_screen_roi_from_landmarks():
+    landmarks = synthetic_landmarks()
+    yield lambda: _util.make_screen_roi_from_landmarks(landmarks, 0.05)
+
+
+@benchmark("gui.annotate_frame")
+def _gui_annotate_frame():
+    from rps_bot.gui import annotate_frame
+
+    frame = synthetic_frames(1)[0]
+    snapshot = synthetic_snapshot()
+    yield lambda: annotate_frame(frame.copy(), snapshot)
+
+
+@benchmark("gui.GuiMainFigure.update")
+def _gui_main_figure_update():
+    # Render off screen
+    import matplotlib
+
+    matplotlib.use("Agg")
+    from rps_bot.game_flow.controller import GameStage
+    from rps_bot.gui import GuiMainFigure
+
+    figure = GuiMainFigure()
+    snapshot = synthetic_snapshot()
+    snapshot.game_state = GameStage.WAITING
+    try:
+        yield lambda: figure.update(snapshot)
+    finally:
+        figure.close()
+
+
+def _serial_benchmark(gesture: str):
+    @benchmark(f"serial.{gesture}")
+    def _gesture():
+        with null_serial() as serial:
+            yield getattr(serial, gesture)
+
+
+for _gesture in ["rock", "paper", "scissors"]:
+    _serial_benchmark(_gesture)
+
+
+@benchmark("serial.begin_elbow_movement")
+def _serial_begin_elbow_movement():
+    with null_serial() as serial:
+        yield lambda: serial.begin_elbow_movement(20)
+
+
+@benchmark("gestures.versus")
+def _gestures_versus():
+    moves = [HandGesture.ROCK, HandGesture.PAPER, HandGesture.SCISSORS]
+    pairs = [(a, b) for a in moves for b in moves]
+    i = 0
+
+    def versus():
+        nonlocal i
+        a, b = pairs[i % len(pairs)]
+        i += 1
+        return a.versus(b)
+
+    yield versus
+
+
+# RUNNING
+
+
+def run_benchmark(name: str, secs: float) -> dict:
+    setup = BENCHMARKS[name]()
+    call = next(setup)
+    try:
+        for _ in range(WARMUP_CALLS):
+            call()
+
+        # Latency
+        durations = []
+        deadline = time.perf_counter() + secs
+        while len(durations) < MAX_CALLS and (
+            len(durations) < MIN_CALLS or time.perf_counter() < deadline
+        ):
+            start = time.perf_counter_ns()
+            call()
+            durations.append(time.perf_counter_ns() - start)
+        durations_us = np.array(durations) / 1000
+
+        # Allocations
+        peaks = []
+        tracemalloc.start()
+        try:
+            start_size, _ = tracemalloc.get_traced_memory()
+            for _ in range(ALLOC_CALLS):
+                tracemalloc.reset_peak()
+                before, _ = tracemalloc.get_traced_memory()
+                call()
+                _, peak = tracemalloc.get_traced_memory()
+                peaks.append(peak - before)
+            end_size, _ = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+    finally:
+        setup.close()
+
+    return {
+        "calls": len(durations),
+        "mean_us": float(durations_us.mean()),
+        "p50_us": float(np.percentile(durations_us, 50)),
+        "p90_us": float(np.percentile(durations_us, 90)),
+        "p99_us": float(np.percentile(durations_us, 99)),
+        "alloc_peak_bytes": int(np.median(peaks)),
+        "alloc_kept_bytes": (end_size - start_size) // ALLOC_CALLS,
+    }
+
+
+def environment() -> dict:
+    return {
+        "python": sys.version.split()[0],
+        "numpy": np.__version__,
+        "opencv": cv.__version__,
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def find_regressions(results: dict, baseline: dict, threshold: float) -> list[str]:
+    """Descriptions of the benchmarks that got slower, or allocate more, than the threshold."""
+    regressions = []
+    for name, result in results.items():
+        old = baseline.get(name)
+        if old is None:
+            continue
+        if result["p50_us"] > old["p50_us"] * (1 + threshold):
+            regressions.append(
+                f"{name}: median {old['p50_us']:.1f} -> {result['p50_us']:.1f} us"
+            )
+        growth = result["alloc_peak_bytes"] - old["alloc_peak_bytes"]
+        if growth > MIN_ALLOC_REGRESSION_BYTES and result["alloc_peak_bytes"] > old[
+            "alloc_peak_bytes"
+        ] * (1 + threshold):
+            regressions.append(
+                f"{name}: peak allocation {old['alloc_peak_bytes']} -> "
+                f"{result['alloc_peak_bytes']} bytes"
+            )
+    return regressions
+
+
+def print_results(results: dict, baseline: dict | None = None):
+    header = (
+        f"{'benchmark':<40} {'calls':>7} {'p50 us':>10} {'p90 us':>10} "
+        f"{'p99 us':>10} {'peak B':>9} {'kept B':>8}"
+    )
+    if baseline:
+        header += f" {'p50 change':>11}"
+    print(header)
+    for name, r in results.items():
+        line = (
+            f"{name:<40} {r['calls']:>7} {r['p50_us']:>10.2f} {r['p90_us']:>10.2f} "
+            f"{r['p99_us']:>10.2f} {r['alloc_peak_bytes']:>9} {r['alloc_kept_bytes']:>8}"
+        )
+        if baseline and name in baseline:
+            line += f" {r['p50_us'] / baseline[name]['p50_us'] - 1:>+11.1%}"
+        print(line)
+
+
+def main():
+    argparser = ArgumentParser(prog="Microbenchmarks")
+    argparser.add_argument(
+        "--filter",
+        nargs="+",
+        help="Only run benchmarks whose names contain any of these",
+    )
+    argparser.add_argument(
+        "--secs", type=float, default=0.5, help="Time spent timing each benchmark"
+    )
+    argparser.add_argument("--out", help="Write the results to this JSON file")
+    argparser.add_argument("--compare", help="Results JSON to compare against")
+    argparser.add_argument(
+        "--threshold",
+        type=float,
+        default=DEFAULT_REGRESSION_THRESHOLD,
+        help="Relative growth in median latency or peak allocation flagged as a regression",
+    )
+    argparser.add_argument("--list", action="store_true", help="List the benchmarks")
+    args = argparser.parse_args()
+
+    names = [
+        name
+        for name in BENCHMARKS
+        if not args.filter or any(f in name for f in args.filter)
+    ]
+    if args.list:
+        print("\n".join(names))
+        return
+
+    results = {name: run_benchmark(name, args.secs) for name in names}
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline_file = json.load(f)
+        if baseline_file["environment"] != environment():
+            print("Warning: the baseline was recorded in a different environment")
+        baseline = baseline_file["results"]
+    print_results(results, baseline)
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump({"environment": environment(), "results": results}, f, indent=2)
+
+    if baseline:
+        regressions = find_regressions(results, baseline, args.threshold)
+        if regressions:
+            print(f"{len(regressions)} regressions past {args.threshold:.0%}:")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+        print("No regressions")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+"""
+Replay recorded sessions and report how the early, confidence based gesture readout
+compares to the legacy readout (a single frame, 2 s after shooting):
+games per hour, and the error rate of each.
+
+Errors are counted against labels if given, as a JSON object of video path to the list of
+player moves in its games, e.g. {"session1.mp4": ["rock", "scissors"]}.
+Otherwise they're counted against a vote over the whole readout window.
+
+Usage: python -m rps_bot.tools.readout_report VIDEO [VIDEO ...] [--labels LABELS_JSON]
+"""
+
+import json
+from argparse import ArgumentParser
+from dataclasses import dataclass
+
+import numpy as np
+
+from rps_bot.capture import ReplayCapture
+from rps_bot.game_flow.controller import (
+    GAME_RESULTS_PAUSE_SECS,
+    GESTURE_VOTE_START_SECS,
+    MAX_WAIT_FOR_GESTURE_RECOGNITION,
+    GameController,
+    GameEndState,
+    PendingState,
+    PlayingState,
+)
+from rps_bot.game_flow.gesture_vote import GestureVote
+from rps_bot.recognizer import HandGesture, HandRecognizer
+from rps_bot.recognizer.events import GesturePlayed
+from rps_bot.recognizer.hand_recognizer import DEFAULT_MODEL_PATH
+
+# The readout used before the vote: the latest gesture this long after shooting
+LEGACY_READOUT_SECS = 2
+
+
+@dataclass
+class GameRecord:
+    ts_offered: float
+    ts_shoot: float
+    ts_end: float
+    player_move: HandGesture | None
+
+
+def replay_session(
+    path: str, model_path: str
+) -> tuple[list[GameRecord], list[GesturePlayed]]:
+    """Replay a session in real time, recording its games and every gesture recognized."""
+    capture = ReplayCapture(path)
+    games = []
+    gestures = []
+
+    with HandRecognizer(model_path) as recognizer:
+        controller = GameController(recognizer)
+        recognizer.add_event_listener(GesturePlayed, gestures.append)
+
+        ts_offered = ts_shoot = None
+        last_state = None
+        while True:
+            ok, frame, ts = capture.read()
+            if not ok:
+                break
+            recognizer.next_frame(frame, ts)
+            controller.update()
+
+            state = controller.state
+            if state is last_state:
+                continue
+            last_state = state
+            match state:
+                case PlayingState(_):
+                    ts_offered = controller.clock()
+                case PendingState(_):
+                    ts_shoot = state.ts_shoot
+                case GameEndState(_):
+                    games.append(
+                        GameRecord(
+                            ts_offered, ts_shoot, state.ts_game_end, state.player_move
+                        )
+                    )
+    capture.release()
+
+    return games, gestures
+
+
+def legacy_readout(
+    gestures: list[GesturePlayed], ts_shoot: float
+) -> HandGesture | None:
+    """The player move the legacy readout would have read."""
+    ts_readout = ts_shoot + LEGACY_READOUT_SECS
+    latest = None
+    for event in gestures:
+        if event.ts > ts_readout:
+            break
+        latest = event
+    if latest is None or latest.gesture == HandGesture.NONE:
+        return None
+    return latest.gesture
+
+
+def window_readout(
+    gestures: list[GesturePlayed], ts_shoot: float
+) -> HandGesture | None:
+    """The player move voted for over the whole readout window, as a reference."""
+    vote = GestureVote()
+    for event in gestures:
+        if (
+            ts_shoot + GESTURE_VOTE_START_SECS
+            <= event.ts
+            <= ts_shoot + MAX_WAIT_FOR_GESTURE_RECOGNITION
+        ):
+            vote.add(event.gesture, event.score)
+    return vote.leader()
+
+
+def games_per_hour(games: list[GameRecord], readout_secs: np.ndarray) -> float:
+    """Games per hour of continuous play, given each game's time spent reading the result."""
+    swing_secs = np.array([game.ts_shoot - game.ts_offered for game in games])
+    return 3600 / np.mean(swing_secs + readout_secs + GAME_RESULTS_PAUSE_SECS)
+
+
+def main():
+    argparser = ArgumentParser(prog="Gesture readout report")
+    argparser.add_argument("videos", nargs="+")
+    argparser.add_argument("--model", default=DEFAULT_MODEL_PATH)
+    argparser.add_argument("--labels", help="JSON file of each video's player moves")
+    args = argparser.parse_args()
+
+    labels = {}
+    if args.labels:
+        with open(args.labels) as f:
+            labels = json.load(f)
+
+    print(
+        f"{'session':<30} {'mode':<7} {'games':>6} {'readout (s)':>12} "
+        f"{'games/h':>8} {'errors':>7}"
+    )
+    for path in args.videos:
+        games, gestures = replay_session(path, args.model)
+        if not games:
+            print(f"{path[-30:]:<30} no games")
+            continue
+
+        if path in labels:
+            reference = [HandGesture(move) for move in labels[path]]
+            if len(reference) != len(games):
+                print(
+                    f"{path}: {len(reference)} labels for {len(games)} games, "
+                    f"comparing the first {min(len(reference), len(games))}"
+                )
+        else:
+            reference = [window_readout(gestures, game.ts_shoot) for game in games]
+
+        early_moves = [game.player_move for game in games]
+        early_secs = np.array([game.ts_end - game.ts_shoot for game in games])
+        legacy_moves = [legacy_readout(gestures, game.ts_shoot) for game in games]
+        legacy_secs = np.full(len(games), LEGACY_READOUT_SECS)
+
+        for mode, moves, readout_secs in [
+            ("early", early_moves, early_secs),
+            ("legacy", legacy_moves, legacy_secs),
+        ]:
+            compared = list(zip(moves, reference))
+            errors = sum(move != expected for move, expected in compared)
+            print(
+                f"{path[-30:]:<30} {mode:<7} {len(games):>6} "
+                f"{readout_secs.mean():>12.2f} {games_per_hour(games, readout_secs):>8.0f} "
+                f"{errors / len(compared):>7.1%}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+"""
+Score how well motion analysis and the game controller time the shoot,
+by simulating thousands of games with synthetic players across a process pool.
+
+Scores the shoot time error, missed games, false starts and false shoots,
+and the compute time per sample. The players are drawn from a fixed seed,
+so summaries from different versions of the code can be compared.
+
+Usage: python -m rps_bot.tools.scorecard [--games 2000] [--out SUMMARY_JSON]
+    [--compare OLD_SUMMARY_JSON]
+"""
+
+from dataclasses import asdict
+import json
+import multiprocessing
+import os
+from argparse import ArgumentParser
+
+import numpy as np
+
+from rps_bot.simulation import generate_trace, sample_profile, simulate_trace
+from rps_bot.simulation.game_loop import DEFAULT_RECOGNITION_LATENCY_SECS
+
+# Shoot errors within this are counted as on time
+ON_TIME_SECS = 0.05
+
+
+def simulate_one(task: tuple[int, int, float]) -> dict:
+    """Simulate the game of player number index in the population drawn from seed."""
+    index, seed, latency_secs = task
+    rng = np.random.default_rng([seed, index])
+    trace = generate_trace(sample_profile(rng), rng)
+    result = simulate_trace(trace, latency_secs, seed=index)
+    return dict(asdict(result), index=index, shoot_error_secs=result.shoot_error_secs)
+
+
+def run_games(
+    num_games: int, seed: int, latency_secs: float, workers: int
+) -> list[dict]:
+    tasks = [(i, seed, latency_secs) for i in range(num_games)]
+    with multiprocessing.get_context("spawn").Pool(workers) as pool:
+        results = pool.map(
+            simulate_one, tasks, chunksize=max(1, num_games // (workers * 8))
+        )
+    return results
+
+
+def summarize(results: list[dict], seed: int, latency_secs: float) -> dict:
+    def rate(count: int, total: int) -> float | None:
+        return count / total if total else None
+
+    by_kind = {}
+    for result in results:
+        by_kind.setdefault(result["kind"], []).append(result)
+    games = by_kind.get("game", [])
+    extra_bobs = by_kind.get("extra_bobs", [])
+    aborts = by_kind.get("abort", [])
+    idles = by_kind.get("idle", [])
+
+    def shoot_errors(results: list[dict]) -> np.ndarray:
+        return np.array(
+            [
+                r["shoot_error_secs"]
+                for r in results
+                if r["shoot_error_secs"] is not None
+            ]
+        )
+
+    def error_stats(results: list[dict]) -> dict:
+        errors = shoot_errors(results)
+        if not len(errors):
+            return {"shot": 0}
+        return {
+            "shot": len(errors),
+            "missed_rate": rate(len(results) - len(errors), len(results)),
+            "shoot_error_mean_secs": float(errors.mean()),
+            "shoot_error_median_secs": float(np.median(errors)),
+            "shoot_error_abs_mean_secs": float(np.abs(errors).mean()),
+            "shoot_error_abs_p90_secs": float(np.percentile(np.abs(errors), 90)),
+            "on_time_rate": float((np.abs(errors) <= ON_TIME_SECS).mean()),
+        }
+
+    samples = sum(r["samples"] for r in results)
+    compute_secs = sum(r["compute_secs"] for r in results)
+    return {
+        "config": {
+            "games": len(results),
+            "seed": seed,
+            "latency_secs": latency_secs,
+            "on_time_secs": ON_TIME_SECS,
+        },
+        "counts": {kind: len(results) for kind, results in sorted(by_kind.items())},
+        "game": error_stats(games),
+        "extra_bobs": error_stats(extra_bobs),
+        "abort": {
+            "false_shoot_rate": rate(
+                sum(r["shoot_ts"] is not None for r in aborts), len(aborts)
+            ),
+            "cancelled_rate": rate(
+                sum(r["games_cancelled"] > 0 for r in aborts), len(aborts)
+            ),
+        },
+        "idle": {
+            "false_offer_rate": rate(
+                sum(r["games_offered"] > 0 for r in idles), len(idles)
+            ),
+            "false_shoot_rate": rate(
+                sum(r["shoot_ts"] is not None for r in idles), len(idles)
+            ),
+        },
+        "compute": {
+            "samples": samples,
+            "us_per_sample": compute_secs / samples * 1e6 if samples else None,
+        },
+    }
+
+
+def _flatten(summary: dict, prefix: str = "") -> dict:
+    flat = {}
+    for key, value in summary.items():
+        if isinstance(value, dict):
+            flat.update(_flatten(value, f"{prefix}{key}."))
+        else:
+            flat[f"{prefix}{key}"] = value
+    return flat
+
+
+def print_summary(summary: dict, baseline: dict | None = None):
+    flat = _flatten(summary)
+    flat_baseline = _flatten(baseline) if baseline else {}
+    for key, value in flat.items():
+        line = f"{key:<40} {_format(value):>12}"
+        if key in flat_baseline:
+            old = flat_baseline[key]
+            line += f" {_format(old):>12}"
+            if isinstance(value, float) and isinstance(old, float):
+                line += f" {value - old:>+12.4f}"
+        print(line)
+
+
+def _format(value) -> str:
+    if isinstance(value, float):
+        return f"{value:.4f}"
+    return str(value)
+
+
+def main():
+    argparser = ArgumentParser(prog="Game loop scorecard")
+    argparser.add_argument("--games", type=int, default=2000)
+    argparser.add_argument("--seed", type=int, default=0)
+    argparser.add_argument(
+        "--latency-secs",
+        type=float,
+        default=DEFAULT_RECOGNITION_LATENCY_SECS,
+        help="Time from capture to recognition result, in the simulated pipeline",
+    )
+    argparser.add_argument("--workers", type=int, default=os.cpu_count())
+    argparser.add_argument("--out", help="Write the summary to this JSON file")
+    argparser.add_argument("--compare", help="Summary JSON from a previous version")
+    args = argparser.parse_args()
+
+    results = run_games(args.games, args.seed, args.latency_secs, args.workers)
+    summary = summarize(results, args.seed, args.latency_secs)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if baseline["config"] != summary["config"]:
+            print("Warning: the summaries were made with different configs")
+    print_summary(summary, baseline)
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(summary, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+"""
+Break down the bot's startup time into its stages, in the order rps_bot.main runs them,
+and check each against a budget:
+- import: importing the entry point, rps_bot.main,
+- serial open: opening the finger and elbow ports (simulated boards by default),
+- camera open: opening the camera or video, up to the first frame read,
+- recognizer import: importing the recognizer, which loads MediaPipe and scipy,
+- model load: creating the recognizer and loading the gesture model.
+
+Also lists the heavy packages each stage loaded, e.g. to check matplotlib and Qt are only
+loaded where something is displayed.
+Only the standard library is imported up front, so run it as a fresh process for the
+import times to be meaningful. Exits with status 1 if any stage is over budget.
+
+Usage: python -m rps_bot.tools.startup_profile [--video PATH | --cam-index N]
+    [--port PORT] [--eport PORT] [--model MODEL_PATH] [--budget STAGE=SECS ...]
+"""
+
+import sys
+import threading
+import time
+from argparse import ArgumentParser
+from contextlib import redirect_stdout
+from io import StringIO
+from typing import Callable
+
+# Seconds each stage may take, on the station hardware
+STAGE_BUDGETS_SECS = {
+    "import": 0.5,
+    "serial open": 0.5,
+    "camera open": 2.0,
+    "recognizer import": 2.5,
+    "model load": 1.0,
+}
+# Packages whose loading is reported, as they are slow to import or only needed for display
+HEAVY_PACKAGES = [
+    "cv2",
+    "scipy",
+    "mediapipe",
+    "matplotlib",
+    "PyQt5",
+    "PyQt6",
+    "pyqtgraph",
+]
+
+
+def profile_stage(run: Callable[[], None]) -> dict:
+    """Time a stage, noting which heavy packages it loaded and any error it raised."""
+    loaded_before = set(sys.modules)
+    error = None
+    start = time.perf_counter()
+    try:
+        run()
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    secs = time.perf_counter() - start
+    return {
+        "secs": secs,
+        "loaded": [p for p in HEAVY_PACKAGES if p in set(sys.modules) - loaded_before],
+        "error": error,
+    }
+
+
+def profile_startup(
+    port: str, eport: str, video: str | None, cam_index: int, model_path: str | None
+) -> dict[str, dict]:
+    """Run the startup stages in order, returning each one's profile by name."""
+    # What each stage opens, to be closed once all are profiled
+    opened = {}
+    threads = set(threading.enumerate())
+
+    def import_main():
+        import rps_bot.main  # noqa: F401
+
+    def open_serial():
+        from rps_bot.hand_serial import RPSSerial
+
+        opened["serial"] = RPSSerial(port, eport)
+
+    def open_camera():
+        from rps_bot.capture import CameraCapture, ReplayCapture
+
+        if video:
+            opened["capture"] = ReplayCapture(video)
+        else:
+            opened["capture"] = CameraCapture(cam_index)
+        ok, _, _ = opened["capture"].read()
+        if not ok:
+            raise RuntimeError("No frame read")
+
+    def import_recognizer():
+        from rps_bot.recognizer import HandRecognizer  # noqa: F401
+
+        # Loaded by the motion analyzers as the recognizer is created
+        from scipy import signal  # noqa: F401
+
+    def load_model():
+        from rps_bot.recognizer import HandRecognizer
+        from rps_bot.recognizer.hand_recognizer import DEFAULT_MODEL_PATH
+
+        recognizer = HandRecognizer(model_path or DEFAULT_MODEL_PATH)
+        opened["recognizer"] = recognizer.__enter__()
+
+    stages = {
+        "import": import_main,
+        "serial open": open_serial,
+        "camera open": open_camera,
+        "recognizer import": import_recognizer,
+        "model load": load_model,
+    }
+    # The simulated boards' replies are printed by the serial reader thread
+    with redirect_stdout(StringIO()):
+        profiles = {name: profile_stage(run) for name, run in stages.items()}
+
+        if "recognizer" in opened:
+            opened["recognizer"].__exit__(None, None, None)
+        if "capture" in opened:
+            opened["capture"].release()
+        if "serial" in opened:
+            opened["serial"].close()
+            # Let the serial reader thread finish, so it doesn't print after the redirect
+            for thread in set(threading.enumerate()) - threads:
+                thread.join()
+    return profiles
+
+
+def print_report(profiles: dict[str, dict], budgets: dict[str, float]) -> list[str]:
+    """Print each stage against its budget. Returns the stages over budget."""
+    over_budget = []
+    print(f"{'stage':<18} {'secs':>7} {'budget':>7}  {'loaded / error'}")
+    for name, profile in profiles.items():
+        budget = budgets[name]
+        over = profile["secs"] > budget
+        if over:
+            over_budget.append(name)
+        detail = profile["error"] or ", ".join(profile["loaded"])
+        flag = "OVER" if over else "    "
+        print(f"{name:<18} {profile['secs']:>7.3f} {budget:>7.2f} {flag} {detail}")
+    total = sum(p["secs"] for p in profiles.values())
+    print(f"{'total':<18} {total:>7.3f} {sum(budgets.values()):>7.2f}")
+    return over_budget
+
+
+def parse_budget(value: str) -> tuple[str, float]:
+    name, _, secs = value.rpartition("=")
+    if name not in STAGE_BUDGETS_SECS:
+        raise ValueError(f"Unknown stage {name!r}")
+    return name, float(secs)
+
+
+def main():
+    argparser = ArgumentParser(prog="Startup profile")
+    argparser.add_argument("--video", help="Open a recorded video instead of a camera")
+    argparser.add_argument("-c", "--cam-index", type=int, default=0)
+    argparser.add_argument("--port", default="sim://")
+    argparser.add_argument("--eport", default="sim://")
+    argparser.add_argument("--model", help="Gesture model, the default if not given")
+    argparser.add_argument(
+        "--budget",
+        type=parse_budget,
+        action="append",
+        default=[],
+        metavar="STAGE=SECS",
+        help="Override a stage's budget",
+    )
+    args = argparser.parse_args()
+
+    profiles = profile_startup(
+        args.port, args.eport, args.video, args.cam_index, args.model
+    )
+    over_budget = print_report(profiles, {**STAGE_BUDGETS_SECS, **dict(args.budget)})
+    if over_budget:
+        print(f"Over budget: {', '.join(over_budget)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
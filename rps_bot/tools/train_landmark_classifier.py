@@ -0,0 +1,174 @@
+"""
+Train the landmark classifier (see recognizer.landmark_classifier) on recorded sessions,
+labelled by the gesture model, and report how well it agrees with the model and how
+long it takes.
+
+Every frame of each video is run through the gesture model. Hands it recognizes
+confidently, in the first part of each video, train the classifier, and all hands in the
+rest of each video test it, so the test frames aren't neighbours of training frames.
+
+The classifier's latency is only its own, on top of hand landmarking.
+tools.bench_inference compares the whole landmarks-only pipeline with the gesture model's.
+
+Usage: python -m rps_bot.tools.train_landmark_classifier VIDEO... [--out CLASSIFIER_NPZ]
+    [--model MODEL_PATH] [--min-score 0.6] [--holdout 0.2] [--frames 3000]
+"""
+
+import time
+import timeit
+from argparse import ArgumentParser
+
+import numpy as np
+
+from rps_bot.recognizer.inference_profile import (
+    DEFAULT_MODEL_PATH,
+    InferenceProfile,
+    create_mp_recognizer,
+)
+from rps_bot.recognizer.landmark_classifier import (
+    DEFAULT_LANDMARK_CLASSIFIER_PATH,
+    LandmarkClassifier,
+    landmarks_array,
+)
+from .bench_pool import FRAME_INTERVAL_MS, load_frames
+
+# Calls timed for the classifier's latency
+LATENCY_REPS = 2000
+
+
+def label_video(path: str, model_path: str, max_frames: int) -> dict:
+    """
+    The world landmarks of each hand the gesture model recognizes in the video, with its
+    gesture, score and frame index, plus the model's latency per frame.
+    """
+    import mediapipe as mp
+    from mediapipe.tasks.python.vision import RunningMode
+
+    frames = load_frames(path, max_frames)
+    landmarks, labels, scores, frame_indices, latencies = [], [], [], [], []
+    options = InferenceProfile(num_hands=2).recognizer_options
+    with create_mp_recognizer(
+        model_path, "cpu", options, RunningMode.VIDEO
+    ) as recognizer:
+        for i, frame in enumerate(frames):
+            image = mp.Image(image_format=mp.ImageFormat.SRGB, data=frame)
+            start = time.perf_counter()
+            result = recognizer.recognize_for_video(image, i * FRAME_INTERVAL_MS)
+            latencies.append(time.perf_counter() - start)
+            if not result.hand_world_landmarks:
+                continue
+            landmarks.append(landmarks_array(result.hand_world_landmarks))
+            labels += [gestures[0].category_name for gestures in result.gestures]
+            scores += [gestures[0].score for gestures in result.gestures]
+            frame_indices += [i] * len(result.gestures)
+
+    return {
+        "landmarks": (
+            np.concatenate(landmarks) if landmarks else np.empty((0, 21, 3), np.float32)
+        ),
+        "labels": np.array(labels, dtype=np.str_),
+        "scores": np.array(scores, dtype=np.float64),
+        "frames": np.array(frame_indices, dtype=np.int64),
+        "num_frames": len(frames),
+        "latencies": latencies,
+    }
+
+
+def split(labelled: list[dict], holdout: float) -> tuple[dict, dict]:
+    """Train and test sets, the last holdout fraction of each video's frames testing."""
+    train, test = [], []
+    for video in labelled:
+        is_test = video["frames"] >= video["num_frames"] * (1 - holdout)
+        fields = ("landmarks", "labels", "scores")
+        train.append({f: video[f][~is_test] for f in fields})
+        test.append({f: video[f][is_test] for f in fields})
+
+    def concat(parts: list[dict]) -> dict:
+        return {f: np.concatenate([p[f] for p in parts]) for f in parts[0]}
+
+    return concat(train), concat(test)
+
+
+def print_agreement(classifier: LandmarkClassifier, test: dict, min_score: float):
+    """Print how often the classifier agrees with the gesture model, overall and by gesture."""
+    predicted, _ = classifier.predict(test["landmarks"])
+    agrees = predicted == test["labels"]
+    confident = test["scores"] >= min_score
+    print(
+        f"Agreement with the gesture model on {len(agrees)} test hands: "
+        f"{agrees.mean():.3f}, {agrees[confident].mean():.3f} where it scored "
+        f">= {min_score}"
+    )
+    print(f"{'model says':<10} {'hands':>6} {'agree':>6}  classifier says")
+    for label in sorted(set(test["labels"].tolist())):
+        is_label = test["labels"] == label
+        names, counts = np.unique(predicted[is_label], return_counts=True)
+        confusion = ", ".join(f"{n} {c}" for n, c in zip(names, counts))
+        print(
+            f"{label:<10} {is_label.sum():>6} {agrees[is_label].mean():>6.3f}  {confusion}"
+        )
+
+
+def main():
+    argparser = ArgumentParser(prog="Landmark classifier training")
+    argparser.add_argument("videos", nargs="+")
+    argparser.add_argument("--out", default=str(DEFAULT_LANDMARK_CLASSIFIER_PATH))
+    argparser.add_argument(
+        "--model", default=str(DEFAULT_MODEL_PATH), help="Gesture model to label with"
+    )
+    argparser.add_argument(
+        "--min-score",
+        type=float,
+        default=0.6,
+        help="Only train on hands the gesture model scored at least this",
+    )
+    argparser.add_argument(
+        "--holdout",
+        type=float,
+        default=0.2,
+        help="Fraction at the end of each video to test on rather than train",
+    )
+    argparser.add_argument(
+        "--frames", type=int, default=3000, help="Max frames read from each video"
+    )
+    args = argparser.parse_args()
+    if not 0 < args.holdout < 1:
+        argparser.error("--holdout must be between 0 and 1")
+
+    labelled = [label_video(v, args.model, args.frames) for v in args.videos]
+    train, test = split(labelled, args.holdout)
+    confident = train["scores"] >= args.min_score
+    if not confident.any():
+        raise RuntimeError(
+            "The gesture model recognized no hand confidently to train on"
+        )
+    if len(test["labels"]) == 0:
+        raise RuntimeError("No hands recognized in the test frames")
+
+    classifier = LandmarkClassifier.fit(
+        train["landmarks"][confident], train["labels"][confident]
+    )
+    classifier.save(args.out)
+    labels, counts = np.unique(train["labels"][confident], return_counts=True)
+    print(
+        f"Trained on {confident.sum()} hands "
+        f"({', '.join(f'{n} {c}' for n, c in zip(labels, counts))}), saved to {args.out}"
+    )
+
+    print_agreement(classifier, test, args.min_score)
+
+    one_hand = test["landmarks"][:1]
+    classify_secs = timeit.timeit(
+        lambda: classifier.predict(one_hand), number=LATENCY_REPS
+    )
+    model_ms = (
+        np.median([secs for video in labelled for secs in video["latencies"]]) * 1000
+    )
+    print(
+        f"Classifier: {classify_secs / LATENCY_REPS * 1e6:.1f} us per hand. "
+        f"Gesture model: {model_ms:.1f} ms per frame (median)"
+    )
+
+
+if __name__ == "__main__":
+    main()
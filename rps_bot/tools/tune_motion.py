@@ -0,0 +1,307 @@
+"""
+Tune the motion analysis constants, by grid or random search over candidate values.
+Every config is scored on the same games, either synthetic players (as in the scorecard)
+or recorded traces, simulated across a process pool.
+
+Configs are ranked by timing accuracy: the rate of games shot on time, less the rate of
+false shoots in games that weren't played. Configs within the accuracy tolerance of the
+best are ranked by compute time per sample, and the winner is written to the config file
+MotionAnalyzer loads at startup.
+
+Recorded traces are an .npz of the samples of all traces concatenated, as arrays
+"ts", "hand_y" (NaN if no hand) and "trace" (index of each sample's trace), plus
+"true_shoot_ts" with one entry per trace (NaN if the player didn't shoot).
+
+Usage: python -m rps_bot.tools.tune_motion [--search random|grid] [--trials 50]
+    [--params PARAM ...] [--games 500] [--traces TRACES_NPZ] [--out CONFIG_JSON]
+"""
+
+from dataclasses import asdict, dataclass, fields, replace
+import itertools
+import multiprocessing
+import os
+from argparse import ArgumentParser
+
+import numpy as np
+
+from rps_bot.recognizer.motion_analysis import (
+    DEFAULT_CONFIG_PATH,
+    PHASE_ESTIMATORS,
+    RESAMPLING_METHODS,
+    MotionAnalyzerConfig,
+)
+from rps_bot.simulation import generate_trace, sample_profile, simulate_trace
+from rps_bot.simulation.game_loop import DEFAULT_RECOGNITION_LATENCY_SECS
+from .scorecard import ON_TIME_SECS
+
+# Candidate values of each tunable constant
+SEARCH_SPACE = {
+    "window_secs": [3, 4, 5, 6],
+    "repredict_interval_secs": [0.05, 0.1, 0.2, 0.3],
+    "num_resamples": [30, 40, 50, 75, 100],
+    "resampling": list(RESAMPLING_METHODS),
+    "prominence": [0.1, 0.15, 0.2, 0.25, 0.3, 0.35],
+    "max_motion_points": [8, 9, 10],
+    "min_points_to_continue": [4, 5, 6, 7],
+    "process_noise": [0.01, 0.03, 0.1, 0.3, 1.0],
+    "measurement_noise": [0.1, 0.3, 1.0, 3.0],
+    "phase_estimator": list(PHASE_ESTIMATORS),
+}
+# Configs this close to the best accuracy are ranked by compute time instead
+DEFAULT_ACCURACY_TOLERANCE = 0.01
+
+
+@dataclass
+class RecordedTrace:
+    """A recorded trace, standing in for a SyntheticTrace."""
+
+    ts: np.ndarray
+    hand_y: np.ndarray
+    true_shoot_ts: float | None
+
+    @property
+    def kind(self) -> str:
+        # Without a profile, all that's known is whether the player shot
+        return "game" if self.true_shoot_ts is not None else "abort"
+
+
+def load_traces(path: str) -> list[RecordedTrace]:
+    data = np.load(path)
+    traces = []
+    for i, true_shoot_ts in enumerate(data["true_shoot_ts"]):
+        in_trace = data["trace"] == i
+        traces.append(
+            RecordedTrace(
+                data["ts"][in_trace],
+                data["hand_y"][in_trace],
+                None if np.isnan(true_shoot_ts) else float(true_shoot_ts),
+            )
+        )
+    return traces
+
+
+# Recorded traces, loaded once per worker
+_recorded: list[RecordedTrace] | None = None
+
+
+def _init_worker(traces_path: str | None):
+    global _recorded
+    if traces_path:
+        _recorded = load_traces(traces_path)
+
+
+def _simulate(task: tuple[int, dict, int, int, float]) -> tuple[int, dict]:
+    """Simulate game number index with the config, returning the config's number too."""
+    config_index, config, index, seed, latency_secs = task
+    if _recorded is not None:
+        trace = _recorded[index]
+    else:
+        rng = np.random.default_rng([seed, index])
+        trace = generate_trace(sample_profile(rng), rng)
+    result = simulate_trace(
+        trace, latency_secs, seed=index, motion_config=MotionAnalyzerConfig(**config)
+    )
+    return config_index, dict(
+        kind=result.kind,
+        shoot_ts=result.shoot_ts,
+        shoot_error_secs=result.shoot_error_secs,
+        samples=result.samples,
+        compute_secs=result.compute_secs,
+    )
+
+
+def score(results: list[dict]) -> dict:
+    """Timing accuracy and compute cost of a config, from its games' results."""
+    played = [r for r in results if r["kind"] in ("game", "extra_bobs")]
+    not_played = [r for r in results if r["kind"] in ("abort", "idle")]
+    errors = np.array(
+        [r["shoot_error_secs"] for r in played if r["shoot_error_secs"] is not None]
+    )
+
+    on_time_rate = (
+        float((np.abs(errors) <= ON_TIME_SECS).sum() / len(played)) if played else 0.0
+    )
+    false_shoot_rate = (
+        sum(r["shoot_ts"] is not None for r in not_played) / len(not_played)
+        if not_played
+        else 0.0
+    )
+    samples = sum(r["samples"] for r in results)
+    return {
+        "accuracy": on_time_rate - false_shoot_rate,
+        "on_time_rate": on_time_rate,
+        "missed_rate": 1 - len(errors) / len(played) if played else 0.0,
+        "false_shoot_rate": false_shoot_rate,
+        "shoot_error_abs_mean_secs": (
+            float(np.abs(errors).mean()) if len(errors) else float("nan")
+        ),
+        "us_per_sample": sum(r["compute_secs"] for r in results) / samples * 1e6,
+    }
+
+
+def grid_configs(base: MotionAnalyzerConfig, params: list[str]) -> list[dict]:
+    """Every combination of the params' candidate values."""
+    return [
+        asdict(replace(base, **dict(zip(params, values))))
+        for values in itertools.product(*(SEARCH_SPACE[p] for p in params))
+    ]
+
+
+def random_configs(
+    base: MotionAnalyzerConfig, params: list[str], trials: int, seed: int
+) -> list[dict]:
+    """The base config, then trials - 1 draws of the params' candidate values."""
+    rng = np.random.default_rng(seed)
+    configs = [asdict(base)]
+    while len(configs) < trials:
+        values = {
+            p: SEARCH_SPACE[p][rng.integers(len(SEARCH_SPACE[p]))] for p in params
+        }
+        config = asdict(replace(base, **values))
+        if config not in configs:
+            configs.append(config)
+    return configs
+
+
+def evaluate(
+    configs: list[dict],
+    num_games: int,
+    seed: int,
+    latency_secs: float,
+    workers: int,
+    traces_path: str | None = None,
+) -> list[dict]:
+    """Score each config on the same games, in parallel. Returns the scores in order."""
+    tasks = [
+        (config_index, config, index, seed, latency_secs)
+        for config_index, config in enumerate(configs)
+        for index in range(num_games)
+    ]
+    results = [[] for _ in configs]
+    with multiprocessing.get_context("spawn").Pool(
+        workers, _init_worker, (traces_path,)
+    ) as pool:
+        chunksize = max(1, len(tasks) // (workers * 8))
+        for config_index, result in pool.imap_unordered(_simulate, tasks, chunksize):
+            results[config_index].append(result)
+    return [score(r) for r in results]
+
+
+def rank(scores: list[dict], accuracy_tolerance: float) -> list[int]:
+    """
+    Indices of configs from best to worst: by accuracy, except that those within the
+    tolerance of the best accuracy come first, cheapest first.
+    """
+    best = max(s["accuracy"] for s in scores)
+    return sorted(
+        range(len(scores)),
+        key=lambda i: (
+            scores[i]["accuracy"] < best - accuracy_tolerance,
+            (
+                scores[i]["us_per_sample"]
+                if scores[i]["accuracy"] >= best - accuracy_tolerance
+                else -scores[i]["accuracy"]
+            ),
+        ),
+    )
+
+
+def print_ranking(
+    configs: list[dict],
+    scores: list[dict],
+    ranking: list[int],
+    params: list[str],
+    top: int,
+):
+    columns = [
+        "accuracy",
+        "on_time_rate",
+        "missed_rate",
+        "false_shoot_rate",
+        "shoot_error_abs_mean_secs",
+        "us_per_sample",
+    ]
+    print(" ".join([f"{'rank':>4}", *(f"{c:>12.12}" for c in columns + params)]))
+    for position, i in enumerate(ranking[:top], 1):
+        values = [scores[i][c] for c in columns] + [configs[i][p] for p in params]
+        print(" ".join([f"{position:>4}", *(_format(v) for v in values)]))
+
+
+def _format(value) -> str:
+    if isinstance(value, str):
+        return f"{value:>12.12}"
+    return f"{value:>12.4g}"
+
+
+def main():
+    field_names = [f.name for f in fields(MotionAnalyzerConfig)]
+
+    argparser = ArgumentParser(prog="Motion analysis tuner")
+    argparser.add_argument("--search", choices=["random", "grid"], default="random")
+    argparser.add_argument(
+        "--trials", type=int, default=50, help="Configs to try in a random search"
+    )
+    argparser.add_argument(
+        "--params",
+        nargs="+",
+        choices=field_names,
+        default=field_names,
+        help="Constants to vary, the rest keeping their current values",
+    )
+    argparser.add_argument("--games", type=int, default=500)
+    argparser.add_argument("--seed", type=int, default=0)
+    argparser.add_argument(
+        "--traces", help="Recorded traces (.npz) to tune on, instead of synthetic ones"
+    )
+    argparser.add_argument(
+        "--latency-secs",
+        type=float,
+        default=DEFAULT_RECOGNITION_LATENCY_SECS,
+        help="Time from capture to recognition result, in the simulated pipeline",
+    )
+    argparser.add_argument(
+        "--accuracy-tolerance", type=float, default=DEFAULT_ACCURACY_TOLERANCE
+    )
+    argparser.add_argument("--workers", type=int, default=os.cpu_count())
+    argparser.add_argument("--top", type=int, default=10)
+    argparser.add_argument(
+        "--out",
+        default=str(DEFAULT_CONFIG_PATH),
+        help="Where to write the winning config",
+    )
+    argparser.add_argument(
+        "--dry-run", action="store_true", help="Don't write the winning config"
+    )
+    args = argparser.parse_args()
+
+    # Search around the current config
+    base = MotionAnalyzerConfig.load_default()
+    if args.search == "grid":
+        configs = grid_configs(base, args.params)
+    else:
+        configs = random_configs(base, args.params, args.trials, args.seed)
+
+    num_games = args.games
+    if args.traces:
+        num_games = len(np.load(args.traces)["true_shoot_ts"])
+    print(f"Scoring {len(configs)} configs on {num_games} games")
+
+    scores = evaluate(
+        configs, num_games, args.seed, args.latency_secs, args.workers, args.traces
+    )
+    ranking = rank(scores, args.accuracy_tolerance)
+    print_ranking(configs, scores, ranking, args.params, args.top)
+
+    current = configs.index(asdict(base)) if asdict(base) in configs else None
+    if current is not None:
+        print(f"Current config ranks {ranking.index(current) + 1} of {len(configs)}")
+
+    winner = MotionAnalyzerConfig(**configs[ranking[0]])
+    print(f"Winner: {winner}")
+    if not args.dry_run:
+        winner.save(args.out)
+        print(f"Written to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
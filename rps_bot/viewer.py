@@ -0,0 +1,120 @@
+import multiprocessing
+import time
+
+from .shared_state import (
+    DEFAULT_MAX_FRAME_BYTES,
+    SharedStateReader,
+    SharedStateWriter,
+    StateSnapshot,
+)
+
+PLOT_KINDS = ["matplotlib", "qt", "none"]
+
+
+def make_figure(plot: str):
+    """
+    Create the live plot figure of the given kind, or None for no plots.
+    GUI libraries are imported here, so only processes that display anything load them.
+    """
+    match plot:
+        case "matplotlib":
+            from .gui import GuiMainFigure
+
+            return GuiMainFigure()
+        case "qt":
+            from .gui.recognizer_qt import RecognizerFigureQt
+
+            return RecognizerFigureQt()
+        case "none":
+            return None
+        case _:
+            raise ValueError(
+                f"Unknown plot kind '{plot}', expected one of {PLOT_KINDS}"
+            )
+
+
+def run_viewer(shm_name: str, max_frame_bytes: int, plot: str):
+    """
+    Viewer process entry point.
+    Renders the latest frame and state published to shared memory until the window is quit,
+    in which case quit is requested back to the publisher.
+    """
+    import cv2 as cv
+
+    from .gui import annotate_frame
+
+    reader = SharedStateReader(shm_name, max_frame_bytes)
+    fig = make_figure(plot)
+    if fig is not None:
+        fig.show()
+
+    try:
+        while not reader.quit_requested():
+            latest = reader.read_latest()
+            if latest is None:
+                # Nothing new yet, avoid spinning
+                time.sleep(0.005)
+                key = cv.waitKey(1)
+            else:
+                frame, snapshot = latest
+                if fig is not None:
+                    fig.update(snapshot)
+                annotate_frame(frame, snapshot)
+                cv.imshow("Camera", frame)
+                key = cv.waitKey(1)
+
+            # Quit if Q pressed
+            if key == ord("q"):
+                reader.request_quit()
+    finally:
+        reader.close()
+
+
+class ViewerProcess:
+    """
+    Displays the camera feed and plots in a separate process, fed through shared memory.
+    Publishing never waits on the viewer, and the viewer exiting or crashing
+    does not affect the publishing process.
+    """
+
+    def __init__(
+        self, plot: str = "matplotlib", max_frame_bytes=DEFAULT_MAX_FRAME_BYTES
+    ):
+        if plot not in PLOT_KINDS:
+            raise ValueError(
+                f"Unknown plot kind '{plot}', expected one of {PLOT_KINDS}"
+            )
+
+        self._writer = SharedStateWriter(max_frame_bytes)
+        # Spawn, so that the viewer doesn't inherit the camera, serial ports or recognizer
+        ctx = multiprocessing.get_context("spawn")
+        self._process = ctx.Process(
+            target=run_viewer,
+            args=(self._writer.name, max_frame_bytes, plot),
+            name="rps-viewer",
+            daemon=True,
+        )
+
+    def __enter__(self):
+        self._process.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_tb):
+        self.close()
+
+    def publish(self, frame, snapshot: StateSnapshot):
+        self._writer.publish(frame, snapshot)
+
+    def quit_requested(self) -> bool:
+        """True if the user quit from the viewer window."""
+        return self._writer.quit_requested()
+
+    def is_alive(self) -> bool:
+        return self._process.is_alive()
+
+    def close(self):
+        self._writer.request_quit()
+        self._process.join(timeout=1)
+        if self._process.is_alive():
+            self._process.terminate()
+        self._writer.close()